@@ -29,7 +29,13 @@ from .acicounters import (  # noqa
 )
 from .aciHealthScore import HealthScore  # noqa
 from .aciSearch import AciSearch, Searchable  # noqa
-from .acisession import EventHandler, Login, Session, Subscriber  # noqa
+from .acisession import (  # noqa
+    CircuitOpenError, ClusterSession, EventCoalescer, EventHandler,
+    EventJournal, EventQueueLimit, ImdataDecoder, Login, LoginTokenCache,
+    PrometheusExporter, PushBatcher, RateLimiter, RequestExecutor,
+    RequestFuture, RequestStats, ResponseCache, Session, SingleFlight,
+    Subscriber, WebSocketShard,
+)
 from .aciTable import Table  # noqa
 from .acitoolkit import (  # noqa
     AppProfile, AttributeCriterion, BGPSession, BridgeDomain, CollectionPolicy,
@@ -37,6 +37,7 @@ class CommonConcreteObject(BaseACIPhysObject):
     Intermediate abstract class that provides common methods for physical
     objects storing data in an 'attr' dictionary.
     """
+    _child_key = 'dn'
 
     def __init__(self, parent=None):
         self.attr = {'dn':'', 'name':''}
@@ -54,6 +55,7 @@ class CommonConcreteObject(BaseACIPhysObject):
         :param include_concrete: True or False. Default is False
         :param deep: True or False.  Default is False.
         """
+        self._lazy_population = None
         for child_class in self._get_children_classes():
             child_class.get(self._top, self)
 
@@ -67,6 +69,20 @@ class CommonConcreteObject(BaseACIPhysObject):
 
         return self._children
 
+    def _intern_attr(self, *names):
+        """
+        Share the string values of some attributes with the other objects
+        holding the same values.  Used by the classes with many instances
+        for the attributes that only take a few different values, such as
+        states, flags and the names of the contexts.
+
+        :param names: Strings containing the names of the attributes
+        """
+        for name in names:
+            value = self.attr.get(name)
+            if isinstance(value, str):
+                self.attr[name] = intern(value)
+
     def get_attributes(self, name=None):
         results = super(CommonConcreteObject, self).get_attributes(name)
         for attr in self.attr:
@@ -84,7 +100,9 @@ class CommonConcreteObject(BaseACIPhysObject):
 
     @dn.setter
     def dn(self, value):
+        old_value = self.attr.get('dn')
         self.attr['dn'] = value
+        self._reindex_in_parent('dn', old_value)
 
     @property
     def name(self):
@@ -92,7 +110,9 @@ class CommonConcreteObject(BaseACIPhysObject):
 
     @name.setter
     def name(self, value):
+        old_value = self.attr.get('name')
         self.attr['name'] = value
+        self._reindex_in_parent('name', old_value)
 
     def __eq__(self, other):
         """
@@ -105,6 +125,14 @@ class CommonConcreteObject(BaseACIPhysObject):
             return self.attr.get('dn') == other.attr.get('dn')
         return NotImplemented
 
+    __hash__ = BaseACIPhysObject.__hash__
+
+    def _get_identity(self):
+        """
+        Get the key identifying the concrete objects, matching their equality
+        """
+        return self.attr.get('dn')
+
     @staticmethod
     def _parse_dn_pod_node(dn):
         """Parses the pod, node, and slot from a
@@ -1002,6 +1030,8 @@ class ConcreteSVI(CommonConcreteObject):
         else:
             return False
 
+    __hash__ = BaseACIPhysObject.__hash__
+
     def __str__(self):
         """
         Default print string
@@ -1377,6 +1407,9 @@ class ConcreteAccCtrlRule(CommonConcreteObject):
             rule._get_epg_names(epgs)
             rule._get_pod_node()
             rule._set_name()
+            rule._intern_attr('action', 'context', 'd_epg', 'dclass', 'descr', 'direction', 'filter_id',
+                              'mark_dscp', 'node', 'oper_st', 'pod', 'priority', 'qos_group',
+                              'relative_priority', 's_epg', 'sclass', 'scope', 'status', 'tenant', 'type')
             result.append(rule)
             if parent:
                 rule._parent = parent
@@ -1914,6 +1947,8 @@ class ConcreteEp(CommonConcreteObject):
             # noinspection PyAugmentAssignment
             if ep.attr['interface_id'] in lbif_table:
                 ep.attr['interface_id'] = 'loopback-' + ep.attr['interface_id']
+            ep._intern_attr('address_family', 'bd_vnid', 'bridge_domain', 'context', 'ctx_vnid', 'flags',
+                            'interface_id', 'node', 'pod', 'tenant')
             if parent:
                 ep._parent = parent
                 ep._parent.add_child(ep)
@@ -2509,11 +2544,20 @@ class ConcreteTunnel(CommonConcreteObject):
             return self_key == other_key
         return NotImplemented
 
+    __hash__ = BaseACIPhysObject.__hash__
+
+    def _get_identity(self):
+        """
+        Get the key identifying the tunnels, matching their equality
+        """
+        return self._get_parent_identity(), self.attr.get('dn')
+
 
 class ConcreteOverlay(CommonConcreteObject):
     """
     Will retrieve the overlay information for the switch
     """
+    _child_key = None
 
     def __init__(self, parent=None):
         """
@@ -2655,3 +2699,11 @@ class ConcreteOverlay(CommonConcreteObject):
             other_key = other.get_parent()
             return self_key == other_key
         return NotImplemented
+
+    __hash__ = BaseACIPhysObject.__hash__
+
+    def _get_identity(self):
+        """
+        Get the key identifying the overlays, matching their equality
+        """
+        return self._get_parent_identity()
@@ -112,11 +112,46 @@ class Tag(object):
         return not self == other
 
 
+class _IndexedName(object):
+    """
+    Descriptor of the name of the ACI objects.  The name is kept in the
+    instance dictionary so that reading it is not slowed down, and the
+    children index of the parent is updated when the name is changed.
+    """
+    def __set__(self, obj, value):
+        if 'name' not in obj.__dict__:
+            obj.__dict__['name'] = value
+            return
+        old_value = obj.__dict__['name']
+        obj.__dict__['name'] = value
+        obj._reindex_in_parent('name', old_value)
+
+
 class BaseACIObject(AciSearch):
     """
     This class defines functionality common to all ACI objects.
     Functions may be overwritten by inheriting classes.
     """
+    name = _IndexedName()
+    # Attribute that two equal objects always share, used to find an object
+    # among the children of its parent.  None if the equality of the class
+    # is not based on a single attribute.
+    _child_key = 'name'
+    # Empty containers shared by the objects until they get children,
+    # relations, attachments or tags of their own.  Most objects of large
+    # trees are leaves and never do.  They must not be modified in place,
+    # _get_own_container gives the container of the object.
+    _child_names = {}
+    _child_keys = {}
+    _unkeyed_children = ()
+    _relations = ()
+    _attachments = ()
+    _tags = ()
+    _identity = None
+    # Session and include_concrete flag used to fetch the children the
+    # first time they are asked for, None if the object is not lazy.
+    _lazy_population = None
+
     def __init__(self, name=None, parent=None):
         """
         Constructor initializes the basic object and should be called by\
@@ -136,9 +171,6 @@ class BaseACIObject(AciSearch):
         self.name = name
         self._deleted = False
         self._children = []
-        self._relations = []
-        self._attachments = []
-        self._tags = []
         self._parent = parent
         self.descr = None
         self.dn = ''
@@ -148,24 +180,42 @@ class BaseACIObject(AciSearch):
         # self.get_event = self._instance_get_event
         logging.debug('Creating %s %s', self.__class__.__name__, name)
         if self._parent is not None:
-            if self._parent.has_child(self):
-                self._parent.remove_child(self)
+            # A lazy parent is not populated by the creation of its children
+            duplicate = self._parent._get_equal_child(self)
+            if duplicate is not None:
+                self._parent._discard_child(duplicate)
             self._parent.add_child(self)
 
     def __lt__(self, other):
         return self.name < other.name
 
     @classmethod
-    def _get_subscription_urls(cls):
+    def _get_subscription_urls(cls, query_filter=None, dn_scope=None):
         """
         Gets the set of URLs used to subscribe to class changes
         in the APIC.
 
+        :param query_filter: Optional string containing a query-target-filter\
+                             such as ``eq(fvCEp.encap,"vlan-10")`` that the\
+                             APIC applies before sending the events
+        :param dn_scope: Optional string or list of strings containing the\
+                         dn of the objects whose subtree is subscribed to\
+                         instead of the whole class
         :returns: Set of URL strings
         """
+        query = ''
+        if query_filter is not None:
+            query = 'query-target-filter=%s&' % query_filter
         resp = []
         for class_name in cls._get_apic_classes():
-            resp.append('/api/class/%s.json?subscription=yes' % class_name)
+            if dn_scope is None:
+                resp.append('/api/class/%s.json?%ssubscription=yes' % (class_name, query))
+                continue
+            if not isinstance(dn_scope, (list, tuple, set)):
+                dn_scope = [dn_scope]
+            for dn in dn_scope:
+                resp.append('/api/mo/%s.json?query-target=subtree&target-subtree-class=%s&%ssubscription=yes' %
+                            (dn, class_name, query))
         return resp
 
     def _get_instance_subscription_urls(self):
@@ -265,16 +315,16 @@ class BaseACIObject(AciSearch):
         """
         return {}
 
-    def _extract_relationships(self, data, obj_dict):
+    def _extract_relationships(self, index):
         """
         Used internally by get_deep to populate the relationships
         Will be overridden when necessary.  The default implementation
         is here.
 
-        :param data: data to extract relationships from
+        :param index: Index of the data and objects to extract relationships from
         """
         for child in self.get_children():
-            child._extract_relationships(data, obj_dict)
+            child._extract_relationships(index)
 
     def has_tag(self, tag):
         """
@@ -286,7 +336,7 @@ class BaseACIObject(AciSearch):
         """
         if not isinstance(tag, Tag):
             tag = Tag(tag)
-        return tag in self.get_tags()
+        return tag in self._tags
 
     def has_tags(self):
         """
@@ -295,7 +345,23 @@ class BaseACIObject(AciSearch):
         :returns: True or False.  True indicates the object has at least one \
                   tag assigned.
         """
-        return len(self.get_tags()) > 0
+        return len(self._tags) > 0
+
+    def _get_own_container(self, attribute, container_class=list):
+        """
+        Get a container attribute of this object that can be modified,
+        replacing the shared empty container if the object does not have
+        its own yet.
+
+        :param attribute: String containing the name of the attribute
+        :param container_class: Class of the container, list or dict
+        :returns: The container of the object
+        """
+        container = self.__dict__.get(attribute)
+        if container is None:
+            container = container_class()
+            setattr(self, attribute, container)
+        return container
 
     def get_tags(self):
         """
@@ -303,7 +369,7 @@ class BaseACIObject(AciSearch):
 
         :returns: List of tag instances
         """
-        return self._tags
+        return self._get_own_container('_tags')
 
     def add_tag(self, tag):
         """
@@ -339,7 +405,7 @@ class BaseACIObject(AciSearch):
         """
         if not isinstance(tag, Tag):
             tag = Tag(tag)
-        for existing_tag in self.get_tags():
+        for existing_tag in self._tags:
             if existing_tag == tag:
                 existing_tag.mark_as_deleted()
 
@@ -385,7 +451,7 @@ class BaseACIObject(AciSearch):
                                 class_map = cls._get_toolkit_to_apic_classmap()
                                 if apic_class not in class_map:
                                     if apic_class == 'tagInst':
-                                        obj._tags.append(Tag(str(child[apic_class]['attributes']['name'])))
+                                        obj.get_tags().append(Tag(str(child[apic_class]['attributes']['name'])))
                                     continue
                                 else:
                                     class_map[apic_class].get_deep(full_data=full_data,
@@ -397,7 +463,7 @@ class BaseACIObject(AciSearch):
         return obj
 
     @classmethod
-    def subscribe(cls, session, only_new=False):
+    def subscribe(cls, session, only_new=False, query_filter=None, dn_scope=None):
         """
         Subscribe to events from the APIC that pertain to instances of this
         class.
@@ -407,8 +473,12 @@ class BaseACIObject(AciSearch):
                          setting only_new to False) will queue a create event for all of the currently existing objects.
                          Setting only_new to True will only queue events that occur after the initial subscribe. The
                          default has only_new set to False.
+        :param query_filter: Optional string containing a query-target-filter\
+                             used to only receive the events of matching objects
+        :param dn_scope: Optional string or list of strings containing the\
+                         dn of the objects whose subtree is subscribed to
         """
-        urls = cls._get_subscription_urls()
+        urls = cls._get_subscription_urls(query_filter, dn_scope)
         for url in urls:
             resp = session.subscribe(url, only_new=only_new)
             if resp is not None:
@@ -417,15 +487,17 @@ class BaseACIObject(AciSearch):
         return resp
 
     @classmethod
-    def get_event(cls, session):
+    def get_event(cls, session, query_filter=None, dn_scope=None):
         """
         Gets the event that is pending for this class.  Events are
         returned in the form of objects.  Objects that have been deleted
         are marked as such.
 
         :param session:  the instance of Session used for APIC communication
+        :param query_filter: Optional query-target-filter given to subscribe
+        :param dn_scope: Optional dn or list of dns given to subscribe
         """
-        urls = cls._get_subscription_urls()
+        urls = cls._get_subscription_urls(query_filter, dn_scope)
         for url in urls:
             if not session.has_events(url):
                 continue
@@ -448,17 +520,60 @@ class BaseACIObject(AciSearch):
             return obj
 
     @classmethod
-    def has_events(cls, session):
+    def has_events(cls, session, query_filter=None, dn_scope=None):
         """
         Check for pending events from the APIC that pertain to instances
         of this class.
 
         :param session:  the instance of Session used for APIC communication
+        :param query_filter: Optional query-target-filter given to subscribe
+        :param dn_scope: Optional dn or list of dns given to subscribe
         :returns: True or False.  True if there are events pending.
         """
-        urls = cls._get_subscription_urls()
+        urls = cls._get_subscription_urls(query_filter, dn_scope)
         return any(session.has_events(url) for url in urls)
 
+    @classmethod
+    def wait_for_events(cls, session, timeout=None, query_filter=None, dn_scope=None):
+        """
+        Wait for events from the APIC that pertain to instances of this
+        class.
+
+        :param session:  the instance of Session used for APIC communication
+        :param timeout: Optional number of seconds to wait.  If not given,
+                        wait until events arrive.
+        :param query_filter: Optional query-target-filter given to subscribe
+        :param dn_scope: Optional dn or list of dns given to subscribe
+        :returns: True or False.  True if there are events pending.
+        """
+        urls = cls._get_subscription_urls(query_filter, dn_scope)
+        return len(session.wait_for_events(urls, timeout)) > 0
+
+    @classmethod
+    def on_event(cls, session, callback, query_filter=None, dn_scope=None):
+        """
+        Register a function called with each event object that pertains to
+        instances of this class, as returned by get_event.  The function is
+        called from a separate thread.
+
+        :param session:  the instance of Session used for APIC communication
+        :param callback: Function taking the event object
+        :param query_filter: Optional query-target-filter given to subscribe
+        :param dn_scope: Optional dn or list of dns given to subscribe
+        """
+        kwargs = {}
+        if query_filter is not None or dn_scope is not None:
+            kwargs = {'query_filter': query_filter, 'dn_scope': dn_scope}
+
+        def dispatch(url):
+            while cls.has_events(session, **kwargs):
+                obj = cls.get_event(session, **kwargs)
+                if obj is not None:
+                    callback(obj)
+
+        for url in cls._get_subscription_urls(query_filter, dn_scope):
+            session.add_event_callback(url, dispatch)
+
     def _instance_subscribe(self, session, extension=''):
         """
         not yet fully implemented
@@ -517,15 +632,16 @@ class BaseACIObject(AciSearch):
             return obj
 
     @classmethod
-    def unsubscribe(cls, session):
+    def unsubscribe(cls, session, query_filter=None, dn_scope=None):
         """
         Unsubscribe for events from the APIC that pertain to instances of this
         class.
 
         :param session:  the instance of Session used for APIC communication
+        :param query_filter: Optional query-target-filter given to subscribe
+        :param dn_scope: Optional dn or list of dns given to subscribe
         """
-        for class_name in cls._get_apic_classes():
-            url = '/api/class/%s.json?subscription=yes' % class_name
+        for url in cls._get_subscription_urls(query_filter, dn_scope):
             session.unsubscribe(url)
 
     def _instance_unsubscribe(self):
@@ -570,8 +686,8 @@ class BaseACIObject(AciSearch):
             relation = BaseRelation(self, 'attached')
             if relation in item._attachments:
                 item._attachments.remove(relation)
-        self._relations.append(BaseRelation(item, 'attached'))
-        item._attachments.append(BaseRelation(self, 'attached'))
+        self._get_own_container('_relations').append(BaseRelation(item, 'attached'))
+        item._get_own_container('_attachments').append(BaseRelation(self, 'attached'))
 
     def _check_relation(self, item, status):
         """
@@ -611,8 +727,8 @@ class BaseACIObject(AciSearch):
             self._relations.remove(BaseRelation(item, 'attached'))
             item._attachments.remove(BaseRelation(self, 'attached'))
         if not self.is_detached(item):
-            self._relations.append(BaseRelation(item, 'detached'))
-            item._attachments.append(BaseRelation(self, 'detached'))
+            self._get_own_container('_relations').append(BaseRelation(item, 'detached'))
+            item._get_own_container('_attachments').append(BaseRelation(self, 'detached'))
 
     def _check_attachment(self, item, status):
         """
@@ -646,9 +762,9 @@ class BaseACIObject(AciSearch):
         :param child_name: Name of the child to return
         :return: The specific instance of child_type or None if not found
         """
-        children = self.get_children(child_type)
-        for child in children:
-            if child.name == child_name:
+        self._populate_lazily()
+        for child in self._child_names.get(child_name, ()):
+            if isinstance(child, child_type) and child.name == child_name:
                 return child
         return None
 
@@ -661,6 +777,7 @@ class BaseACIObject(AciSearch):
                            class passed in this parameter.
         :returns: List of children objects.
         """
+        self._populate_lazily()
         if only_class is not None:
             resp = []
             for child in self._children:
@@ -679,6 +796,94 @@ class BaseACIObject(AciSearch):
         if not obj.has_parent():
             obj.set_parent(self)
         self._children.append(obj)
+        self._index_child(obj)
+
+    def _index_child(self, obj):
+        """
+        Record a child in the indexes used to find it by name and by key
+        """
+        self._get_own_container('_child_names', dict).setdefault(obj.name, []).append(obj)
+        if obj._child_key is None:
+            self._get_own_container('_unkeyed_children').append(obj)
+        elif obj._child_key != 'name':
+            self._get_own_container('_child_keys', dict).setdefault(getattr(obj, obj._child_key), []).append(obj)
+
+    @staticmethod
+    def _discard_indexed(index, key, obj):
+        """
+        Remove an object from an index entry
+
+        :returns: True if the object was found in the entry
+        """
+        entries = index.get(key, ())
+        for position, entry in enumerate(entries):
+            if entry is obj:
+                del entries[position]
+                if not entries:
+                    del index[key]
+                return True
+        return False
+
+    def _unindex_child(self, obj):
+        """
+        Remove a child from the indexes.  The whole index is searched if
+        the key of the child was changed without updating the index.
+        """
+        indexes = [(self._child_names, 'name')]
+        if obj._child_key is None:
+            self._unkeyed_children = [child for child in self._unkeyed_children if child is not obj]
+        elif obj._child_key != 'name':
+            indexes.append((self._child_keys, obj._child_key))
+        for index, attribute in indexes:
+            if self._discard_indexed(index, getattr(obj, attribute), obj):
+                continue
+            for key in list(index):
+                if self._discard_indexed(index, key, obj):
+                    break
+
+    def _reindex_child(self, obj, attribute, old_value):
+        """
+        Move a child in the indexes after its name or its key changed
+
+        :param obj: Child object that changed
+        :param attribute: String containing the name of the attribute that changed
+        :param old_value: Value of the attribute before the change
+        """
+        if attribute == 'name':
+            if self._discard_indexed(self._child_names, old_value, obj):
+                self._child_names.setdefault(obj.name, []).append(obj)
+        if attribute == obj._child_key and attribute != 'name':
+            if self._discard_indexed(self._child_keys, old_value, obj):
+                self._child_keys.setdefault(getattr(obj, attribute), []).append(obj)
+
+    def _reindex_in_parent(self, attribute, old_value):
+        """
+        Update the children index of the parent after the name or the key
+        of this object changed
+        """
+        parent = self.__dict__.get('_parent')
+        if parent is None or getattr(self, attribute) == old_value:
+            return
+        if '_child_names' in parent.__dict__:
+            parent._reindex_child(self, attribute, old_value)
+
+    def _get_equal_child(self, obj):
+        """
+        Get the first child that is equal to an object
+
+        :param obj: Object to look for
+        :returns: The child or None if there is no such child
+        """
+        if obj._child_key is None:
+            candidates = self._children
+        elif obj._child_key == 'name':
+            candidates = self._child_names.get(obj.name, ())
+        else:
+            candidates = self._child_keys.get(getattr(obj, obj._child_key), []) + list(self._unkeyed_children)
+        for child in candidates:
+            if child == obj:
+                return child
+        return None
 
     def has_child(self, obj):
         """
@@ -688,7 +893,8 @@ class BaseACIObject(AciSearch):
         :returns:  True or False, True indicates that it does indeed\
                    have the `obj` object as a child.
         """
-        return any(child == obj for child in self._children)
+        self._populate_lazily()
+        return self._get_equal_child(obj) is not None
 
     def remove_child(self, obj):
         """
@@ -696,7 +902,23 @@ class BaseACIObject(AciSearch):
 
         :param obj:  Child object that is to be removed.
         """
-        self._children.remove(obj)
+        self._populate_lazily()
+        child = self._get_equal_child(obj)
+        if child is None:
+            raise ValueError('%s is not a child of %s' % (obj, self))
+        self._discard_child(child)
+
+    def _discard_child(self, child):
+        """
+        Remove a child found with _get_equal_child from the children list
+
+        :param child: Child object that is to be removed.
+        """
+        for position, entry in enumerate(self._children):
+            if entry is child:
+                del self._children[position]
+                break
+        self._unindex_child(child)
 
     def populate_children(self, deep=False, include_concrete=False):
         """
@@ -710,6 +932,8 @@ class BaseACIObject(AciSearch):
         :param include_concrete: True or False. Default is False
         :param deep: True or False.  Default is False.
         """
+        # An explicit population replaces a pending lazy one
+        self._lazy_population = None
         for child_class in self._get_children_classes():
             child_class.get(self._session, self)
 
@@ -719,6 +943,44 @@ class BaseACIObject(AciSearch):
 
         return self._children
 
+    def set_lazy_population(self, session, include_concrete=False):
+        """
+        Populate the children of this object the first time they are asked\
+        for with get_children, get_child, has_child or find instead of now.  Only the immediate children\
+        are fetched and they are in turn populated when they are asked for\
+        their own children.
+
+        :param session: the instance of Session used for APIC communication
+        :param include_concrete: True or False. Default is False
+        """
+        self._lazy_population = (session, include_concrete)
+
+    def _populate_lazily(self):
+        """
+        Fetch the immediate children of a lazy object and make them lazy.
+        Does nothing if the object is not waiting to be populated.
+        """
+        if self._lazy_population is None:
+            return
+        session, include_concrete = self._lazy_population
+        self._lazy_population = None
+        for child in self._fetch_children(session, include_concrete):
+            if not child._children:
+                child.set_lazy_population(session, include_concrete)
+
+    def _fetch_children(self, session, include_concrete):
+        """
+        Fetch the immediate children of the object for a lazy population.
+        Overridden by the classes that do not populate their children\
+        one level at a time.
+
+        :param session: the instance of Session used for APIC communication
+        :param include_concrete: True or False
+        :returns: List of the children that should be populated lazily
+        """
+        self._session = session
+        return self.populate_children(include_concrete=include_concrete)
+
     def get_parent(self):
         """
         :returns: Parent of this object.
@@ -762,7 +1024,7 @@ class BaseACIObject(AciSearch):
         if self._has_relation(obj):
             return
         relation = BaseRelation(obj, 'attached', relation_type)
-        self._relations.append(relation)
+        self._get_own_container('_relations').append(relation)
 
     def _remove_relation(self, obj, relation_type=None):
         """Remove a relation from the object"""
@@ -923,16 +1185,48 @@ class BaseACIObject(AciSearch):
                             'children': children_json}}
         return resp
 
+    def _get_parent_identity(self):
+        """
+        Get the identity of the parent of this object
+        """
+        parent = self._parent
+        if isinstance(parent, BaseACIObject):
+            return parent._get_identity()
+        return parent
+
+    def _get_identity(self):
+        """
+        Get the key identifying this object, made of the identity of its
+        parent, its class and its name in the manner of a dn.  Two objects
+        of the same class are equal if their identities are equal.  Classes
+        comparing other attributes override this method.
+
+        The key is cached and only rebuilt when the object is renamed or
+        moved to another parent.  Checking the cache walks up the parents,
+        but the keys of the parents are shared by their descendants, so
+        that two keys are compared without comparing the parents one by one.
+
+        :returns: Hashable key
+        """
+        parent_identity = self._get_parent_identity()
+        identity = self.__dict__.get('_identity')
+        if identity is None or identity[0] is not parent_identity or \
+                identity[1] is not self.__class__ or identity[2] != self.name:
+            identity = (parent_identity, self.__class__, self.name)
+            self._identity = identity
+        return identity
+
     def __eq__(self, other):
         if isinstance(other, self.__class__):
-            self_key = (self.get_parent(), self.name)
-            other_key = (other.get_parent(), other.name)
-            return self_key == other_key
+            return self._get_identity() == other._get_identity()
         return NotImplemented
 
     def __ne__(self, other):
         return not self == other
 
+    def __hash__(self):
+        return hash(self._get_identity())
+
     def _populate_from_attributes(self, attributes):
         """Fills in an object with the desired attributes.
            Overridden by inheriting classes to provide the specific attributes
@@ -997,14 +1291,10 @@ class BaseACIObject(AciSearch):
                 tenant_url = tenant_url + parent._get_url_extension()
         query_url = ('/api/mo/uni%s.json?query-target=subtree&'
                      'target-subtree-class=%s' % (tenant_url, apic_class))
-        ret = session.get(query_url)
+        # All of the pages are collected first so that no object is created
+        # if a page fails.  The HTTPError of get_paged is raised to the caller
+        data = list(session.get_paged(query_url))
         resp = []
-        if ret.ok:
-            data = ret.json()['imdata']
-            logging.debug('response returned %s', data)
-        else:
-            logging.error('Could not get %s. Received response: %s', query_url, ret.text)
-            return resp
         for object_data in data:
             name = str(object_data[apic_class]['attributes']['name'])
             obj = toolkit_class(name, parent)
@@ -1050,7 +1340,7 @@ class BaseACIObject(AciSearch):
                     break
         if match:
             result.append(self)
-        for child in self._children:
+        for child in self.get_children():
             result.extend(child.find(search_object))
         return result
 
@@ -1235,9 +1525,11 @@ class BaseACIPhysObject(BaseACIObject):
 
         :returns: None
         """
-        if self.has_child(child_obj):
-            self.remove_child(child_obj)
+        duplicate = self._get_equal_child(child_obj)
+        if duplicate is not None:
+            self._discard_child(duplicate)
         self._children.append(child_obj)
+        self._index_child(child_obj)
 
     def get_children(self, child_type=None):
         """Returns the list of children.  If childType is provided, then
@@ -1250,6 +1542,7 @@ class BaseACIPhysObject(BaseACIObject):
 
         :returns: list of children
         """
+        self._populate_lazily()
         if child_type:
             children = []
             for child in self._children:
@@ -1320,21 +1613,26 @@ class BaseACIPhysObject(BaseACIObject):
                 raise TypeError('The parent of this object must be of class {0}'.format(cls._get_parent_class()))
 
     @classmethod
-    def get_deep(cls, session, include_concrete=False):
+    def get_deep(cls, session, include_concrete=False, lazy=False):
         """
         Will return the atk object and the entire tree under it.
         :param session: APIC session to use
         :param include_concrete: flag to indicate that concrete objects should also be included
+        :param lazy: flag to indicate that the children should only be fetched when get_children is called
         :return:
         """
         atk_objects = cls.get(session)
         for atk_object in atk_objects:
-            atk_object.populate_children(deep=True, include_concrete=include_concrete)
+            if lazy:
+                atk_object.set_lazy_population(session, include_concrete)
+            else:
+                atk_object.populate_children(deep=True, include_concrete=include_concrete)
         return atk_objects
 
 
 class BaseACIPhysModule(BaseACIPhysObject):
     """BaseACIPhysModule: base class for modules  """
+    _child_key = None
 
     def __init__(self, pod, node, slot, parent=None):
         """ Initialize the basic object.  This should be called by the
@@ -1381,6 +1679,14 @@ class BaseACIPhysModule(BaseACIPhysObject):
             return key_attrs(self) == key_attrs(other)
         return NotImplemented
 
+    __hash__ = BaseACIObject.__hash__
+
+    def _get_identity(self):
+        """
+        Get the key identifying the modules, matching their equality
+        """
+        return self.pod, self.node, self.slot, self.type
+
     @staticmethod
     def _parse_dn(dn):
         """Parses the pod, node, and slot from a
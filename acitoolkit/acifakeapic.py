@@ -19,6 +19,7 @@
 from copy import deepcopy
 import json
 import re
+import time
 import urlparse
 
 from .acisession import Session
@@ -77,6 +78,14 @@ class FakeSession(Session):
         """
         self.db = []
         self.subscription_thread = FakeSubscriber()
+        self._executor = None
+        self._stats = None
+        self._rate_limiter = None
+        self._journal = None
+        self._coalescer = None
+        self._queue_limit = None
+        self._token_cache = None
+        self._single_flight = None
         self._classes = {}
         for filename in filenames:
             with open(filename, 'r') as f:
@@ -325,6 +334,37 @@ class FakeSession(Session):
         """
         return None
 
+    def wait_for_events(self, urls, timeout=None):
+        """
+        Wait until there are events for at least one of the URLs.  There
+        are never any events so this only waits for the timeout.
+
+        :param urls:  List of URL strings belonging to subscriptions
+        :param timeout: Optional number of seconds to wait.
+        :returns: Empty list
+        """
+        if timeout is not None:
+            time.sleep(timeout)
+        return []
+
+    def add_event_callback(self, url, callback):
+        """
+        Register a function called when there are events for the URL.
+
+        :param url:  URL string belonging to subscription
+        :param callback: Function taking the URL string
+        """
+        pass
+
+    def remove_event_callback(self, url, callback):
+        """
+        Remove a function registered with add_event_callback.
+
+        :param url:  URL string belonging to subscription
+        :param callback: Function previously registered for the URL
+        """
+        pass
+
     def unsubscribe(self, url):
         """
         Unsubscribe from events for a particular URL.  Used internally by the
@@ -415,3 +455,40 @@ class FakeSession(Session):
         else:
             resp = FakeResponse(self._get_config(url))
         return resp
+
+    def get_many(self, urls, max_workers=8, timeout=None):
+        """
+        Perform several REST GET calls to the APIC.  The fake APIC serves
+        the calls one after the other.
+
+        :param urls: List of strings containing the URLs to get.
+        :param max_workers: Ignored by the fake APIC.
+        :param timeout: Ignored by the fake APIC.
+        :returns: List of FakeResponse instances in the same order as the urls.
+        """
+        return [self.get(url) for url in urls]
+
+    def get_stream(self, url, strip_newlines=False, timeout=None):
+        """
+        Perform a REST GET call to the APIC.  The fake APIC returns all of
+        the results at once.
+
+        :param url: String containing the query URL.
+        :param strip_newlines: Ignored by the fake APIC.
+        :param timeout: Ignored by the fake APIC.
+        :returns: list containing the dictionaries of the imdata list.
+        """
+        return self.get(url).json()['imdata']
+
+    def get_paged(self, url, page_size=None, order_by=None, timeout=None):
+        """
+        Perform a REST GET call to the APIC.  The fake APIC does not
+        paginate so all of the results are returned at once.
+
+        :param url: String containing the query URL.
+        :param page_size: Ignored by the fake APIC.
+        :param order_by: Ignored by the fake APIC.
+        :param timeout: Ignored by the fake APIC.
+        :returns: list containing the dictionaries of the imdata list.
+        """
+        return self.get(url).json()['imdata']
@@ -642,6 +642,7 @@ class Fantray(BaseACIPhysModule):
 
 class Fan(BaseACIPhysModule):
     """Class for the fan of a fan tray"""
+    _child_key = None
 
     def __init__(self, parent=None):
         """ Initialize the basic fan.
@@ -761,6 +762,14 @@ class Fan(BaseACIPhysModule):
             return key_attrs(self) == key_attrs(other)
         return NotImplemented
 
+    __hash__ = BaseACIObject.__hash__
+
+    def _get_identity(self):
+        """
+        Get the key identifying the fans, matching their equality
+        """
+        return self.model, self.id, self._get_parent_identity()
+
     def __str__(self):
         """
         Default print string
@@ -918,6 +927,7 @@ class Powersupply(BaseACIPhysModule):
 
 class Pod(BaseACIPhysObject):
     """ Pod :  roughly equivalent to fabricPod """
+    _child_key = None
 
     def __init__(self, pod, dn=None, parent=None):
         """ Initialize the basic object.  It will
@@ -1008,6 +1018,14 @@ class Pod(BaseACIPhysObject):
             return self.pod == other.pod
         return NotImplemented
 
+    __hash__ = BaseACIObject.__hash__
+
+    def _get_identity(self):
+        """
+        Get the key identifying the pods, matching their equality
+        """
+        return self.pod
+
     def __str__(self):
         return self.name
 
@@ -1198,19 +1216,18 @@ class Node(BaseACIPhysObject):
 
         else:
             class_url = '/api/node/class/fabricNode.json?'
-            ret = session.get(class_url)
-            ret._content = ret._content.decode().replace('\n', '').encode()
-            data = ret.json()['imdata']
+            data = session.get_stream(class_url, strip_newlines=True)
             working_data = WorkingData()
+            base_urls = []
             for item in data:
                 if 'fabricNode' in item:
                     if 'role' in item['fabricNode']['attributes']:
                         if item['fabricNode']['attributes']['role'] in ['leaf', 'spine', 'controller']:
                             node_dn = item['fabricNode']['attributes']['dn']
-                            base_url = '/api/mo/' + node_dn + '.json?'
-                            working_data.add(session, Node, base_url)
+                            base_urls.append('/api/mo/' + node_dn + '.json?')
 
                             # base_url = '/api/mo/topology/pod-{0}.json?'.format(pod_id)
+            working_data.add_many(session, Node, base_urls)
 
         nodes = []
         data = working_data.get_class('fabricNode')
@@ -1250,15 +1267,29 @@ class Node(BaseACIPhysObject):
                 if node_match and pod_match:
                     if node.role == 'leaf':
                         node._add_vpc_info(working_data)
-                    node.get_health()
                     node.get_firmware(working_data)
 
                     if isinstance(parent, Pod):
                         node._parent.add_child(node)
 
                     nodes.append(node)
+        cls._get_health_many(session, nodes)
         return nodes
 
+    @classmethod
+    def get_async(cls, session, parent=None, node_id=None):
+        """Gets the Nodes from the APIC in the background.  The parameters
+        are the same as get.
+
+        :param session: APIC session
+        :param parent: optional parent object or pod_id
+        :param node_id: optional node_id of switch
+
+        :returns: RequestFuture instance whose result is the list of Nodes
+        """
+        cls.check_session(session)
+        return session.submit(cls.get, session, parent=parent, node_id=node_id)
+
     def get_firmware(self, working_data):
         """
         retrieves firmware version
@@ -1271,21 +1302,45 @@ class Node(BaseACIPhysObject):
                 if 'firmwareCardRunning' in data:
                     self.firmware = data['firmwareCardRunning']['attributes']['version']
 
+    def _get_health_url(self):
+        """
+        Get the URL used to query the health of the switch node
+        """
+        return '/api/mo/' + self.dn + \
+               '/sys.json?&rsp-subtree-include=stats&rsp-subtree-class=fabricNodeHealth5min'
+
+    def _populate_health(self, ret):
+        """
+        Fill in the health of the switch node from the health query response
+        """
+        data = ret.json()['imdata']
+        if data:
+            if 'topSystem' in data[0]:
+                if 'children' in data[0]['topSystem']:
+                    ts_child = data[0]['topSystem']['children']
+                    if 'fabricNodeHealth5Min' in ts_child[0]:
+                        self.health = ts_child[0]['fabricNodeHealth5min']['attributes']['healthLast']
+
     def get_health(self):
         """
         This will get the health of the switch node
         """
         if self.role != 'controller':
-            mo_query_url = '/api/mo/' + self.dn + \
-                           '/sys.json?&rsp-subtree-include=stats&rsp-subtree-class=fabricNodeHealth5min'
-            ret = self._session.get(mo_query_url)
-            data = ret.json()['imdata']
-            if data:
-                if 'topSystem' in data[0]:
-                    if 'children' in data[0]['topSystem']:
-                        ts_child = data[0]['topSystem']['children']
-                        if 'fabricNodeHealth5Min' in ts_child[0]:
-                            self.health = ts_child[0]['fabricNodeHealth5min']['attributes']['healthLast']
+            ret = self._session.get(self._get_health_url())
+            self._populate_health(ret)
+
+    @staticmethod
+    def _get_health_many(session, nodes):
+        """
+        Get the health of several switch nodes with the queries issued in parallel
+
+        :param session: APIC session
+        :param nodes: list of Nodes
+        """
+        nodes = [node for node in nodes if node.role != 'controller']
+        responses = session.get_many([node._get_health_url() for node in nodes])
+        for node, ret in zip(nodes, responses):
+            node._populate_health(ret)
 
     def _add_vpc_info(self, working_data):
         """
@@ -1352,6 +1407,14 @@ class Node(BaseACIPhysObject):
             return key_attrs(self) == key_attrs(other)
         return NotImplemented
 
+    __hash__ = BaseACIObject.__hash__
+
+    def _get_identity(self):
+        """
+        Get the key identifying the nodes, matching their equality
+        """
+        return self.pod, self.node, self.name, self.role
+
     def _populate_from_attributes(self, attributes):
         """Fills in an object with the desired attributes.
         """
@@ -1468,7 +1531,7 @@ class Node(BaseACIPhysObject):
 
         :returns: List of children objects
         """
-
+        self._lazy_population = None
         session = self._session
         for child_class in self._get_children_classes():
             child_class.get(session, self)
@@ -1846,9 +1909,18 @@ class ExternalSwitch(BaseACIPhysObject):
             return self.name == other.name
         return NotImplemented
 
+    __hash__ = BaseACIObject.__hash__
+
+    def _get_identity(self):
+        """
+        Get the key identifying the external switches, matching their equality
+        """
+        return self.name
+
 
 class Link(BaseACIPhysObject):
     """Link class, equivalent to the fabricLink object in APIC"""
+    _child_key = None
 
     def __init__(self, parent=None):
         """
@@ -1991,6 +2063,14 @@ class Link(BaseACIPhysObject):
             return key_attrs(self) == key_attrs(other)
         return NotImplemented
 
+    __hash__ = BaseACIObject.__hash__
+
+    def _get_identity(self):
+        """
+        Get the key identifying the links, matching their equality
+        """
+        return self.pod, self.node1, self.slot1, self.port1
+
     def get_node1(self):
         """Returns the Node object that corresponds to the first
         node of the link.  The Node must be a child of
@@ -2135,6 +2215,7 @@ class Link(BaseACIPhysObject):
 class Interface(BaseInterface):
     """This class defines a physical interface.
     """
+    _child_key = None
 
     def __init__(self, interface_type, pod, node, module, port,
                  parent=None, session=None, attributes=None):
@@ -2613,19 +2694,16 @@ class Interface(BaseInterface):
             interface_query_url = '/api/node/class/l1PhysIf.json?query-target=self'
             eth_query_url = '/api/node/class/ethpmPhysIf.json?query-target=self'
 
-        ret = session.get(interface_query_url)
-        interface_data = ret.json()['imdata']
-
-        # also get information about the ethernet interface
-        eth_resp = session.get(eth_query_url)
+        # get information about the ethernet interface
         resp = []
-        eth_data = eth_resp.json()['imdata']
+        eth_data = session.get_paged(eth_query_url)
 
         # re-index the ethernet port info so it can be referenced by dn
         eth_data_dict = {}
         for obj in eth_data:
             eth_data_dict[obj['ethpmPhysIf']['attributes']['dn']] = obj['ethpmPhysIf']['attributes']
 
+        interface_data = session.get_paged(interface_query_url)
         for interface in interface_data:
             if 'l1PhysIf' in interface:
                 attributes = {}
@@ -2687,6 +2765,14 @@ class Interface(BaseInterface):
             return True
         return False
 
+    __hash__ = BaseACIObject.__hash__
+
+    def _get_identity(self):
+        """
+        Get the key identifying the interfaces, matching their equality
+        """
+        return self.interface_type, self.pod, self.node, self.module, self.port
+
     def get_adjacent_port(self):
         """
         This will return the port ID of the port at the other end of the link.
@@ -2746,19 +2832,46 @@ class WorkingData(object):
         if session is None:
             return
 
+        query_url = self._get_query_url(toolkit_class, url, deep, include_concrete)
+        self._add_data(list(session.get_stream(query_url, strip_newlines=True)))
+
+    def add_many(self, session=None, toolkit_class=None, urls=(), deep=False, include_concrete=False):
+        """
+        Add the data of several base URLs.  The queries are issued in parallel.
+
+        :param session:
+        :param toolkit_class:
+        :param urls: list of base URL strings
+        :param deep:
+        :param include_concrete:
+        :return:
+        """
+        self.session = session
+        if session is None:
+            return
+
+        query_urls = [self._get_query_url(toolkit_class, url, deep, include_concrete) for url in urls]
+        for data in session.get_many_stream(query_urls, strip_newlines=True):
+            self._add_data(data)
+
+    @staticmethod
+    def _get_query_url(toolkit_class, url, deep=False, include_concrete=False):
+        """
+        Build the subtree query URL for the APIC classes of the toolkit class
+        """
         if deep:
             apic_classes = toolkit_class.get_deep_apic_classes(include_concrete=include_concrete)
         else:
             # noinspection PyProtectedMember
             apic_classes = toolkit_class._get_apic_classes()
-        query_url = url + 'query-target=subtree&target-subtree-class=' + ','.join(apic_classes)
-
-        ret = session.get(query_url)
-        ret._content = ret._content.decode().replace('\n', '').encode()
-        data = ret.json()['imdata']
+        return url + 'query-target=subtree&target-subtree-class=' + ','.join(apic_classes)
 
+    def _add_data(self, data):
+        """
+        Index the imdata list returned by a query
+        """
         if data:
-            self.rawjson = ret.json()['imdata']
+            self.rawjson = data
         else:
             self.rawjson = None
 
@@ -3123,15 +3236,19 @@ class Fabric(BaseACIObject):
         return [fabric]
 
     @classmethod
-    def get_deep(cls, session, include_concrete=False):
+    def get_deep(cls, session, include_concrete=False, lazy=False):
         """
         Will return the entire tree of the fabric.
         :param session: APIC session to use
         :param include_concrete: flag to indicate that concrete objects should also be included
+        :param lazy: flag to indicate that the children should only be fetched when get_children is called
         :return:
         """
         fabrics = cls.get(session)
-        fabrics[0].populate_children(deep=True, include_concrete=include_concrete)
+        if lazy:
+            fabrics[0].set_lazy_population(session, include_concrete)
+        else:
+            fabrics[0].populate_children(deep=True, include_concrete=include_concrete)
         return fabrics
 
     @staticmethod
@@ -30,22 +30,39 @@
 """  This module contains the Session class that controls communication
      with the APIC.
 """
+from collections import OrderedDict
+from contextlib import contextmanager
+import atexit
+import base64
+import codecs
 import copy
 import json
+import bisect
+import heapq
 import logging
+import mmap
+import os
+import random
+import re
 import ssl
+import struct
 import threading
 import time
 import socket
+import weakref
 
 import requests
 try:
     from requests.packages.urllib3.exceptions import InsecureRequestWarning
 except ImportError:
     pass
-from six.moves.queue import Queue
+from six.moves.queue import Empty, Queue
 from websocket import create_connection, WebSocketException
 from requests.exceptions import ConnectionError
+try:
+    from OpenSSL import crypto
+except ImportError:
+    crypto = None
 
 try:
     import urllib3
@@ -65,6 +82,856 @@ class CredentialsError(Exception):
         self.message = message
 
 
+class CircuitOpenError(ConnectionError):
+    """
+    Raised instead of sending a request while the circuit breaker of a
+    RateLimiter is open.  It is a ConnectionError so that callers handling
+    an unreachable APIC handle it the same way.
+    """
+    pass
+
+
+class RateLimiter(object):
+    """
+    Client side flow control of the requests sent to an APIC.
+
+    Requests are admitted by a token bucket limiting the request rate and
+    by a concurrency limit adjusted with additive increase and
+    multiplicative decrease: every throttled request (429, 503 or a
+    connection error) halves the limit and every other request raises it
+    by 1/limit.  Throttled requests are retried with exponential backoff
+    and full jitter.  After failure_threshold consecutive failures the
+    circuit breaker opens and requests fail immediately with
+    CircuitOpenError until reset_timeout has elapsed, after which a single
+    request is let through to probe the APIC.  Requests that fail with any
+    other exception, such as an invalid URL, give their slot back without
+    changing the concurrency limit or the circuit breaker.
+
+    A RateLimiter can be shared by several sessions talking to the same APIC.
+    """
+    throttle_codes = (429, 503)
+
+    def __init__(self, rate=50.0, burst=None, max_concurrency=16, min_concurrency=1,
+                 decrease_factor=0.5, max_retries=5, backoff_base=0.5, backoff_max=30.0,
+                 failure_threshold=10, reset_timeout=30.0):
+        """
+        :param rate: Number of requests per second allowed on average
+        :param burst: Number of requests that can be sent at once after an\
+                      idle period.  Default is one second worth of requests.
+        :param max_concurrency: Maximum number of requests in flight
+        :param min_concurrency: Minimum number of requests in flight
+        :param decrease_factor: Factor applied to the concurrency limit when\
+                                a request is throttled
+        :param max_retries: Number of times a throttled request is retried
+        :param backoff_base: Number of seconds of the first backoff
+        :param backoff_max: Maximum number of seconds of a backoff
+        :param failure_threshold: Number of consecutive failures opening the\
+                                  circuit breaker
+        :param reset_timeout: Number of seconds the circuit breaker stays open
+        """
+        self.rate = float(rate)
+        self.burst = float(burst or max(1.0, self.rate))
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.decrease_factor = decrease_factor
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.concurrency = float(max_concurrency)
+        self.failures = 0
+        self.throttled = 0
+        self.rejected = 0
+        self._tokens = self.burst
+        self._last_refill = time.time()
+        self._in_flight = 0
+        self._opened = None
+        self._probing = False
+        self._cond = threading.Condition()
+
+    @property
+    def is_open(self):
+        """
+        Indicates whether the circuit breaker is rejecting requests.
+        """
+        with self._cond:
+            return self._opened is not None and time.time() - self._opened < self.reset_timeout
+
+    def _check_circuit(self):
+        """
+        Raise CircuitOpenError if the circuit breaker rejects the request.
+        Must be called with the lock held.
+        """
+        if self._opened is None:
+            return
+        if self._probing or time.time() - self._opened < self.reset_timeout:
+            self.rejected += 1
+            raise CircuitOpenError('Not sending request, APIC failed %s consecutive requests' % self.failures)
+        self._probing = True
+
+    def acquire(self):
+        """
+        Wait until a request can be sent.  Every call must be followed by a
+        call to release once the request has completed.
+        """
+        with self._cond:
+            self._check_circuit()
+            while self._in_flight >= int(self.concurrency):
+                self._cond.wait()
+            self._in_flight += 1
+        while True:
+            with self._cond:
+                now = time.time()
+                self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+                self._last_refill = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+
+    def release(self, status_code=None, aborted=False):
+        """
+        Record the outcome of a request admitted by acquire and give its
+        slot back.
+
+        :param status_code: Integer containing the HTTP status code of the\
+                            response or None if the request failed with a\
+                            connection error or a timeout.
+        :param aborted: True if the request failed with an exception that\
+                        says nothing about the load of the APIC.  The\
+                        outcome is then not recorded.
+        :returns: True if the request was throttled and should be retried.
+        """
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+            return self.record(status_code, aborted)
+
+    def release_slot(self):
+        """
+        Give back the slot of a request whose outcome was recorded with
+        record, once its response has been read.
+        """
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def record(self, status_code=None, aborted=False):
+        """
+        Record the outcome of a request admitted by acquire without giving
+        its slot back, such as when the body of a streamed response is still
+        to be read.  The slot is given back with release_slot.
+
+        :param status_code: Integer containing the HTTP status code of the\
+                            response or None if the request failed with a\
+                            connection error or a timeout.
+        :param aborted: True if the request failed with an exception that\
+                        says nothing about the load of the APIC.
+        :returns: True if the request was throttled and should be retried.
+        """
+        if aborted:
+            with self._cond:
+                # Let another request probe the APIC
+                self._probing = False
+            return False
+        throttled = status_code is None or status_code in self.throttle_codes
+        failed = throttled or status_code >= 500
+        with self._cond:
+            if throttled:
+                self.throttled += 1
+                self.concurrency = max(self.min_concurrency, self.concurrency * self.decrease_factor)
+            else:
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1.0 / self.concurrency)
+            if failed:
+                self.failures += 1
+                if self._probing or self.failures >= self.failure_threshold:
+                    self._opened = time.time()
+            else:
+                self.failures = 0
+                self._opened = None
+            self._probing = False
+        return throttled
+
+    def get_backoff(self, attempt, retry_after=None):
+        """
+        Get the number of seconds to wait before retrying a request.
+
+        :param attempt: Integer containing the number of retries already made
+        :param retry_after: Optional number of seconds requested by the APIC\
+                            in a Retry-After header
+        :returns: Number of seconds to wait
+        """
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, min(self.backoff_max, retry_after))
+        return delay
+
+
+def _copy_response(resp):
+    """
+    Make a shallow copy of a response that is handed to several callers,
+    so that a caller changing its copy does not change the others.
+
+    :param resp: Response class instance from the requests library.  Any\
+                 other object is returned as is.
+    :returns: Response class instance
+    """
+    if not isinstance(resp, requests.Response):
+        return resp
+    return copy.copy(resp)
+
+
+class ResponseCache(object):
+    """
+    Read-through cache of the responses to APIC GET requests.  Entries are
+    kept in least recently used order, bounded by count and by size in
+    bytes, and expire after a time to live.
+
+    Entries are also invalidated when a subscription event arrives for a
+    class or dn covered by the cached query, so reads of subscribed classes
+    stay correct without waiting for the entry to expire.  Any change
+    pushed through the session clears the cache.
+    """
+    _class_re = re.compile(r'"(\w+)":\s*\{\s*"attributes"')
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024, ttl=60):
+        """
+        :param max_entries: Integer containing the maximum number of cached responses
+        :param max_bytes: Integer containing the maximum total size of the cached responses
+        :param ttl: Number of seconds that a response is kept in the cache
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._by_class = {}
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize_url(url):
+        """
+        Normalize a query URL so that equivalent queries share an entry.
+
+        :param url: String containing the query URL
+        :returns: String containing the URL with the options sorted
+        """
+        path, _, query = url.partition('?')
+        params = sorted(param for param in query.split('&') if param)
+        if not params:
+            return path
+        return path + '?' + '&'.join(params)
+
+    @staticmethod
+    def is_cacheable(url):
+        """
+        Check whether the responses of a URL can be cached.  Logins,
+        refreshes and subscriptions are never cached.
+
+        :param url: String containing the query URL
+        :returns: True or False
+        """
+        return not ('subscription' in url or url.startswith('/api/aaa'))
+
+    @staticmethod
+    def _get_query_scope(url):
+        """
+        Get the classes and the dn covered by a query URL
+        """
+        path, _, query = url.partition('?')
+        classes = set()
+        dn = None
+        if '/class/' in path:
+            classes.add(path.split('/class/')[1].split('.json')[0])
+        elif '/mo/' in path:
+            dn = path.split('/mo/', 1)[1].rpartition('.')[0]
+        for param in query.split('&'):
+            key, _, value = param.partition('=')
+            if key in ('target-subtree-class', 'rsp-subtree-class'):
+                classes.update(value.split(','))
+        return classes, dn
+
+    def get(self, url):
+        """
+        Get the cached response for a URL.  Every caller gets its own copy.
+
+        :param url: String containing the query URL
+        :returns: Response class instance or None if not cached
+        """
+        key = self.normalize_url(url)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if time.time() - entry['timestamp'] > self.ttl:
+                self._remove(key)
+                self.misses += 1
+                return None
+            del self._entries[key]
+            self._entries[key] = entry
+            self.hits += 1
+            return _copy_response(entry['response'])
+
+    def put(self, url, resp):
+        """
+        Add a response to the cache.
+
+        :param url: String containing the query URL
+        :param resp: Response class instance from the requests library
+        """
+        if not self.is_cacheable(url):
+            return
+        content = resp.content
+        size = len(content)
+        if size > self.max_bytes:
+            return
+        classes, dn = self._get_query_scope(url)
+        if not isinstance(content, str):
+            content = content.decode('utf-8', 'replace')
+        classes.update(self._class_re.findall(content))
+        key = self.normalize_url(url)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = {'response': _copy_response(resp),
+                                  'timestamp': time.time(),
+                                  'size': size,
+                                  'classes': classes,
+                                  'dn': dn}
+            self._size += size
+            for class_name in classes:
+                self._by_class.setdefault(class_name, set()).add(key)
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        """
+        Remove an entry.  Must be called with the lock held.
+        """
+        entry = self._entries.pop(key)
+        self._size -= entry['size']
+        for class_name in entry['classes']:
+            keys = self._by_class.get(class_name)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_class[class_name]
+
+    def invalidate(self, class_name=None, dn=None):
+        """
+        Remove the entries covering an APIC class or dn.
+
+        :param class_name: String containing the APIC class name
+        :param dn: String containing the distinguished name of the object
+        """
+        with self._lock:
+            keys = set(self._by_class.get(class_name, ()))
+            if dn is not None:
+                for key, entry in self._entries.items():
+                    entry_dn = entry['dn']
+                    if entry_dn is None:
+                        continue
+                    if dn == entry_dn or dn.startswith(entry_dn + '/') or entry_dn.startswith(dn + '/'):
+                        keys.add(key)
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+
+    def invalidate_event(self, event):
+        """
+        Remove the entries covered by the objects of a subscription event.
+
+        :param event: Dictionary containing the decoded event
+        """
+        for item in event.get('imdata', []):
+            for class_name in item:
+                dn = item[class_name].get('attributes', {}).get('dn')
+                self.invalidate(class_name, dn)
+
+    def clear(self):
+        """
+        Remove all of the entries.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._by_class = {}
+            self._size = 0
+
+
+class RequestStats(object):
+    """
+    Collects metrics about the requests sent by a Session.  Requests are
+    grouped by method and query pattern, where the pattern identifies the
+    kind of query without the names in it, for example ``class:fvCEp``,
+    ``subtree:fvBD`` or ``mo:uni/tn/ap/epg``.
+
+    For each pattern the number of requests, a latency histogram, the
+    response bytes, the decode time of streamed responses, the number of
+    403 retries and the number of errors are kept.
+    """
+    buckets = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+    _bracket_re = re.compile(r'\[[^\]]*\]')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._patterns = {}
+        self.relogins = 0
+
+    @classmethod
+    def get_pattern(cls, url):
+        """
+        Get the query pattern of a URL.
+
+        :param url: String containing the query URL
+        :returns: String containing the query pattern
+        """
+        path, _, query = url.partition('?')
+        params = dict(param.partition('=')[::2] for param in query.split('&') if param)
+        if '/class/' in path:
+            return 'class:' + path.split('/class/')[1].split('.json')[0]
+        if '/mo/' in path:
+            if 'target-subtree-class' in params:
+                return 'subtree:' + params['target-subtree-class']
+            dn = cls._bracket_re.sub('', path.split('/mo/', 1)[1].rpartition('.')[0])
+            return 'mo:' + '/'.join(rn.split('-')[0] for rn in dn.split('/'))
+        return path.split('/api/')[-1].split('.json')[0]
+
+    def _get_entry(self, method, url):
+        """
+        Get the metrics of the pattern of a URL.  Must be called with the
+        lock held.
+        """
+        key = (method.upper(), self.get_pattern(url))
+        entry = self._patterns.get(key)
+        if entry is None:
+            entry = {'count': 0,
+                     'latency_sum': 0.0,
+                     'latency_buckets': [0] * len(self.buckets),
+                     'bytes': 0,
+                     'decode_time': 0.0,
+                     'retries': 0,
+                     'errors': 0}
+            self._patterns[key] = entry
+        return entry
+
+    def record(self, method, url, latency, size=None, status_code=200):
+        """
+        Record a completed request.
+
+        :param method: String containing the HTTP method
+        :param url: String containing the query URL
+        :param latency: Number of seconds the request took
+        :param size: Optional number of bytes in the response
+        :param status_code: Integer containing the HTTP status code
+        """
+        with self._lock:
+            entry = self._get_entry(method, url)
+            entry['count'] += 1
+            entry['latency_sum'] += latency
+            for index, bucket in enumerate(self.buckets):
+                if latency <= bucket:
+                    entry['latency_buckets'][index] += 1
+            if size is not None:
+                entry['bytes'] += size
+            if status_code >= 400:
+                entry['errors'] += 1
+
+    def record_stream(self, method, url, size, decode_time):
+        """
+        Record the size and decode time of a streamed response.
+
+        :param method: String containing the HTTP method
+        :param url: String containing the query URL
+        :param size: Number of bytes in the response
+        :param decode_time: Number of seconds spent decoding the response
+        """
+        with self._lock:
+            entry = self._get_entry(method, url)
+            entry['bytes'] += size
+            entry['decode_time'] += decode_time
+
+    def record_retry(self, method, url):
+        """
+        Record a request retried after a 403 response.
+        """
+        with self._lock:
+            self._get_entry(method, url)['retries'] += 1
+
+    def record_error(self, method, url):
+        """
+        Record a request that failed with an exception.
+        """
+        with self._lock:
+            self._get_entry(method, url)['errors'] += 1
+
+    def record_relogin(self):
+        """
+        Record a login sent again after a 403 response.
+        """
+        with self._lock:
+            self.relogins += 1
+
+    def snapshot(self):
+        """
+        Get a copy of the collected metrics.
+
+        :returns: Dictionary with the relogin count and a dictionary of\
+                  metrics for each (method, pattern) tuple.
+        """
+        with self._lock:
+            patterns = {}
+            for key, entry in self._patterns.items():
+                entry = dict(entry)
+                entry['latency_buckets'] = list(zip(self.buckets, entry['latency_buckets']))
+                patterns[key] = entry
+            return {'relogins': self.relogins, 'patterns': patterns}
+
+    def reset(self):
+        """
+        Discard the collected metrics.
+        """
+        with self._lock:
+            self._patterns = {}
+            self.relogins = 0
+
+
+class PrometheusExporter(object):
+    """
+    Formats the metrics collected by RequestStats in the Prometheus text
+    exposition format.  Other exporters can be used with
+    Session.export_stats by providing an object with an export method
+    taking the stats snapshot.
+    """
+    def __init__(self, prefix='acitoolkit_request'):
+        """
+        :param prefix: String prepended to the metric names
+        """
+        self.prefix = prefix
+
+    def export(self, snapshot):
+        """
+        Format a stats snapshot.
+
+        :param snapshot: Dictionary returned by RequestStats.snapshot
+        :returns: String in the Prometheus text format
+        """
+        prefix = self.prefix
+        lines = ['# TYPE %s_relogins_total counter' % prefix,
+                 '%s_relogins_total %s' % (prefix, snapshot['relogins']),
+                 '# TYPE %s_duration_seconds histogram' % prefix]
+        counters = (('bytes', 'response_bytes_total'),
+                    ('decode_time', 'decode_seconds_total'),
+                    ('retries', 'retries_total'),
+                    ('errors', 'errors_total'))
+        for (method, pattern), entry in sorted(snapshot['patterns'].items()):
+            labels = 'method="%s",pattern="%s"' % (method, pattern.replace('"', '\\"'))
+            for bucket, count in entry['latency_buckets']:
+                lines.append('%s_duration_seconds_bucket{%s,le="%s"} %s' % (prefix, labels, bucket, count))
+            lines.append('%s_duration_seconds_bucket{%s,le="+Inf"} %s' % (prefix, labels, entry['count']))
+            lines.append('%s_duration_seconds_sum{%s} %s' % (prefix, labels, entry['latency_sum']))
+            lines.append('%s_duration_seconds_count{%s} %s' % (prefix, labels, entry['count']))
+            for key, name in counters:
+                lines.append('%s_%s{%s} %s' % (prefix, name, labels, entry[key]))
+        return '\n'.join(lines) + '\n'
+
+
+class ImdataDecoder(object):
+    """
+    Incremental decoder of the imdata list in an APIC response.  The
+    response body is fed in chunks as it arrives and each object of the
+    imdata list is decoded as soon as it is complete, so that only the
+    object currently being received is buffered.
+
+    The escaped single quotes (``\\'``) that the APIC sends and that are
+    not valid JSON are fixed while decoding.  Newlines can optionally be
+    removed as well.
+    """
+    chunk_size = 64 * 1024
+    _token_re = re.compile(r'["{}\[\]]')
+    _string_end_re = re.compile(r'(?:[^"\\]|\\.)*"', re.S)
+
+    def __init__(self, strip_newlines=False):
+        """
+        :param strip_newlines: Boolean indicating whether to remove newlines
+        """
+        self.strip_newlines = strip_newlines
+        self._buffer = ''
+        self._pos = 0
+        self._depth = 0
+        self._last_key = None
+        self._in_imdata = False
+        self._item_start = None
+        self._held_back = ''
+        self._text_decoder = None
+
+    def feed(self, chunk):
+        """
+        Add a chunk of the response body.
+
+        :param chunk: String containing the next part of the response
+        :returns: List of the imdata objects completed by this chunk
+        """
+        if not isinstance(chunk, str):
+            if self._text_decoder is None:
+                self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+            chunk = self._text_decoder.decode(chunk)
+        chunk = self._held_back + chunk
+        self._held_back = ''
+        if self.strip_newlines:
+            chunk = chunk.replace('\n', '')
+        # Hold back a trailing backslash in case the quote is in the next chunk
+        if chunk.endswith('\\'):
+            self._held_back = '\\'
+            chunk = chunk[:-1]
+        self._buffer += chunk.replace("\\'", "'")
+        return self._scan()
+
+    def _scan(self):
+        """
+        Scan the buffered text for complete imdata objects
+        """
+        items = []
+        buf = self._buffer
+        pos = self._pos
+        while True:
+            match = self._token_re.search(buf, pos)
+            if match is None:
+                pos = len(buf)
+                break
+            index = match.start()
+            token = match.group()
+            if token == '"':
+                string_end = self._string_end_re.match(buf, index + 1)
+                if string_end is None:
+                    # Wait for the rest of the string
+                    pos = index
+                    break
+                if self._depth == 1:
+                    self._last_key = buf[index + 1:string_end.end() - 1]
+                pos = string_end.end()
+                continue
+            if token in '{[':
+                self._depth += 1
+                if self._depth == 2 and token == '[' and self._last_key == 'imdata':
+                    self._in_imdata = True
+                elif self._in_imdata and self._depth == 3 and self._item_start is None:
+                    self._item_start = index
+            else:
+                self._depth -= 1
+                if self._in_imdata and self._depth == 2 and self._item_start is not None:
+                    items.append(json.loads(buf[self._item_start:index + 1]))
+                    self._item_start = None
+                elif self._in_imdata and self._depth == 1:
+                    self._in_imdata = False
+            pos = index + 1
+        # Discard the text that is no longer needed
+        keep = pos if self._item_start is None else self._item_start
+        self._buffer = buf[keep:]
+        self._pos = pos - keep
+        if self._item_start is not None:
+            self._item_start = 0
+        return items
+
+
+class PushBatcher(object):
+    """
+    Collects the configuration pushed through a Session and sends it to the
+    APIC as a small number of merged trees instead of one POST per object.
+
+    Payloads pushed to the same URL are merged object by object.  Objects
+    are matched by class and naming property (dn, rn, name, tDn, ip, addr
+    or mac); the attributes of later payloads override those of earlier
+    ones and the children are merged recursively.  Payloads pushed to
+    ``/api/mo/uni.json`` are combined under a single polUni root.
+
+    The merged trees are sent when the number of queued payloads reaches
+    max_objects, when max_delay seconds have passed since the first queued
+    payload, or when flush is called.  If a merged POST is refused, its
+    payloads are pushed one at a time so that the failing objects can be
+    reported in errors.  If a merged POST raises a request exception, such
+    as a ConnectionError, all of its payloads are reported in errors with
+    the exception in place of the response.
+    """
+    _naming_properties = ('dn', 'rn', 'name', 'tDn', 'ip', 'addr', 'mac')
+
+    def __init__(self, session, max_objects=500, max_delay=None):
+        """
+        :param session: the instance of Session used for APIC communication
+        :param max_objects: Integer containing the number of queued payloads\
+                            that causes the batch to be sent.
+        :param max_delay: Optional number of seconds after which queued\
+                          payloads are sent.
+        """
+        self._session = session
+        self.max_objects = max_objects
+        self.max_delay = max_delay
+        self.errors = []
+        self.num_pushed = 0
+        self.num_posts = 0
+        self._trees = OrderedDict()
+        self._payloads = []
+        self._timer = None
+        self._lock = threading.RLock()
+        # Held while a batch is sent so that the batches are sent in order
+        self._flush_lock = threading.Lock()
+
+    @classmethod
+    def _get_key(cls, class_name, attributes):
+        """
+        Get the key identifying an object among its siblings
+        """
+        for prop in cls._naming_properties:
+            if prop in attributes:
+                return class_name, prop, attributes[prop]
+        identity = tuple(sorted((key, value) for key, value in attributes.items()
+                                if key != 'status'))
+        return class_name, None, identity
+
+    @classmethod
+    def _merge(cls, trees, item):
+        """
+        Merge an object into a list of sibling objects.
+
+        :param trees: OrderedDict of the merged sibling objects keyed by\
+                      their identity.
+        :param item: Dictionary containing the JSON object to merge
+        """
+        for class_name in item:
+            attributes = item[class_name].get('attributes', {})
+            key = cls._get_key(class_name, attributes)
+            if key not in trees:
+                trees[key] = (class_name, {}, OrderedDict())
+            merged_class, merged_attributes, merged_children = trees[key]
+            if 'status' not in attributes and merged_attributes.get('status') == 'deleted':
+                del merged_attributes['status']
+            merged_attributes.update(attributes)
+            for child in item[class_name].get('children', []):
+                cls._merge(merged_children, child)
+
+    @classmethod
+    def _build(cls, trees):
+        """
+        Build the JSON objects from the merged sibling objects
+        """
+        resp = []
+        for class_name, attributes, children in trees.values():
+            resp.append({class_name: {'attributes': attributes,
+                                      'children': cls._build(children)}})
+        return resp
+
+    def add(self, url, data):
+        """
+        Queue a payload to be pushed to the APIC.
+
+        :param url: String containing the URL that will be used to\
+                    send the object data to the APIC.
+        :param data: Dictionary containing the JSON objects to be sent\
+                     to the APIC.
+        :returns: Response class instance with a 202 status code indicating\
+                  that the payload has been queued.
+        """
+        with self._lock:
+            if url not in self._trees:
+                self._trees[url] = OrderedDict()
+            if url == '/api/mo/uni.json' and 'polUni' in data:
+                for child in data['polUni'].get('children', []):
+                    self._merge(self._trees[url], child)
+            else:
+                self._merge(self._trees[url], data)
+            self._payloads.append((url, data))
+            full = len(self._payloads) >= self.max_objects
+            if not full and self.max_delay is not None and self._timer is None:
+                self._timer = threading.Timer(self.max_delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        # The batch is sent without holding the lock so that the other
+        # threads can keep queueing payloads
+        if full:
+            self.flush()
+        resp = requests.Response()
+        resp.status_code = 202
+        resp._content = '{"imdata": []}'
+        return resp
+
+    def _post(self, url, data, timeout):
+        """
+        Send a POST of the batch
+
+        :returns: Response class instance, or the request exception raised\
+                  while sending it.
+        """
+        try:
+            resp = self._session._send_push(url, data, timeout=timeout)
+        except requests.exceptions.RequestException as e:
+            resp = e
+        with self._lock:
+            self.num_posts += 1
+        return resp
+
+    def flush(self, timeout=None):
+        """
+        Send the queued payloads to the APIC.  The payloads that could not
+        be pushed are added to errors as (url, data, response) tuples, where
+        response is the exception raised if the request failed.
+
+        :param timeout: Integer containing the number of seconds for\
+                        connection timeout.
+        :returns: List of Response class instances from the requests library,\
+                  one for each merged POST that got a response.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                trees = self._trees
+                payloads = self._payloads
+                self._trees = OrderedDict()
+                self._payloads = []
+            responses = []
+            errors = []
+            for url in trees:
+                roots = self._build(trees[url])
+                if url == '/api/mo/uni.json' and len(roots) > 1:
+                    roots = [{'polUni': {'attributes': {}, 'children': roots}}]
+                url_ok = True
+                exception = None
+                for root in roots:
+                    resp = self._post(url, root, timeout)
+                    if isinstance(resp, Exception):
+                        exception = resp
+                        break
+                    responses.append(resp)
+                    if not resp.ok:
+                        url_ok = False
+                if exception is not None:
+                    logging.error('Could not push merged configuration to %s: %s', url, exception)
+                    errors.extend((url, data, exception) for payload_url, data in payloads
+                                  if payload_url == url)
+                    continue
+                if url_ok:
+                    continue
+                logging.warning('Could not push merged configuration to %s. Pushing objects one at a time', url)
+                for payload_url, data in payloads:
+                    if payload_url != url:
+                        continue
+                    resp = self._post(url, data, timeout)
+                    if isinstance(resp, Exception) or not resp.ok:
+                        errors.append((url, data, resp))
+            with self._lock:
+                self.errors.extend(errors)
+                self.num_pushed += len(payloads)
+        return responses
+
+
 class Login(threading.Thread):
     """
     Login thread responsible for refreshing the APIC login before timeout.
@@ -118,31 +985,994 @@ class Login(threading.Thread):
                 self._apic.login_error = True
 
 
+class LoginTokenCache(object):
+    """
+    On-disk cache of the APIC login tokens, keyed by APIC URL and user.
+
+    Short-lived tools reuse the token of a previous run instead of logging
+    in again.  A token close to its expiry is refreshed with aaaRefresh and
+    an expired or refused token falls back to a full login.  The file holds
+    credentials, so it is created readable by its owner only and is ignored
+    if other users can read or write it.
+    """
+    # Refresh the token if less than this fraction of its timeout is left
+    refresh_fraction = 0.5
+
+    def __init__(self, path=None):
+        """
+        :param path: String containing the path of the cache file.  Default\
+                     is ~/.acitoolkit/tokens.json
+        """
+        if path is None:
+            path = os.path.join(os.path.expanduser('~'), '.acitoolkit', 'tokens.json')
+        self.path = path
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _get_key(url, uid):
+        return '%s@%s' % (uid, url)
+
+    def _load(self):
+        """
+        Read the cache file.  Must be called with the lock held.
+
+        :returns: Dictionary of the cached tokens
+        """
+        try:
+            info = os.stat(self.path)
+        except OSError:
+            return {}
+        if info.st_mode & 0o077 or (hasattr(os, 'getuid') and info.st_uid != os.getuid()):
+            logging.warning('Ignoring token cache %s accessible by other users', self.path)
+            return {}
+        try:
+            with open(self.path, 'r') as cache_file:
+                return json.load(cache_file)
+        except (IOError, ValueError):
+            return {}
+
+    def _save(self, tokens):
+        """
+        Write the cache file.  Must be called with the lock held.
+
+        :param tokens: Dictionary of the cached tokens
+        """
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory, 0o700)
+        tmp_path = '%s.%s.tmp' % (self.path, os.getpid())
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as cache_file:
+            json.dump(tokens, cache_file)
+        if os.name == 'nt' and os.path.exists(self.path):
+            os.remove(self.path)
+        os.rename(tmp_path, self.path)
+
+    def get(self, url, uid):
+        """
+        Get the cached token of a user.
+
+        :param url: String containing the APIC URL
+        :param uid: String containing the username
+        :returns: Dictionary containing the token, its refresh timeout and\
+                  expiry time, or None if there is no valid token.
+        """
+        with self._lock:
+            entry = self._load().get(self._get_key(url, uid))
+        if entry is None:
+            return None
+        now = time.time()
+        if entry['expires'] <= now or entry.get('max_expires', entry['expires']) <= now:
+            return None
+        return entry
+
+    def needs_refresh(self, entry):
+        """
+        Check if a cached token is close to its expiry.
+
+        :param entry: Dictionary returned by get
+        """
+        return entry['expires'] - time.time() < entry['refresh_timeout'] * self.refresh_fraction
+
+    def put(self, url, uid, token, refresh_timeout, max_lifetime=None):
+        """
+        Store the token of a user after a login or a refresh.
+
+        :param url: String containing the APIC URL
+        :param uid: String containing the username
+        :param token: String containing the token
+        :param refresh_timeout: Number of seconds the token is valid if not\
+                                refreshed
+        :param max_lifetime: Optional number of seconds after which the\
+                             token cannot be refreshed any more
+        """
+        now = time.time()
+        key = self._get_key(url, uid)
+        with self._lock:
+            tokens = self._load()
+            entry = {'token': token,
+                     'refresh_timeout': refresh_timeout,
+                     'expires': now + refresh_timeout}
+            if max_lifetime is not None:
+                entry['max_expires'] = now + max_lifetime
+            elif key in tokens and tokens[key]['token'] == token and 'max_expires' in tokens[key]:
+                entry['max_expires'] = tokens[key]['max_expires']
+            tokens[key] = entry
+            self._save(tokens)
+
+    def remove(self, url, uid):
+        """
+        Remove the token of a user.
+
+        :param url: String containing the APIC URL
+        :param uid: String containing the username
+        """
+        with self._lock:
+            tokens = self._load()
+            if tokens.pop(self._get_key(url, uid), None) is not None:
+                self._save(tokens)
+
+    @staticmethod
+    def parse_login(resp):
+        """
+        Get the token attributes of an aaaLogin or aaaRefresh response.
+
+        :param resp: Response class instance from the requests library
+        :returns: Tuple of the token, refresh timeout and maximum lifetime,\
+                  or None if the response does not contain them.
+        """
+        try:
+            attributes = json.loads(resp.text)['imdata'][0]['aaaLogin']['attributes']
+            max_lifetime = attributes.get('maximumLifetimeSeconds')
+            if max_lifetime is not None:
+                max_lifetime = int(max_lifetime)
+            return str(attributes['token']), int(attributes['refreshTimeoutSeconds']), max_lifetime
+        except (ValueError, KeyError, IndexError, TypeError):
+            return None
+
+
+class EventJournal(object):
+    """
+    Append-only on-disk journal of the subscription events.
+
+    Every event delivered to a subscription is appended to the journal with
+    the subscription URL and an increasing offset.  The journal is split in
+    segment files named after their first offset and read through memory
+    maps.  For each subscription URL, the offset of the next event to
+    deliver is kept so that a restarted application resumes where it
+    stopped: events that were journaled but not delivered are replayed, and
+    only the objects that changed since the journaled state are queued
+    instead of every existing object.
+
+    compact() replaces the closed segments by the last state of each object.
+    """
+    _header = struct.Struct('>QI')
+    _offsets_filename = 'offsets.json'
+    _ignored_attributes = ('status', 'childAction', 'modTs')
+
+    def __init__(self, directory, segment_size=16 * 1024 * 1024):
+        """
+        :param directory: String containing the directory of the journal.\
+                          It is created if it does not exist.
+        :param segment_size: Number of bytes after which a new segment\
+                             file is started
+        """
+        self.directory = directory
+        self.segment_size = segment_size
+        self._lock = threading.RLock()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._offsets = {}
+        offsets_path = os.path.join(directory, self._offsets_filename)
+        if os.path.exists(offsets_path):
+            with open(offsets_path, 'r') as offsets_file:
+                self._offsets = json.load(offsets_file)
+        self._offsets_dirty = False
+        self._segments = sorted(int(filename.split('.')[0]) for filename in os.listdir(directory)
+                                if filename.endswith('.log'))
+        self._next_offset = 0
+        self._file = None
+        if self._segments:
+            self._recover()
+        else:
+            self._start_segment()
+
+    def _get_path(self, base):
+        return os.path.join(self.directory, '%020d.log' % base)
+
+    def _start_segment(self):
+        """
+        Start a new segment beginning at the next offset.  Must be called
+        with the lock held.
+        """
+        if self._file is not None:
+            self._file.close()
+        if not self._segments or self._segments[-1] != self._next_offset:
+            self._segments.append(self._next_offset)
+        self._file = open(self._get_path(self._next_offset), 'ab')
+
+    def _recover(self):
+        """
+        Find the next offset from the last segment and drop a record that
+        was only partially written.
+        """
+        base = self._segments[-1]
+        path = self._get_path(base)
+        self._next_offset = base
+        valid_size = 0
+        for offset, data, end in self._read_segment(path, 0):
+            self._next_offset = offset + 1
+            valid_size = end
+        with open(path, 'r+b') as segment:
+            segment.truncate(valid_size)
+        self._file = open(path, 'ab')
+
+    def _read_segment(self, path, start, size=None):
+        """
+        Read the records of a segment file.
+
+        :param path: String containing the path of the segment file
+        :param start: Integer containing the first offset to return
+        :param size: Optional number of bytes of the file to read
+        :returns: Generator of (offset, data, end position) tuples
+        """
+        try:
+            segment = open(path, 'rb')
+        except IOError:
+            # Removed by a compaction
+            return
+        with segment:
+            if size is None:
+                size = os.fstat(segment.fileno()).st_size
+            if not size:
+                return
+            data = mmap.mmap(segment.fileno(), size, access=mmap.ACCESS_READ)
+            try:
+                position = 0
+                while position + self._header.size <= size:
+                    offset, length = self._header.unpack_from(data, position)
+                    end = position + self._header.size + length
+                    if end > size:
+                        break
+                    if offset >= start:
+                        yield offset, data[position + self._header.size:end], end
+                    position = end
+            finally:
+                data.close()
+
+    def append(self, url, event):
+        """
+        Append an event to the journal.
+
+        :param url: String containing the subscription URL of the event
+        :param event: Dictionary containing the event
+        :returns: Integer containing the offset of the event
+        """
+        data = json.dumps({'url': url, 'event': event}).encode('utf-8')
+        with self._lock:
+            if self._file.tell() >= self.segment_size:
+                self._start_segment()
+            offset = self._next_offset
+            self._file.write(self._header.pack(offset, len(data)) + data)
+            self._file.flush()
+            self._next_offset += 1
+            return offset
+
+    def read(self, start=0, url=None):
+        """
+        Read the journaled events.
+
+        :param start: Integer containing the first offset to return
+        :param url: Optional string containing the only subscription URL\
+                    to return the events of
+        :returns: Generator of (offset, url, event) tuples
+        """
+        with self._lock:
+            self._file.flush()
+            segments = list(self._segments)
+            active_size = self._file.tell()
+        first = max(0, bisect.bisect_right(segments, start) - 1)
+        for index in range(first, len(segments)):
+            size = None
+            if index == len(segments) - 1:
+                size = active_size
+            for offset, data, end in self._read_segment(self._get_path(segments[index]), start, size):
+                record = json.loads(data.decode('utf-8'))
+                if url is None or record['url'] == url:
+                    yield offset, record['url'], record['event']
+
+    def commit(self, url, offset):
+        """
+        Record that the events of a subscription URL have been delivered up
+        to an offset.  The offsets are written to disk by flush.
+
+        :param url: String containing the subscription URL
+        :param offset: Integer containing the offset of the next event to\
+                       deliver
+        """
+        with self._lock:
+            if self._offsets.get(url, 0) < offset:
+                self._offsets[url] = offset
+                self._offsets_dirty = True
+
+    def get_offset(self, url):
+        """
+        Get the offset of the next event to deliver for a subscription URL.
+
+        :param url: String containing the subscription URL
+        :returns: Integer containing the offset
+        """
+        with self._lock:
+            return self._offsets.get(url, 0)
+
+    def flush(self):
+        """
+        Write the committed offsets to disk.
+        """
+        with self._lock:
+            if not self._offsets_dirty:
+                return
+            path = os.path.join(self.directory, self._offsets_filename)
+            with open(path + '.tmp', 'w') as offsets_file:
+                json.dump(self._offsets, offsets_file)
+            if os.path.exists(path):
+                os.remove(path)
+            os.rename(path + '.tmp', path)
+            self._offsets_dirty = False
+
+    @staticmethod
+    def _get_dn(event):
+        """
+        Get the class name and attributes of the object in an event.
+        """
+        for class_name, item in event['imdata'][0].items():
+            return class_name, item.get('attributes', {})
+        return None, {}
+
+    @classmethod
+    def _merge(cls, state, event):
+        """
+        Apply an event to a dictionary of object attributes keyed by dn.
+        """
+        class_name, attributes = cls._get_dn(event)
+        dn = attributes.get('dn')
+        if dn is None:
+            return
+        if attributes.get('status') == 'deleted':
+            state.pop(dn, None)
+        elif attributes.get('status') == 'created' or dn not in state:
+            state[dn] = (class_name, dict(attributes))
+        else:
+            state[dn][1].update(attributes)
+
+    def get_state(self, url):
+        """
+        Get the last journaled state of the objects of a subscription URL.
+
+        :param url: String containing the subscription URL
+        :returns: Dictionary of (class name, attributes) tuples keyed by dn
+        """
+        state = {}
+        for offset, record_url, event in self.read(0, url):
+            self._merge(state, event)
+        return state
+
+    def get_changes(self, url, imdata):
+        """
+        Get the synthetic events bringing the journaled state of a
+        subscription URL to the current state returned by the APIC.
+
+        :param url: String containing the subscription URL
+        :param imdata: List of the objects returned by the subscription
+        :returns: List of imdata items for the created, modified and\
+                  deleted objects
+        """
+        state = self.get_state(url)
+        changes = []
+        for item in imdata:
+            class_name, attributes = self._get_dn({'imdata': [item]})
+            known = state.pop(attributes.get('dn'), None)
+            if known is None:
+                changes.append(item)
+                continue
+            for key, value in attributes.items():
+                if key not in self._ignored_attributes and known[1].get(key) != value:
+                    changes.append(item)
+                    break
+        for dn, (class_name, attributes) in state.items():
+            changes.append({class_name: {'attributes': {'dn': dn, 'status': 'deleted'}}})
+        return changes
+
+    def compact(self):
+        """
+        Replace the journaled events by the last state of each object.
+        Deletions are kept until they have been delivered.  The offsets of
+        the remaining events are unchanged.
+        """
+        with self._lock:
+            self._start_segment()
+            end_offset = self._next_offset
+            segments = self._segments[:-1]
+            if not segments:
+                return
+            states = {}
+            records = []
+            last_offsets = {}
+            for offset, url, event in self.read(0):
+                if offset >= end_offset:
+                    break
+                dn = self._get_dn(event)[1].get('dn')
+                if dn is not None:
+                    state = states.setdefault(url, {})
+                    self._merge(state, event)
+                    if dn in state:
+                        event = {'imdata': [{state[dn][0]: {'attributes': dict(state[dn][1])}}]}
+                    elif offset < self._offsets.get(url, 0):
+                        # Deletion already delivered
+                        event = None
+                    last_offsets[(url, dn)] = offset
+                records.append((offset, url, dn, event))
+            path = self._get_path(segments[0]) + '.compact'
+            with open(path, 'wb') as compacted:
+                for offset, url, dn, event in records:
+                    if dn is not None and last_offsets[(url, dn)] != offset:
+                        continue
+                    if event is None:
+                        continue
+                    data = json.dumps({'url': url, 'event': event}).encode('utf-8')
+                    compacted.write(self._header.pack(offset, len(data)) + data)
+            for base in segments:
+                os.remove(self._get_path(base))
+            os.rename(path, self._get_path(segments[0]))
+            self._segments = [segments[0], self._segments[-1]]
+
+    def close(self):
+        """
+        Write the committed offsets and close the journal.
+        """
+        with self._lock:
+            self.flush()
+            self._file.close()
+
+
+class EventCoalescer(object):
+    """
+    Merges the subscription events of each object over a sliding window.
+
+    An event is held for ``window`` seconds after the last event received
+    for the same subscription URL and dn, and at most ``max_delay`` seconds
+    after the first one.  The held events are merged into the net state
+    transition of the object: a creation followed by modifications is
+    delivered as a single creation, modifications are merged, and an object
+    created then deleted within the window is not delivered at all.
+    """
+    def __init__(self, window=0.5, max_delay=None):
+        """
+        :param window: Number of seconds without events for an object after\
+                       which its merged event is delivered
+        :param max_delay: Maximum number of seconds an event is held.\
+                          Default is 10 times the window.
+        """
+        self.window = window
+        if max_delay is None:
+            max_delay = 10 * window
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        # (url, dn) -> [event, time of first event, time of last event]
+        self._pending = OrderedDict()
+        self.received = 0
+        self.delivered = 0
+
+    @property
+    def collapsed(self):
+        """
+        Number of events removed by merging them with other events.
+        """
+        with self._lock:
+            return self.received - self.delivered - len(self._pending)
+
+    @staticmethod
+    def _split(event):
+        """
+        Split an event in one event per object.
+        """
+        if len(event['imdata']) == 1:
+            return [event]
+        events = []
+        for item in event['imdata']:
+            split_event = dict(event)
+            split_event['totalCount'] = '1'
+            split_event['imdata'] = [item]
+            events.append(split_event)
+        return events
+
+    @staticmethod
+    def _get_item(event):
+        """
+        Get the class name and attributes of the object in an event.
+        """
+        for class_name, item in event['imdata'][0].items():
+            return class_name, item.get('attributes', {})
+        return None, {}
+
+    @classmethod
+    def _merge(cls, event, new_event):
+        """
+        Merge two events of the same object.
+
+        :returns: The merged event or None if the object was created and\
+                  deleted
+        """
+        class_name, attributes = cls._get_item(event)
+        new_class_name, new_attributes = cls._get_item(new_event)
+        status = attributes.get('status')
+        new_status = new_attributes.get('status')
+        if new_status == 'deleted':
+            if status == 'created':
+                return None
+            return new_event
+        if new_status == 'created' or status == 'deleted':
+            return new_event
+        merged = dict(attributes)
+        merged.update(new_attributes)
+        merged['status'] = status
+        item = dict(new_event['imdata'][0][new_class_name])
+        item['attributes'] = merged
+        merged_event = dict(new_event)
+        merged_event['imdata'] = [{new_class_name: item}]
+        return merged_event
+
+    def add(self, url, event, now=None):
+        """
+        Add an event received for a subscription URL.  The events are
+        treated as read-only.
+
+        :param url: String containing the subscription URL of the event
+        :param event: Dictionary containing the event
+        :param now: Optional time of the event
+        :returns: List of (url, event) tuples that must be delivered now.\
+                  Events that do not carry a dn are not held.
+        """
+        if now is None:
+            now = time.time()
+        ready = []
+        with self._lock:
+            for split_event in self._split(event):
+                self.received += 1
+                dn = self._get_item(split_event)[1].get('dn')
+                if dn is None:
+                    self.delivered += 1
+                    ready.append((url, split_event))
+                    continue
+                key = (url, dn)
+                pending = self._pending.get(key)
+                if pending is None:
+                    self._pending[key] = [split_event, now, now]
+                    continue
+                merged = self._merge(pending[0], split_event)
+                if merged is None:
+                    del self._pending[key]
+                else:
+                    pending[0] = merged
+                    pending[2] = now
+        return ready
+
+    def _get_deadline(self, pending):
+        return min(pending[2] + self.window, pending[1] + self.max_delay)
+
+    def pop_ready(self, now=None, room=None):
+        """
+        Remove the merged events whose window has expired.
+
+        :param now: Optional current time
+        :param room: Optional dictionary of the number of events that can\
+                     be removed for each subscription URL.  The other\
+                     expired events of these URLs are held until there is\
+                     room for them.
+        :returns: List of (url, event) tuples in the order the objects\
+                  were first seen
+        """
+        if now is None:
+            now = time.time()
+        ready = []
+        with self._lock:
+            for key, pending in list(self._pending.items()):
+                if self._get_deadline(pending) <= now:
+                    if room is not None and key[0] in room:
+                        if room[key[0]] <= 0:
+                            continue
+                        room[key[0]] -= 1
+                    del self._pending[key]
+                    ready.append((key[0], pending[0]))
+            self.delivered += len(ready)
+        return ready
+
+    def get_timeout(self, now=None):
+        """
+        Get the number of seconds until the next merged event is ready.
+
+        :param now: Optional current time
+        :returns: Number of seconds or None if no event is held
+        """
+        if now is None:
+            now = time.time()
+        with self._lock:
+            if not self._pending:
+                return None
+            deadline = min(self._get_deadline(pending) for pending in self._pending.values())
+        return max(0, deadline - now)
+
+    def discard(self, url):
+        """
+        Drop the events held for a subscription URL.
+
+        :param url: String containing the subscription URL
+        """
+        with self._lock:
+            for key in [key for key in self._pending if key[0] == url]:
+                del self._pending[key]
+                # Not collapsed, only dropped
+                self.received -= 1
+
+    def get_stats(self):
+        """
+        Get the number of events received, delivered, collapsed and
+        currently held.
+
+        :returns: Dictionary of counters
+        """
+        with self._lock:
+            pending = len(self._pending)
+            return {'received': self.received,
+                    'delivered': self.delivered,
+                    'collapsed': self.received - self.delivered - pending,
+                    'pending': pending}
+
+
+class EventQueueLimit(object):
+    """
+    Bounds the number of pending events of each subscription URL.
+
+    When the pending events of a URL reach the bound, the policy decides
+    what happens to a new event:
+
+    * ``block``: the websocket decode threads wait until the application
+      consumes events.  The websockets are not read while they wait, so
+      the APIC is slowed down instead of the memory growing.  The events
+      of a new subscription are not blocked.  The events merged by an
+      EventCoalescer are held in it until the URL has room for them.
+    * ``drop_oldest``: the oldest pending event is dropped.
+    * ``collapse``: the new event is merged with the pending event of the
+      same dn as done by EventCoalescer.  If there is none, the oldest
+      pending event is dropped.
+
+    A URL is backlogged from the time its pending events reach
+    ``high_watermark`` times the bound until they have all been consumed.
+    Applications can use this signal to resync the objects from the APIC.
+    """
+    BLOCK = 'block'
+    DROP_OLDEST = 'drop_oldest'
+    COLLAPSE = 'collapse'
+    policies = (BLOCK, DROP_OLDEST, COLLAPSE)
+
+    def __init__(self, max_events=10000, policy='block', high_watermark=0.8,
+                 on_high_watermark=None):
+        """
+        :param max_events: Maximum number of pending events of a\
+                           subscription URL
+        :param policy: String containing the policy applied to the events\
+                       of a full URL.  One of block, drop_oldest and collapse.
+        :param high_watermark: Fraction of max_events at which a URL\
+                               becomes backlogged
+        :param on_high_watermark: Optional function called with the URL\
+                                  string when a URL becomes backlogged
+        """
+        if policy not in self.policies:
+            raise ValueError('Unknown event queue policy %s' % policy)
+        self.max_events = max_events
+        self.policy = policy
+        self.high_watermark = high_watermark
+        self.on_high_watermark = on_high_watermark
+        self._url_limits = {}
+        self._lock = threading.Lock()
+        self._dropped = {}
+        self._collapsed = {}
+        self._backlogged = set()
+        self.blocked = 0
+
+    def set_max_events(self, url, max_events):
+        """
+        Set the bound of a single subscription URL.
+
+        :param url: URL string of the subscription
+        :param max_events: Maximum number of pending events of the URL or\
+                           None to use the default bound
+        """
+        with self._lock:
+            if max_events is None:
+                self._url_limits.pop(url, None)
+            else:
+                self._url_limits[url] = max_events
+
+    def get_max_events(self, url):
+        """
+        Get the bound of a subscription URL.
+
+        :param url: URL string of the subscription
+        :returns: Maximum number of pending events of the URL
+        """
+        return self._url_limits.get(url, self.max_events)
+
+    def is_full(self, url, count):
+        """
+        Check if a subscription URL has reached its bound.
+
+        :param url: URL string of the subscription
+        :param count: Number of pending events of the URL
+        """
+        return count >= self.get_max_events(url)
+
+    @staticmethod
+    def get_collapse_index(events, event):
+        """
+        Find the pending event of the same object as a new event.
+
+        :param events: List of the pending events of a subscription URL
+        :param event: Dictionary containing the new event
+        :returns: Index of the pending event or None if there is none
+        """
+        if len(event['imdata']) != 1:
+            return None
+        dn = EventCoalescer._get_item(event)[1].get('dn')
+        if dn is None:
+            return None
+        for index in range(len(events) - 1, -1, -1):
+            pending = events[index]
+            if len(pending['imdata']) == 1 and EventCoalescer._get_item(pending)[1].get('dn') == dn:
+                return index
+        return None
+
+    def count_dropped(self, url):
+        """
+        Count an event dropped from a subscription URL.
+
+        :param url: URL string of the subscription
+        """
+        with self._lock:
+            self._dropped[url] = self._dropped.get(url, 0) + 1
+
+    def count_collapsed(self, url):
+        """
+        Count an event of a subscription URL merged with a pending event.
+
+        :param url: URL string of the subscription
+        """
+        with self._lock:
+            self._collapsed[url] = self._collapsed.get(url, 0) + 1
+
+    def update_backlog(self, url, count):
+        """
+        Update the backlogged state of a subscription URL.
+
+        :param url: URL string of the subscription
+        :param count: Number of pending events of the URL
+        :returns: True if the URL just became backlogged
+        """
+        with self._lock:
+            if count == 0:
+                self._backlogged.discard(url)
+                return False
+            if url in self._backlogged or count < self.high_watermark * self.get_max_events(url):
+                return False
+            self._backlogged.add(url)
+            return True
+
+    def is_backlogged(self, url):
+        """
+        Check if a subscription URL is backlogged.
+
+        :param url: URL string of the subscription
+        """
+        with self._lock:
+            return url in self._backlogged
+
+    def get_stats(self):
+        """
+        Get the number of events dropped, collapsed and blocked, and the
+        backlogged URLs.
+
+        :returns: Dictionary of counters
+        """
+        with self._lock:
+            return {'dropped': sum(self._dropped.values()),
+                    'collapsed': sum(self._collapsed.values()),
+                    'blocked': self.blocked,
+                    'backlogged': sorted(self._backlogged),
+                    'dropped_by_url': dict(self._dropped),
+                    'collapsed_by_url': dict(self._collapsed)}
+
+
 class EventHandler(threading.Thread):
     """
     Thread responsible for websocket communication.
-    Receives events through the websocket and places them into a Queue
+    Receives events through the websocket of a shard and places them into
+    the Queue of the shard
     """
-    def __init__(self, subscriber):
+    def __init__(self, shard):
         threading.Thread.__init__(self)
-        self.subscriber = subscriber
+        self.shard = shard
         self._exit = False
 
     def exit(self):
         """
-        Indicate that the thread should exit.
+        Indicate that the thread should exit.
+        """
+        self._exit = True
+
+    def run(self):
+        while not self._exit:
+            try:
+                event = self.shard._ws.recv()
+            except:
+                break
+            if not len(event):
+                continue
+            self.shard._raw_q.put(event)
+
+
+class WebSocketShard(object):
+    """
+    A websocket connection of a Subscriber and the subscriptions whose
+    events are received on it.  The APIC sends the events of a
+    subscription on the websocket of the login that issued it, so every
+    shard other than the first one logs in with its own Session.  Each
+    shard has its own reader and decode threads and reconnects
+    independently of the other shards.
+    """
+    def __init__(self, subscriber, apic):
+        """
+        :param subscriber: Subscriber instance owning the shard
+        :param apic: Session instance used to send the subscriptions of\
+                     the shard
+        """
+        self.subscriber = subscriber
+        self.apic = apic
+        self.urls = set()
+        self.received = 0
+        self.reconnects = 0
+        self._ws = None
+        self._ws_url = None
+        self._token = None
+        maxsize = 0
+        if subscriber._apic._queue_limit is not None:
+            # The reader stops reading the websocket when the decoder is blocked
+            maxsize = subscriber._apic._queue_limit.max_events
+        self._raw_q = Queue(maxsize)
+        self.event_handler_thread = None
+        self._decode_thread = None
+
+    @property
+    def connected(self):
+        """
+        Indicates whether the websocket of the shard is open.
+        """
+        return self._ws is not None and self._ws.connected
+
+    def connect(self, use_secure=True):
+        """
+        Make sure that the shard can receive events.  The session of the
+        shard is logged in the first time and the websocket is reopened if
+        it was closed.  If the session of the shard logged in again, the
+        subscriptions of the shard are reissued.
+
+        :param use_secure: Boolean indicating whether the web socket\
+                           should be secure.  Default is True.
+        """
+        if self.apic is not self.subscriber._apic and self.apic.session is None:
+            resp = self.apic.login()
+            if not resp.ok:
+                logging.error('Could not log in the session of a websocket shard')
+                return
+            self.open(use_secure)
+            return
+        if self._ws is None:
+            return
+        if self._token != self.apic.token:
+            logging.warning('Websocket shard logged in again. Reissuing its subscriptions')
+            self.open(use_secure)
+            self.subscriber._resubscribe(list(self.urls))
+        elif not self._ws.connected:
+            logging.warning('Websocket not established on subscription refresh. Re-establishing websocket')
+            self.open(use_secure)
+
+    def open(self, use_secure=True):
+        """
+        Opens the web socket connection with the APIC.
+
+        :param use_secure: Boolean indicating whether the web socket\
+                           should be secure.  Default is True.
+        """
+        sslopt = {}
+        if use_secure:
+            sslopt['cert_reqs'] = ssl.CERT_NONE
+            self._ws_url = 'wss://%s/socket%s' % (self.apic.ipaddr,
+                                                  self.apic.token)
+        else:
+            self._ws_url = 'ws://%s/socket%s' % (self.apic.ipaddr,
+                                                 self.apic.token)
+
+        kwargs = {}
+        if self._ws is not None:
+            self.reconnects += 1
+            if self._ws.connected:
+                self._ws.close()
+                self.event_handler_thread.exit()
+        self._token = self.apic.token
+        if self._decode_thread is None:
+            self._decode_thread = threading.Thread(target=self._decode)
+            self._decode_thread.daemon = True
+            self._decode_thread.start()
+        try:
+            self._ws = create_connection(self._ws_url, sslopt=sslopt, **kwargs)
+            if not self._ws.connected:
+                logging.error('Unable to open websocket connection')
+            self.event_handler_thread = EventHandler(self)
+            self.event_handler_thread.daemon = True
+            self.event_handler_thread.start()
+        except WebSocketException:
+            logging.error('Unable to open websocket connection due to WebSocketException')
+        except socket.error:
+            logging.error('Unable to open websocket connection due to Socket Error')
+
+    def _decode(self):
+        """
+        Decode the events received on the websocket and hand them to the
+        subscriber.  Runs in its own thread so that decoding does not
+        delay the reader or the other shards.
+        """
+        while True:
+            event = self._raw_q.get()
+            if event is None:
+                return
+            self.received += 1
+            try:
+                event = json.loads(event)
+            except ValueError:
+                logging.error('Non-JSON event: %s', event)
+                self.subscriber._invalidate_cache(event)
+                continue
+            self.subscriber._put_event(event)
+
+    def close(self):
+        """
+        Close the websocket of the shard.
+        """
+        if self._ws is not None:
+            self._ws.close()
+
+    def exit(self):
+        """
+        Close the shard and stop its threads.
         """
-        self._exit = True
+        if self.event_handler_thread is not None:
+            self.event_handler_thread.exit()
+        self.close()
+        self._raw_q.put(None)
+        if self.apic is not self.subscriber._apic and self.apic.session is not None:
+            self.apic.login_thread.exit()
 
-    def run(self):
-        while not self._exit:
-            try:
-                event = self.subscriber._ws.recv()
-            except:
-                break
-            if not len(event):
-                continue
-            self.subscriber._event_q.put(event)
+    def get_stats(self):
+        """
+        Get the metrics of the shard.
+
+        :returns: Dictionary containing the number of subscriptions and of\
+                  events received, the number of reconnects and whether\
+                  the websocket is open.
+        """
+        return {'subscriptions': len(self.urls),
+                'received': self.received,
+                'reconnects': self.reconnects,
+                'connected': self.connected}
 
 
 class Subscriber(threading.Thread):
@@ -151,24 +1981,149 @@ class Subscriber(threading.Thread):
     Issues subscriptions, creates the websocket, and refreshes the
     subscriptions before timer expiry.  It also reissues the
     subscriptions when the APIC login is refreshed.
+
+    Each subscription is refreshed _refresh_time seconds after it was sent
+    or last refreshed, less a random jitter of up to _refresh_jitter of
+    that time so that the refreshes of many subscriptions are spread out.
+    The due subscriptions are kept in a heap and refreshed by a small pool
+    of _refresh_workers threads.
+
+    The subscriptions are spread over the WebSocketShard instances of the
+    subscriber, at most as many as the websocket_shards of the Session.
     """
     def __init__(self, apic):
         threading.Thread.__init__(self)
         self._apic = apic
         self._subscriptions = {}
-        self._ws = None
-        self._ws_url = None
+        self._subscription_urls = {}
+        self._shards = [WebSocketShard(self, apic)]
+        self._subscription_shards = {}
+        self._shard_lock = threading.Lock()
         self._refresh_time = 30
-        self._event_q = Queue()
+        self._refresh_jitter = 0.2
+        self._refresh_workers = 4
+        self._refresh_executor = None
+        self._refresh_heap = []
+        self._refresh_due = {}
+        self._refresh_cond = threading.Condition()
+        self._refresh_stats = {'started': 0, 'refreshed': 0, 'failed': 0, 'resubscribed': 0,
+                               'total_lag': 0.0, 'last_lag': 0.0, 'max_lag': 0.0}
         self._events = {}
+        self._event_cond = threading.Condition()
+        self._event_offsets = {}
+        self._backlog_urls = []
+        self._callbacks = {}
+        self._callback_thread = None
         self._exit = False
-        self.event_handler_thread = None
+        # Number of events dropped because of an unknown subscription id
+        self.unknown_events = 0
+        _subscribers.add(self)
 
     def exit(self):
         """
         Indicate that the thread should exit.
         """
         self._exit = True
+        self._notify_events()
+        with self._refresh_cond:
+            self._refresh_cond.notify_all()
+        for shard in self._shards:
+            shard.exit()
+
+    def _get_shard(self, url):
+        """
+        Get the shard of a subscription URL.  A new subscription is given
+        to a new shard until the number of shards of the Session is
+        reached and then to the shard with the fewest subscriptions.
+
+        :param url: URL string of the subscription
+        :returns: WebSocketShard instance
+        """
+        with self._shard_lock:
+            shard = self._subscription_shards.get(url)
+            if shard is not None:
+                return shard
+            if len(self._shards) < self._apic._websocket_shards:
+                apic = self._apic
+                session = Session(apic.api, apic.uid, apic.pwd, verify_ssl=apic.verify_ssl,
+                                  subscription_enabled=False, proxies=apic._proxies,
+                                  rate_limiter=apic._rate_limiter,
+                                  cert_name=apic.cert_name, key=apic._x509_key,
+                                  # Each shard needs a login of its own
+                                  token_cache=False)
+                # The shard has no Subscriber but needs a token for its websocket
+                session._websocket_login = True
+                self._shards.append(WebSocketShard(self, session))
+            shard = min(self._shards, key=lambda candidate: len(candidate.urls))
+            shard.urls.add(url)
+            self._subscription_shards[url] = shard
+        return shard
+
+    def _remove_shard_url(self, url):
+        """
+        Remove a subscription URL from its shard.  The websocket of the
+        shard is closed when it has no subscriptions left.
+
+        :param url: URL string of the subscription
+        """
+        with self._shard_lock:
+            shard = self._subscription_shards.pop(url, None)
+            if shard is None:
+                return
+            shard.urls.discard(url)
+        if not shard.urls:
+            shard.close()
+
+    def get_shard_stats(self):
+        """
+        Get the metrics of the websocket shards.
+
+        :returns: List of the dictionaries returned by\
+                  WebSocketShard.get_stats
+        """
+        return [shard.get_stats() for shard in self._shards]
+
+    def _set_subscription_id(self, url, subscription_id):
+        """
+        Record the subscription id of a URL and keep the reverse index
+        used to demultiplex the events in sync.
+
+        :param url: URL string of the subscription
+        :param subscription_id: Subscription id received from the APIC or\
+                                None if the subscription failed
+        """
+        old_id = self._subscriptions.get(url)
+        if old_id is not None and self._subscription_urls.get(str(old_id)) == url:
+            del self._subscription_urls[str(old_id)]
+        self._subscriptions[url] = subscription_id
+        if subscription_id is not None:
+            self._subscription_urls[str(subscription_id)] = url
+        self._schedule_refresh(url)
+
+    def _schedule_refresh(self, url):
+        """
+        Schedule the next refresh of a subscription.  A failed subscription
+        is sent again at that time.
+
+        :param url: URL string of the subscription
+        """
+        delay = self._refresh_time * (1 - random.uniform(0, self._refresh_jitter))
+        due_time = time.time() + delay
+        with self._refresh_cond:
+            # Older heap entries of the URL are skipped when they come due
+            self._refresh_due[url] = due_time
+            heapq.heappush(self._refresh_heap, (due_time, url))
+            if self._refresh_heap[0][1] == url:
+                self._refresh_cond.notify_all()
+
+    def _unschedule_refresh(self, url):
+        """
+        Stop refreshing a subscription.
+
+        :param url: URL string of the subscription
+        """
+        with self._refresh_cond:
+            self._refresh_due.pop(url, None)
 
     def _send_subscription(self, url, only_new=False):
         """
@@ -177,16 +2132,16 @@ class Subscriber(threading.Thread):
         :param url: URL string to issue the subscription
         """
         try:
-            resp = self._apic.get(url)
+            resp = self._get_shard(url).apic.get(url)
         except ConnectionError:
-            self._subscriptions[url] = None
+            self._set_subscription_id(url, None)
             logging.error('Could not send subscription to APIC for url %s', url)
             resp = requests.Response()
             resp.status_code = 404
             resp._content = '{"error": "Could not send subscription to APIC"}'
             return resp
         if not resp.ok:
-            self._subscriptions[url] = None
+            self._set_subscription_id(url, None)
             logging.error('Could not send subscription to APIC for url %s', url)
             resp = requests.Response()
             resp.status_code = 404
@@ -200,127 +2155,471 @@ class Subscriber(threading.Thread):
             resp._content = '{"error": "Could not send subscription to APIC"}'
             return resp
         subscription_id = resp_data['subscriptionId']
-        self._subscriptions[url] = subscription_id
+        self._set_subscription_id(url, subscription_id)
         if not only_new:
-            while len(resp_data['imdata']):
-                event = {"totalCount": "1",
-                         "subscriptionId": [resp_data['subscriptionId']],
-                         "imdata": [resp_data["imdata"][0]]}
-                self._event_q.put(json.dumps(event))
-                resp_data["imdata"].remove(resp_data["imdata"][0])
+            imdata = resp_data['imdata']
+            journal = self._apic._journal
+            if journal is not None:
+                # Only queue what changed since the journaled state
+                self._replay_journal(url)
+                imdata = journal.get_changes(url, imdata)
+            with self._event_cond:
+                for item in imdata:
+                    event = {"totalCount": "1",
+                             "subscriptionId": [resp_data['subscriptionId']],
+                             "imdata": [item]}
+                    self._dispatch_event(event)
+                self._event_cond.notify_all()
         return resp
 
+    def _replay_journal(self, url):
+        """
+        Queue the journaled events of a subscription URL that were not
+        delivered before the application stopped.
+
+        :param url: URL string of the subscription
+        """
+        journal = self._apic._journal
+        with self._event_cond:
+            if url in self._event_offsets:
+                # Already replayed by this process
+                return
+            self._event_offsets[url] = []
+            for offset, event_url, event in journal.read(journal.get_offset(url), url):
+                self._events.setdefault(url, []).append(event)
+                self._event_offsets[url].append(offset)
+
     def refresh_subscriptions(self):
         """
-        Refresh all of the subscriptions.
+        Refresh all of the subscriptions now and wait for the refreshes to
+        complete.
         """
         # Make a copy of the current subscriptions in case of changes
         # while we are refreshing
-        current_subscriptions = {}
-        for subscription in self._subscriptions:
-            try:
-                current_subscriptions[subscription] = self._subscriptions[subscription]
-            except KeyError:
-                logging.warning('Subscription removed while copying')
-
-        # Refresh the subscriptions
-        for subscription in current_subscriptions:
-            if self._ws is not None:
-                if not self._ws.connected:
-                    logging.warning('Websocket not established on subscription refresh. Re-establishing websocket')
-                    self._open_web_socket('https://' in subscription)
-            try:
-                subscription_id = self._subscriptions[subscription]
-            except KeyError:
-                logging.warning('Subscription has been removed while trying to refresh')
-                continue
-            if subscription_id is None:
-                self._send_subscription(subscription)
-                continue
-            refresh_url = '/api/subscriptionRefresh.json?id=' + str(subscription_id)
-            resp = self._apic.get(refresh_url)
-            if not resp.ok:
-                logging.warning('Could not refresh subscription: %s', refresh_url)
-                # Try to resubscribe
-                self._resubscribe()
+        now = time.time()
+        with self._refresh_cond:
+            due = [(url, now) for url in list(self._subscriptions)]
+            for url, due_time in due:
+                self._refresh_due.pop(url, None)
+        for future in self._start_refreshes(due):
+            future.exception()
+
+    def _get_due_refreshes(self):
+        """
+        Wait until some subscriptions are due for refresh.
+
+        :returns: List of (url, due_time) tuples of the subscriptions to\
+                  refresh.  The list is empty if the thread is exiting or\
+                  if _refresh_time elapsed without any refresh due.
+        """
+        with self._refresh_cond:
+            now = time.time()
+            due = []
+            while self._refresh_heap and self._refresh_heap[0][0] <= now:
+                due_time, url = heapq.heappop(self._refresh_heap)
+                if self._refresh_due.get(url) == due_time:
+                    del self._refresh_due[url]
+                    due.append((url, due_time))
+            if due or self._exit:
+                return due
+            timeout = self._refresh_time
+            if self._refresh_heap:
+                timeout = min(timeout, self._refresh_heap[0][0] - now)
+            self._refresh_cond.wait(timeout)
+        return []
+
+    def _start_refreshes(self, due):
+        """
+        Hand the refreshes of the due subscriptions to the worker threads.
+
+        :param due: List of (url, due_time) tuples
+        :returns: List of RequestFuture instances of the refreshes
+        """
+        if not due:
+            return []
+        shards = set(self._get_shard(url) for url, due_time in due)
+        for shard in shards:
+            shard.connect('https://' in due[0][0])
+        if self._refresh_executor is None:
+            self._refresh_executor = RequestExecutor(max_workers=self._refresh_workers)
+        return [self._refresh_executor.submit(self._refresh_subscription, url, due_time)
+                for url, due_time in due]
+
+    def _refresh_subscription(self, url, due_time):
+        """
+        Refresh a single subscription.  Runs in a refresh worker thread.
+
+        :param url: URL string of the subscription
+        :param due_time: Time at which the refresh was due
+        """
+        lag = max(0.0, time.time() - due_time)
+        with self._refresh_cond:
+            stats = self._refresh_stats
+            stats['started'] += 1
+            stats['total_lag'] += lag
+            stats['last_lag'] = lag
+            stats['max_lag'] = max(stats['max_lag'], lag)
+        try:
+            subscription_id = self._subscriptions[url]
+        except KeyError:
+            logging.warning('Subscription has been removed while trying to refresh')
+            return
+        if subscription_id is None:
+            self._resend_subscription(url)
+            return
+        refresh_url = '/api/subscriptionRefresh.json?id=' + str(subscription_id)
+        try:
+            resp = self._get_shard(url).apic.get(refresh_url)
+        except ConnectionError:
+            logging.error('Could not refresh subscription %s due to ConnectionError', refresh_url)
+            self._count_refresh('failed')
+            self._schedule_refresh(url)
+            return
+        if not resp.ok:
+            logging.warning('Could not refresh subscription: %s', refresh_url)
+            self._count_refresh('failed')
+            # Try to resubscribe.  Only this subscription has expired so
+            # the others are left alone.
+            self._resend_subscription(url, only_new=True)
+            return
+        self._count_refresh('refreshed')
+        if url in self._subscriptions:
+            self._schedule_refresh(url)
+
+    def _resend_subscription(self, url, only_new=False):
+        """
+        Send a subscription again and make sure that it is retried later
+        if the APIC did not accept it.
+
+        :param url: URL string of the subscription
+        :param only_new: Boolean indicating whether only the new events\
+                         should be queued
+        """
+        self._count_refresh('resubscribed')
+        self._send_subscription(url, only_new=only_new)
+        with self._refresh_cond:
+            scheduled = url in self._refresh_due
+        if not scheduled and url in self._subscriptions:
+            self._schedule_refresh(url)
+
+    def _count_refresh(self, name):
+        """
+        Increment one of the refresh counters.
+
+        :param name: String containing the name of the counter
+        """
+        with self._refresh_cond:
+            self._refresh_stats[name] += 1
+
+    def get_refresh_stats(self):
+        """
+        Get the subscription refresh metrics.  The lag is the number of
+        seconds between the time a refresh was due and the time it was
+        started.
+
+        :returns: Dictionary containing the number of refreshes started,\
+                  succeeded, failed and resubscribed, the number of\
+                  scheduled refreshes and the last, maximum and average lag.
+        """
+        with self._refresh_cond:
+            stats = dict(self._refresh_stats)
+            total_lag = stats.pop('total_lag')
+            stats['scheduled'] = len(self._refresh_due)
+            stats['average_lag'] = 0.0
+            if stats['started']:
+                stats['average_lag'] = total_lag / stats['started']
+        return stats
 
     def _open_web_socket(self, use_secure=True):
         """
-        Opens the web socket connection with the APIC.
+        Opens the web socket connection of the Session with the APIC.
+        The shards with their own login are not affected.
 
         :param use_secure: Boolean indicating whether the web socket
                            should be secure.  Default is True.
         """
-        sslopt = {}
-        if use_secure:
-            sslopt['cert_reqs'] = ssl.CERT_NONE
-            self._ws_url = 'wss://%s/socket%s' % (self._apic.ipaddr,
-                                                  self._apic.token)
-        else:
-            self._ws_url = 'ws://%s/socket%s' % (self._apic.ipaddr,
-                                                 self._apic.token)
+        self._shards[0].open(use_secure)
 
-        kwargs = {}
-        if self._ws is not None:
-            if self._ws.connected:
-                self._ws.close()
-                self.event_handler_thread.exit()
-        try:
-            self._ws = create_connection(self._ws_url, sslopt=sslopt, **kwargs)
-            if not self._ws.connected:
-                logging.error('Unable to open websocket connection')
-            self.event_handler_thread = EventHandler(self)
-            self.event_handler_thread.daemon = True
-            self.event_handler_thread.start()
-        except WebSocketException:
-            logging.error('Unable to open websocket connection due to WebSocketException')
-        except socket.error:
-            logging.error('Unable to open websocket connection due to Socket Error')
-
-    def _resubscribe(self):
+    def _resubscribe(self, urls=None):
         """
         Reissue the subscriptions.
         Used to when the APIC login timeout occurs and a new subscription
         must be issued instead of simply a refresh.  Not meant to be called
         directly by end user applications.
+
+        :param urls: Optional list of the URL strings to reissue.  If not\
+                     given, all of the subscriptions are reissued.
         """
-        self._process_event_q()
-        urls = []
-        for url in self._subscriptions:
-            urls.append(url)
-        self._subscriptions = {}
+        self._pop_coalesced_events()
+        if urls is None:
+            urls = list(self._subscriptions)
+        for url in urls:
+            self._set_subscription_id(url, None)
+            self._subscriptions.pop(url, None)
+            self._unschedule_refresh(url)
         for url in urls:
             self.subscribe(url, only_new=True)
 
-    def _process_event_q(self):
+    def _invalidate_cache(self, event):
         """
-        Put the event into correct bucket based on URLs that have been
-        subscribed.
+        Invalidate the cached responses covered by an event received on a
+        websocket.
+
+        :param event: Dictionary containing the event or string containing\
+                      the raw JSON event
         """
-        if self._event_q.empty():
+        cache = self._apic._cache
+        if cache is None:
+            return
+        if isinstance(event, dict):
+            cache.invalidate_event(event)
             return
+        try:
+            cache.invalidate_event(json.loads(event))
+        except ValueError:
+            cache.clear()
+
+    def _put_event(self, event):
+        """
+        Deliver an event received on a websocket.  Called by the decode
+        threads of the shards.
+
+        :param event: Dictionary containing the event
+        """
+        self._invalidate_cache(event)
+        limit = self._apic._queue_limit
+        with self._event_cond:
+            if limit is not None and limit.policy == limit.BLOCK and self._is_full(event):
+                limit.blocked += 1
+                while not self._exit and self._is_full(event):
+                    self._event_cond.wait(1)
+            self._dispatch_event(event)
+            self._event_cond.notify_all()
+        self._notify_backlog()
+
+    def _is_full(self, event):
+        """
+        Check if one of the subscription URLs of an event has reached the
+        bound of the EventQueueLimit.  Must be called with the event
+        condition held.
+
+        :param event: Dictionary containing the event
+        """
+        limit = self._apic._queue_limit
+        for subscription_id in event['subscriptionId']:
+            url = self._subscription_urls.get(str(subscription_id))
+            if url is not None and limit.is_full(url, len(self._events.get(url, []))):
+                return True
+        return False
 
-        while not self._event_q.empty():
-            event = self._event_q.get()
-            orig_event = event
+    def _notify_backlog(self):
+        """
+        Call the high watermark callback of the EventQueueLimit for the
+        URLs that became backlogged.  Must be called without the event
+        condition held.
+        """
+        with self._event_cond:
+            urls = self._backlog_urls
+            self._backlog_urls = []
+        limit = self._apic._queue_limit
+        if limit is None or limit.on_high_watermark is None:
+            return
+        for url in urls:
             try:
-                event = json.loads(event)
-            except ValueError:
-                logging.error('Non-JSON event: %s', orig_event)
+                limit.on_high_watermark(url)
+            except Exception:
+                logging.exception('High watermark callback for url %s failed', url)
+
+    def _pop_coalesced_events(self):
+        """
+        Deliver the events of the EventCoalescer whose window has expired.
+        """
+        coalescer = self._apic._coalescer
+        if coalescer is None:
+            return
+        limit = self._apic._queue_limit
+        with self._event_cond:
+            room = None
+            if limit is not None and limit.policy == limit.BLOCK:
+                # The events stay merged in the coalescer while their URL is full
+                room = dict((url, limit.get_max_events(url) - len(self._events.get(url, [])))
+                            for url in self._subscriptions)
+            for url, event in coalescer.pop_ready(room=room):
+                self._deliver_event(url, event)
+
+    def _dispatch_event(self, event):
+        """
+        Put an event into the buckets of the subscriptions it belongs to.
+        Must be called with the event condition held.
+
+        :param event: Dictionary containing the event
+        """
+        coalescer = self._apic._coalescer
+        # Find the URL for this event.  The event is shared by all of
+        # the subscriptions it belongs to and must not be modified.
+        for subscription_id in event['subscriptionId']:
+            url = self._subscription_urls.get(str(subscription_id))
+            if url is None:
+                # Nobody can read the events of an unknown subscription
+                logging.debug('Dropping event of unknown subscription %s', subscription_id)
+                self.unknown_events += 1
                 continue
-            # Find the URL for this event
-            num_subscriptions = len(event['subscriptionId'])
-            for i in range(0, num_subscriptions):
-                url = None
-                for k in self._subscriptions:
-                    if self._subscriptions[k] == str(event['subscriptionId'][i]):
-                        url = k
-                        break
-                if url not in self._events:
-                    self._events[url] = []
+            if coalescer is None:
+                self._deliver_event(url, event)
+                continue
+            for ready_url, ready_event in coalescer.add(url, event):
+                self._deliver_event(ready_url, ready_event)
+
+    def _deliver_event(self, url, event):
+        """
+        Put an event in the bucket of a subscription URL and record it in
+        the journal.  Must be called with the event condition held.
+
+        :param url: URL string of the subscription
+        :param event: Dictionary containing the event
+        """
+        if url not in self._events:
+            self._events[url] = []
+        limit = self._apic._queue_limit
+        collapsed = False
+        if limit is not None:
+            if limit.policy != limit.BLOCK and limit.is_full(url, len(self._events[url])):
+                collapsed = self._make_room(url, event)
+            if not collapsed:
                 self._events[url].append(event)
-                if num_subscriptions > 1:
-                    event = copy.deepcopy(event)
+            if limit.update_backlog(url, len(self._events[url])):
+                self._backlog_urls.append(url)
+        else:
+            self._events[url].append(event)
+        journal = self._apic._journal
+        if journal is not None:
+            offset = journal.append(url, event)
+            if not collapsed:
+                self._event_offsets.setdefault(url, []).append(offset)
+
+    def _make_room(self, url, event):
+        """
+        Apply the policy of the EventQueueLimit to a full subscription URL.
+        Must be called with the event condition held.
+
+        :param url: URL string of the subscription
+        :param event: Dictionary containing the new event
+        :returns: True if the new event was merged with a pending event\
+                  and must not be added
+        """
+        limit = self._apic._queue_limit
+        events = self._events[url]
+        offsets = self._event_offsets.get(url)
+        if limit.policy == limit.COLLAPSE:
+            index = limit.get_collapse_index(events, event)
+            if index is not None:
+                limit.count_collapsed(url)
+                merged = EventCoalescer._merge(events[index], event)
+                if merged is not None:
+                    events[index] = merged
+                    return True
+                # Created then deleted, neither is delivered
+                del events[index]
+                if offsets:
+                    del offsets[index]
+                return True
+        limit.count_dropped(url)
+        events.pop(0)
+        if offsets:
+            self._apic._journal.commit(url, offsets.pop(0) + 1)
+        return False
+
+    def _notify_events(self):
+        """
+        Wake up the threads waiting for events after new events have been
+        put in the event queue.
+        """
+        with self._event_cond:
+            self._event_cond.notify_all()
+
+    def wait_for_events(self, urls, timeout=None):
+        """
+        Wait until at least one of the APIC URL subscriptions has events.
+
+        :param urls: List of URL strings to wait on
+        :param timeout: Optional number of seconds to wait.  If not given,\
+                        wait until events arrive.
+        :returns: List of the URL strings that have pending events.  The\
+                  list is empty if the timeout expired.
+        """
+        if timeout is not None:
+            end_time = time.time() + timeout
+        with self._event_cond:
+            while True:
+                self._pop_coalesced_events()
+                ready = [url for url in urls if self._events.get(url)]
+                if ready or self._exit:
+                    break
+                remaining = None
+                if timeout is not None:
+                    remaining = end_time - time.time()
+                    if remaining <= 0:
+                        break
+                if self._apic._coalescer is not None:
+                    # Wake up when the next merged event is ready
+                    coalescer_timeout = self._apic._coalescer.get_timeout()
+                    if coalescer_timeout is not None and (remaining is None or coalescer_timeout < remaining):
+                        remaining = coalescer_timeout
+                if remaining is None:
+                    self._event_cond.wait()
+                else:
+                    self._event_cond.wait(remaining)
+        self._notify_backlog()
+        return ready
+
+    def add_callback(self, url, callback):
+        """
+        Register a function called with the URL when the APIC URL
+        subscription has events.  The callbacks are called from a separate
+        thread and must consume the pending events of the URL.
+
+        :param url: URL string of the subscription
+        :param callback: Function taking the URL string
+        """
+        with self._event_cond:
+            self._callbacks.setdefault(url, []).append(callback)
+            if self._callback_thread is None:
+                self._callback_thread = threading.Thread(target=self._run_callbacks)
+                self._callback_thread.daemon = True
+                self._callback_thread.start()
+            self._event_cond.notify_all()
+
+    def remove_callback(self, url, callback):
+        """
+        Remove a function registered with add_callback.
+
+        :param url: URL string of the subscription
+        :param callback: Function previously registered for the URL
+        """
+        with self._event_cond:
+            callbacks = self._callbacks.get(url, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+            if not callbacks:
+                self._callbacks.pop(url, None)
+
+    def _run_callbacks(self):
+        """
+        Call the registered callbacks whenever their subscriptions have
+        events.  Runs in its own thread.
+        """
+        while not self._exit:
+            with self._event_cond:
+                urls = list(self._callbacks)
+                if not urls:
+                    self._event_cond.wait(1)
+                    continue
+            for url in self.wait_for_events(urls, timeout=1):
+                for callback in list(self._callbacks.get(url, [])):
+                    try:
+                        callback(url)
+                    except Exception:
+                        logging.exception('Event callback for url %s failed', url)
 
     def subscribe(self, url, only_new=False):
         """
@@ -334,9 +2633,7 @@ class Subscriber(threading.Thread):
         if url in self._subscriptions:
             return
 
-        if self._ws is not None:
-            if not self._ws.connected:
-                self._open_web_socket('https://' in url)
+        self._get_shard(url).connect('https://' in url)
 
         resp = self._send_subscription(url, only_new=only_new)
         return resp
@@ -356,22 +2653,35 @@ class Subscriber(threading.Thread):
 
         :param url: URL string to check for pending events
         """
-        self._process_event_q()
-        if url not in self._events:
-            return False
-        result = len(self._events[url]) != 0
+        self._pop_coalesced_events()
+        self._notify_backlog()
+        with self._event_cond:
+            if url not in self._events:
+                return False
+            result = len(self._events[url]) != 0
         return result
 
     def get_event(self, url):
         """
         Get an event for a particular APIC URL subscription.
         Used internally by the Class and Instance subscriptions.
+        An event matching several subscriptions is the same object for
+        each of them and should be treated as read-only.
 
         :param url: URL string to get pending event
         """
-        if url not in self._events:
-            raise ValueError
-        event = self._events[url].pop(0)
+        with self._event_cond:
+            if url not in self._events:
+                raise ValueError
+            event = self._events[url].pop(0)
+            offsets = self._event_offsets.get(url)
+            if offsets:
+                self._apic._journal.commit(url, offsets.pop(0) + 1)
+            limit = self._apic._queue_limit
+            if limit is not None:
+                limit.update_backlog(url, len(self._events[url]))
+                # Wake up the decode threads blocked on a full URL
+                self._event_cond.notify_all()
         logging.debug('Event received %s', event)
         return event
 
@@ -391,24 +2701,285 @@ class Subscriber(threading.Thread):
             unsubscribe_url = url.split('?subscription=yes')[0] + '?subscription=no'
         else:
             raise ValueError('No subscription string in URL being unsubscribed')
-        resp = self._apic.get(unsubscribe_url)
+        resp = self._get_shard(url).apic.get(unsubscribe_url)
         if not resp.ok:
             logging.warning('Could not unsubscribe from url: %s', unsubscribe_url)
         # Chew up any outstanding events
+        if self._apic._coalescer is not None:
+            self._apic._coalescer.discard(url)
         while self.has_events(url):
             self.get_event(url)
+        self._set_subscription_id(url, None)
         del self._subscriptions[url]
-        if not self._subscriptions:
-            self._ws.close()
+        self._unschedule_refresh(url)
+        self._remove_shard_url(url)
+
+    def run(self):
+        last_flush = time.time()
+        while not self._exit:
+            # Wait for the next subscriptions to come due and refresh them
+            self._start_refreshes(self._get_due_refreshes())
+            if self._apic._journal is not None and time.time() - last_flush >= self._refresh_time:
+                self._apic._journal.flush()
+                last_flush = time.time()
+        if self._refresh_executor is not None:
+            self._refresh_executor.shutdown()
+
+
+# Subscriber threads that have not been collected.  They are stopped at
+# interpreter exit so that they do not wake up while the modules are torn down
+_subscribers = weakref.WeakSet()
+
+
+def _stop_subscribers(timeout=2):
+    """
+    Stop the Subscriber threads that are still running.
+
+    :param timeout: Number of seconds to wait for each thread to exit
+    """
+    for subscriber in list(_subscribers):
+        if subscriber.is_alive():
+            subscriber.exit()
+            subscriber.join(timeout)
+
+
+atexit.register(_stop_subscribers)
+
+
+class RequestFuture(object):
+    """
+    The result of a request that is being performed in the background.
+    Returned by Session.submit and the asynchronous getters.
+    """
+    def __init__(self):
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+
+    def done(self):
+        """
+        Check whether the request has completed.
+
+        :returns: True or False.  True if the result is available.
+        """
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        """
+        Wait for the request to complete and return its result.  If the
+        request raised an exception, the exception is raised here.
+
+        :param timeout: Optional number of seconds to wait
+        :returns: The result of the request
+        """
+        if not self._done.wait(timeout):
+            raise requests.exceptions.Timeout('Request did not complete within %s seconds' % timeout)
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def exception(self, timeout=None):
+        """
+        Wait for the request to complete and return the exception that it
+        raised, if any.
+
+        :param timeout: Optional number of seconds to wait
+        :returns: Exception instance or None
+        """
+        if not self._done.wait(timeout):
+            raise requests.exceptions.Timeout('Request did not complete within %s seconds' % timeout)
+        return self._exception
+
+    def add_done_callback(self, callback_fn):
+        """
+        Register a function to be called with this future when the
+        request completes.  If the request has already completed, the
+        function is called immediately.
+
+        :param callback_fn: function to be called
+        """
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback_fn)
+                return
+        callback_fn(self)
+
+    def _complete(self, result=None, exception=None):
+        """
+        Record the outcome of the request and invoke the callbacks
+        """
+        with self._lock:
+            self._result = result
+            self._exception = exception
+            self._done.set()
+            callbacks = self._callbacks
+            self._callbacks = []
+        for callback_fn in callbacks:
+            try:
+                callback_fn(self)
+            except Exception:
+                logging.exception('Exception raised by request callback')
+
+
+class RequestExecutor(object):
+    """
+    Bounded pool of worker threads that performs requests in the background.
+    A single executor can be shared by the sessions of several APICs so
+    that a large number of outstanding requests only uses a fixed number
+    of threads.
+    """
+    def __init__(self, max_workers=16):
+        """
+        :param max_workers: Integer containing the maximum number of requests\
+                            performed at the same time.
+        """
+        self.max_workers = max_workers
+        self._work_q = Queue()
+        self._workers = []
+        self._lock = threading.Lock()
+        self._shutdown = False
+
+    def _run(self):
+        while True:
+            work = self._work_q.get()
+            if work is None:
+                return
+            future, fn, args, kwargs = work
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                future._complete(exception=e)
+            else:
+                future._complete(result=result)
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Schedule a function to be run by the worker threads.
+
+        :param fn: function to be called
+        :returns: RequestFuture instance holding the result of the call
+        """
+        future = RequestFuture()
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError('Cannot submit requests after shutdown')
+            self._work_q.put((future, fn, args, kwargs))
+            if len(self._workers) < self.max_workers:
+                worker = threading.Thread(target=self._run)
+                worker.daemon = True
+                worker.start()
+                self._workers.append(worker)
+        return future
+
+    def shutdown(self, wait=True):
+        """
+        Stop the worker threads once the outstanding requests are complete.
+
+        :param wait: Boolean indicating whether to wait for the worker\
+                     threads to exit.
+        """
+        with self._lock:
+            self._shutdown = True
+            for worker in self._workers:
+                self._work_q.put(None)
+        if wait:
+            for worker in self._workers:
+                worker.join()
+
+
+_default_executor = None
+_default_executor_lock = threading.Lock()
+
+
+def get_default_executor():
+    """
+    Get the RequestExecutor shared by all of the sessions that were not
+    given their own executor.
+
+    :returns: RequestExecutor instance
+    """
+    global _default_executor
+    with _default_executor_lock:
+        if _default_executor is None:
+            _default_executor = RequestExecutor()
+        return _default_executor
+
+
+class SingleFlight(object):
+    """
+    Coalesces identical GET requests that are in flight at the same time.
+    The first caller sends the request and the later callers wait for its
+    response instead of sending their own.  A single instance can be
+    shared by several sessions since the requests are keyed by their full
+    URL.
+    """
+    def __init__(self):
+        self.deduplicated = 0
+        self.sent = 0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, *args, **kwargs):
+        """
+        Call a function unless a call with the same key is already in
+        flight, in which case wait for the result of that call.  An
+        exception raised by the call is raised to every caller.  Each
+        waiting caller gets its own copy of a Response result.
+
+        :param key: String identifying the request such as its URL
+        :param fn: function performing the request
+        :returns: The result of the function
+        """
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = RequestFuture()
+                self._in_flight[key] = future
+                self.sent += 1
+            else:
+                self.deduplicated += 1
+        if not leader:
+            return _copy_response(future.result())
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self._finish(key, future, exception=e)
+            raise
+        self._finish(key, future, result=result)
+        return result
+
+    def _finish(self, key, future, result=None, exception=None):
+        """
+        Stop coalescing a request and hand its outcome to the waiters
+        """
+        with self._lock:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+        future._complete(result=result, exception=exception)
+
+    def forget(self):
+        """
+        Stop coalescing the requests in flight so that the next callers
+        send their own request.  Used when a change is pushed, since the
+        responses in flight may not include it.
+        """
+        with self._lock:
+            self._in_flight.clear()
 
-    def run(self):
-        while not self._exit:
-            # Sleep for some interval and send subscription list
-            time.sleep(self._refresh_time)
-            try:
-                self.refresh_subscriptions()
-            except ConnectionError:
-                logging.error('Could not refresh subscriptions due to ConnectionError')
+    def get_stats(self):
+        """
+        Get the counters of the coalesced requests.
+
+        :returns: Dictionary containing the number of requests sent, the\
+                  number of requests avoided and the number in flight
+        """
+        with self._lock:
+            return {'sent': self.sent,
+                    'deduplicated': self.deduplicated,
+                    'in_flight': len(self._in_flight)}
 
 
 class Session(object):
@@ -417,7 +2988,10 @@ class Session(object):
        This class is responsible for all communication with the APIC.
     """
     def __init__(self, url, uid, pwd, verify_ssl=False,
-                 subscription_enabled=True, proxies=None):
+                 subscription_enabled=True, proxies=None, executor=None,
+                 cache=None, collect_stats=False, rate_limiter=None, journal=None,
+                 coalescer=None, websocket_shards=1, queue_limit=None, token_cache=None,
+                 cert_name=None, key=None, single_flight=None):
         """
         :param url:  String containing the APIC URL such as ``https://1.2.3.4``
         :param uid: String containing the username that will be used as\
@@ -429,13 +3003,58 @@ class Session(object):
         values are True and False with the default being False.
         :param proxies: Optional dictionary containing the proxies passed
         directly to the Requests library
+        :param executor: Optional RequestExecutor used to perform the\
+        background requests of submit, get_async and push_to_apic_async.\
+        If not given, the executor shared by all sessions is used.
+        :param cache: Optional ResponseCache used to keep the responses of\
+        GET requests.  If not given, responses are not cached.
+        :param collect_stats: Boolean indicating whether to collect request\
+        metrics that can be read with stats and export_stats.  Default is False.
+        :param rate_limiter: Optional RateLimiter controlling the rate and\
+        concurrency of the requests and retrying the throttled ones.  If not\
+        given, requests are sent as soon as they are made.
+        :param journal: Optional EventJournal recording the subscription\
+        events so that a restarted application only receives the events it\
+        missed.  If not given, subscribing queues every existing object.
+        :param coalescer: Optional EventCoalescer merging the subscription\
+        events of each object over a short window.  If not given, every\
+        event is delivered.
+        :param websocket_shards: Number of websocket connections the\
+        subscriptions are spread over.  Every connection but the first one\
+        logs in to the APIC separately.  Default is 1.
+        :param queue_limit: Optional EventQueueLimit bounding the pending\
+        events of each subscription URL.  If not given, the events are kept\
+        until they are consumed.
+        :param token_cache: Optional LoginTokenCache used by login to reuse\
+        the token of a previous session.  If not given and the\
+        APIC_TOKEN_CACHE environment variable is set, a LoginTokenCache\
+        using the file it names is used.  False to never use a cache.
+        :param cert_name: Optional string containing the name of the X.509\
+        certificate of the user on the APIC.  When given with key, every\
+        request is signed with the key instead of using a login token, so no\
+        login, refresh or relogin is needed.  Requires pyOpenSSL.  The\
+        websocket of the subscriptions still needs a login token, so the\
+        subscriptions are disabled when no password is given.
+        :param key: String containing the PEM private key of the certificate\
+        or the path of a file containing it, or the private key instance of\
+        pyOpenSSL.
+        :param single_flight: Optional SingleFlight coalescing the identical\
+        GET requests made at the same time by several threads.  If not\
+        given, every GET request is sent.
         """
         if not isinstance(url,str) and not isinstance(url, unicode) :
             raise CredentialsError("The URL or APIC address must be a string")
         if not isinstance(uid, str) and not isinstance(url, unicode) :
             raise CredentialsError("The user ID must be a string")
-        if not isinstance(pwd, str) and not isinstance(url, unicode):
+        if not isinstance(pwd, str) and not isinstance(url, unicode) and not (pwd is None and cert_name):
             raise CredentialsError("The password must be a string")
+        self.cert_name = cert_name
+        self._x509_key = None
+        if cert_name:
+            self._x509_key = self._load_key(key)
+            if pwd is None and subscription_enabled:
+                logging.warning('Subscriptions need a password with certificate authentication. Disabling them.')
+                subscription_enabled = False
 
         if 'https://' in url:
             self.ipaddr = url[len('https://'):]
@@ -449,11 +3068,34 @@ class Session(object):
         self.verify_ssl = verify_ssl
         self.token = None
         self.login_thread = Login(self)
+        self._login_lock = threading.RLock()
         self._relogin_callbacks = []
         self.login_error = False
         self._logged_in = False
         self._subscription_enabled = subscription_enabled
+        # Whether the login must get a token for a websocket even when the
+        # requests are signed with the certificate
+        self._websocket_login = subscription_enabled
         self._proxies = proxies
+        self._executor = executor
+        self._cache = cache
+        self._batcher = None
+        self._stats = None
+        if collect_stats:
+            self._stats = RequestStats()
+        self._rate_limiter = rate_limiter
+        self._journal = journal
+        self._coalescer = coalescer
+        self._websocket_shards = websocket_shards
+        self._queue_limit = queue_limit
+        if token_cache is None and os.environ.get('APIC_TOKEN_CACHE'):
+            token_cache = LoginTokenCache(os.environ['APIC_TOKEN_CACHE'])
+        elif token_cache is False:
+            token_cache = None
+        self._token_cache = token_cache
+        self._single_flight = single_flight
+        # Number of objects requested per page by get_paged and iter_class
+        self.page_size = 10000
         if subscription_enabled:
             self.subscription_thread = Subscriber(self)
             self.subscription_thread.daemon = True
@@ -467,6 +3109,62 @@ class Session(object):
         """
         return self.__class__, (self.api, self.uid, self.pwd)
 
+    @staticmethod
+    def _load_key(key):
+        """
+        Load the private key used to sign the requests.
+
+        :param key: String containing the PEM private key or the path of a\
+                    file containing it, or the private key instance
+        :returns: Private key instance of pyOpenSSL
+        """
+        if crypto is None:
+            raise CredentialsError("Certificate authentication requires pyOpenSSL")
+        if isinstance(key, crypto.PKey):
+            return key
+        if not key:
+            raise CredentialsError("A private key must be given with the certificate name")
+        if '-----BEGIN' not in key:
+            with open(key, 'r') as key_file:
+                key = key_file.read()
+        return crypto.load_privatekey(crypto.FILETYPE_PEM, key)
+
+    def _get_signature_cookies(self, method, url, data=None):
+        """
+        Get the cookies authenticating a request with the certificate of
+        the user.  The APIC checks the signature of the method, the URL and
+        the payload of the request.
+
+        :param method: String containing the requests.Session method name\
+                       such as 'get' or 'post'
+        :param url: String containing the URL relative to the APIC address
+        :param data: Optional string containing the payload of the request
+        :returns: Dictionary of the cookies
+        """
+        payload = method.upper() + url
+        if data:
+            payload += data
+        signature = base64.b64encode(crypto.sign(self._x509_key, payload, 'sha256'))
+        return {'APIC-Request-Signature': signature,
+                'APIC-Certificate-Algorithm': 'v1.0',
+                'APIC-Certificate-Fingerprint': 'fingerprint',
+                'APIC-Certificate-DN': 'uni/userext/user-%s/usercert-%s' % (self.uid, self.cert_name)}
+
+    def _send_cert_login(self):
+        """
+        Prepare the session for certificate authentication.  No request is
+        sent to the APIC.
+
+        :returns: Response class instance with a 200 status code
+        """
+        if self.session is None:
+            self.session = requests.Session()
+        self._logged_in = True
+        resp = requests.Response()
+        resp.status_code = 200
+        resp._content = '{"imdata": []}'
+        return resp
+
     def _send_login(self, timeout=None):
         """
         Send the actual login request to the APIC and open the web
@@ -485,12 +3183,17 @@ class Session(object):
         if not ret.ok:
             logging.error('Could not relogin to APIC. Aborting login thread.')
             self.login_thread.exit()
-            self.subscription_thread.exit()
+            if self._subscription_enabled:
+                self.subscription_thread.exit()
             return ret
         self._logged_in = True
         ret_data = json.loads(ret.text)['imdata'][0]
         timeout = ret_data['aaaLogin']['attributes']['refreshTimeoutSeconds']
         self.token = str(ret_data['aaaLogin']['attributes']['token'])
+        if self._token_cache is not None:
+            login = self._token_cache.parse_login(ret)
+            if login is not None:
+                self._token_cache.put(self.api, self.uid, *login)
         if self._subscription_enabled:
             self.subscription_thread._open_web_socket('https://' in self.api)
         timeout = int(timeout)
@@ -506,8 +3209,17 @@ class Session(object):
         response.ok is True if login is successful.
         """
         logging.info('Initializing connection to the APIC')
+        if self._x509_key is not None:
+            resp = self._send_cert_login()
+            if not self._websocket_login:
+                # Nothing to refresh
+                return resp
         try:
-            resp = self._send_login(timeout)
+            resp = None
+            if self._token_cache is not None:
+                resp = self._send_cached_login(timeout)
+            if resp is None:
+                resp = self._send_login(timeout)
         except ConnectionError as e:
             logging.error('Could not relogin to APIC due to ConnectionError: %s', e)
             resp = requests.Response()
@@ -517,6 +3229,41 @@ class Session(object):
         self.login_thread.start()
         return resp
 
+    def _send_cached_login(self, timeout=None):
+        """
+        Log in with the token cached by a previous session.  The token is
+        refreshed if it is close to its expiry.
+
+        :returns: Response class instance from the requests library or None\
+                  if there is no usable token.
+        """
+        entry = self._token_cache.get(self.api, self.uid)
+        if entry is None:
+            return None
+        self.session = requests.Session()
+        self.session.cookies.set('APIC-cookie', entry['token'])
+        self.token = str(entry['token'])
+        login_timeout = entry['expires'] - time.time()
+        if self._token_cache.needs_refresh(entry):
+            try:
+                resp = self.refresh_login(timeout=timeout)
+            except (ConnectionError, requests.exceptions.Timeout):
+                return None
+            if not resp.ok:
+                return None
+            login_timeout = entry['refresh_timeout']
+        else:
+            resp = requests.Response()
+            resp.status_code = 200
+            resp._content = json.dumps({'imdata': [{'aaaLogin': {'attributes': {
+                'token': self.token, 'refreshTimeoutSeconds': str(entry['refresh_timeout'])}}}]})
+        logging.info('Using cached APIC login token')
+        self._logged_in = True
+        if self._subscription_enabled:
+            self.subscription_thread._open_web_socket('https://' in self.api)
+        self.login_thread._login_timeout = login_timeout / 2
+        return resp
+
     def logged_in(self):
         """
         Returns whether the session is logged in to the APIC
@@ -534,12 +3281,32 @@ class Session(object):
         """
         refresh_url = '/api/aaaRefresh.json'
         resp = self.get(refresh_url, timeout=timeout)
+        if self._token_cache is not None and resp.ok:
+            login = self._token_cache.parse_login(resp)
+            if login is not None:
+                self._token_cache.put(self.api, self.uid, *login)
         return resp
 
+    def close_subscriber_thread(self, timeout=None):
+        """
+        Stop the subscription thread and its refresh workers.
+
+        :param timeout: Number of seconds to wait for the thread to exit.\
+                        Wait until it exits if None.
+        """
+        if not self._subscription_enabled:
+            return
+        self.subscription_thread.exit()
+        if self.subscription_thread.is_alive():
+            self.subscription_thread.join(timeout)
+
     def close(self):
         """
         Close the session
         """
+        self.close_subscriber_thread()
+        if self._journal is not None:
+            self._journal.flush()
         self.session.close()
 
     def subscribe(self, url, only_new=False):
@@ -593,6 +3360,55 @@ class Session(object):
         """
         return self.subscription_thread.get_event(url)
 
+    def wait_for_events(self, urls, timeout=None):
+        """
+        Wait until there are events for at least one of the URLs.
+
+        :param urls:  List of URL strings belonging to subscriptions
+        :param timeout: Optional number of seconds to wait.  If not given,\
+                        wait until events arrive.
+        :returns: List of the URL strings that have pending events.
+        """
+        if not self._subscription_enabled:
+            return []
+        return self.subscription_thread.wait_for_events(urls, timeout)
+
+    def is_backlogged(self, url):
+        """
+        Check if the pending events of a URL subscription reached the high
+        watermark of the EventQueueLimit and have not all been consumed
+        since.  Events may have been dropped or merged.
+
+        :param url:  URL string belonging to subscription
+        :returns: True or False.  Always False if the session was not\
+                  created with a queue_limit.
+        """
+        if self._queue_limit is None:
+            return False
+        return self._queue_limit.is_backlogged(url)
+
+    def add_event_callback(self, url, callback):
+        """
+        Register a function called from a separate thread with the URL
+        whenever there are events for the URL.  The function must get the
+        pending events of the URL.
+
+        :param url:  URL string belonging to subscription
+        :param callback: Function taking the URL string
+        """
+        if self._subscription_enabled:
+            self.subscription_thread.add_callback(url, callback)
+
+    def remove_event_callback(self, url, callback):
+        """
+        Remove a function registered with add_event_callback.
+
+        :param url:  URL string belonging to subscription
+        :param callback: Function previously registered for the URL
+        """
+        if self._subscription_enabled:
+            self.subscription_thread.remove_callback(url, callback)
+
     def unsubscribe(self, url):
         """
         Unsubscribe from events for a particular URL.  Used internally by the
@@ -603,6 +3419,188 @@ class Session(object):
         if self._subscription_enabled:
             self.subscription_thread.unsubscribe(url)
 
+    def _send(self, method, url, keep_slot=False, **kwargs):
+        """
+        Send an HTTP request to the APIC.  When the session has a
+        RateLimiter, the request waits to be admitted by it and is retried
+        while it is throttled.
+
+        :param method: String containing the requests.Session method name\
+                       such as 'get' or 'post'
+        :param url: String containing the URL relative to the APIC address
+        :param keep_slot: True to keep the RateLimiter slot of the request\
+                          once the response is returned, while a streamed\
+                          body is read.  The response must then be closed\
+                          with _close_stream.
+        :returns: Response class instance from the requests library.
+        """
+        limiter = self._rate_limiter
+        if limiter is None:
+            return self._send_once(method, url, **kwargs)
+        attempt = 0
+        while True:
+            limiter.acquire()
+            try:
+                resp = self._send_once(method, url, **kwargs)
+            except Exception as e:
+                # Every admitted request must give its slot back.  Only the
+                # network errors are a sign of an overloaded APIC
+                network_error = isinstance(e, (ConnectionError, requests.exceptions.Timeout))
+                limiter.release(aborted=not network_error)
+                if not network_error or attempt >= limiter.max_retries:
+                    raise
+                logging.warning('Request to %s failed: %s', url, e)
+                retry_after = None
+            else:
+                if keep_slot:
+                    throttled = limiter.record(resp.status_code)
+                else:
+                    throttled = limiter.release(resp.status_code)
+                if not throttled or attempt >= limiter.max_retries:
+                    return resp
+                if keep_slot:
+                    limiter.release_slot()
+                logging.warning('Request to %s throttled with status %s', url, resp.status_code)
+                try:
+                    retry_after = float(resp.headers.get('Retry-After'))
+                except (TypeError, ValueError):
+                    retry_after = None
+                resp.close()
+            time.sleep(limiter.get_backoff(attempt, retry_after))
+            attempt += 1
+            if self._stats is not None:
+                self._stats.record_retry(method, url)
+
+    def _send_once(self, method, url, **kwargs):
+        """
+        Send a single HTTP request to the APIC and record its metrics when
+        stats collection is enabled.
+
+        :param method: String containing the requests.Session method name\
+                       such as 'get' or 'post'
+        :param url: String containing the URL relative to the APIC address
+        :returns: Response class instance from the requests library.
+        """
+        if self._x509_key is not None:
+            kwargs['cookies'] = self._get_signature_cookies(method, url, kwargs.get('data'))
+        start = time.time()
+        try:
+            resp = getattr(self.session, method)(self.api + url, verify=self.verify_ssl,
+                                                 proxies=self._proxies, **kwargs)
+        except (ConnectionError, requests.exceptions.Timeout):
+            if self._stats is not None:
+                self._stats.record_error(method, url)
+            raise
+        if self._stats is not None:
+            size = None
+            if not kwargs.get('stream'):
+                size = len(resp.content)
+            self._stats.record(method, url, time.time() - start, size, resp.status_code)
+        return resp
+
+    def stats(self):
+        """
+        Get the request metrics collected by this session.
+
+        :returns: Dictionary returned by RequestStats.snapshot or None if\
+                  the session was not created with collect_stats.
+        """
+        if self._stats is None:
+            return None
+        return self._stats.snapshot()
+
+    def single_flight_stats(self):
+        """
+        Get the counters of the GET requests coalesced by this session.
+
+        :returns: Dictionary returned by SingleFlight.get_stats or None if\
+                  the session was not created with single_flight.
+        """
+        if self._single_flight is None:
+            return None
+        return self._single_flight.get_stats()
+
+    def refresh_stats(self):
+        """
+        Get the subscription refresh metrics of this session.
+
+        :returns: Dictionary returned by Subscriber.get_refresh_stats or\
+                  None if subscriptions are not enabled.
+        """
+        if not self._subscription_enabled:
+            return None
+        return self.subscription_thread.get_refresh_stats()
+
+    def export_stats(self, exporter=None):
+        """
+        Export the request metrics collected by this session.
+
+        :param exporter: Object with an export method taking the stats\
+                         snapshot.  Default is a PrometheusExporter.
+        :returns: The result of the exporter or None if the session was\
+                  not created with collect_stats.
+        """
+        snapshot = self.stats()
+        if snapshot is None:
+            return None
+        if exporter is None:
+            exporter = PrometheusExporter()
+        return exporter.export(snapshot)
+
+    def _relogin(self, token):
+        """
+        Log back into the APIC after a request has been refused with a 403.
+        When several threads are refused at the same time, only the first
+        one sends the login and the others reuse the new token.
+
+        :param token: The token that was used by the refused request
+        """
+        with self._login_lock:
+            if self.token != token:
+                # Another thread has already logged in again
+                return
+            logging.error('Trying to login again....')
+            if self._stats is not None:
+                self._stats.record_relogin()
+            self._send_login()
+            self.resubscribe()
+
+    @contextmanager
+    def batch(self, max_objects=500, max_delay=None):
+        """
+        Context manager that queues the configuration pushed through this
+        session and sends it as merged trees when the context exits.  While
+        the batch is active, push_to_apic returns a response with a 202
+        status code.  Errors for individual objects are reported in the
+        errors list of the PushBatcher, with the response of the APIC or the
+        exception raised by the request.
+
+        Example::
+
+            with session.batch() as batcher:
+                for tenant in tenants:
+                    tenant.push_to_apic(session)
+            for url, data, resp in batcher.errors:
+                if isinstance(resp, Exception):
+                    print(resp)
+                else:
+                    print(resp.text)
+
+        :param max_objects: Integer containing the number of queued payloads\
+                            that causes the batch to be sent.
+        :param max_delay: Optional number of seconds after which queued\
+                          payloads are sent.
+        :returns: PushBatcher instance
+        """
+        batcher = PushBatcher(self, max_objects=max_objects, max_delay=max_delay)
+        previous_batcher = self._batcher
+        self._batcher = batcher
+        try:
+            yield batcher
+        finally:
+            self._batcher = previous_batcher
+            batcher.flush()
+
     def push_to_apic(self, url, data, timeout=None):
         """
         Push the object data to the APIC
@@ -614,20 +3612,31 @@ class Session(object):
         :returns: Response class instance from the requests library.\
                   response.ok is True if request is sent successfully.
         """
+        if self._batcher is not None and not url.startswith('/api/aaa'):
+            return self._batcher.add(url, data)
+        return self._send_push(url, data, timeout=timeout)
+
+    def _send_push(self, url, data, timeout=None):
+        """
+        Send the object data to the APIC
+        """
         post_url = self.api + url
         logging.debug('Posting url: %s data: %s', post_url, data)
 
-        resp = self.session.post(post_url, data=json.dumps(data, sort_keys=True), verify=self.verify_ssl,
-                                 timeout=timeout, proxies=self._proxies)
-        if resp.status_code == 403:
+        token = self.token
+        resp = self._send('post', url, data=json.dumps(data, sort_keys=True), timeout=timeout)
+        if resp.status_code == 403 and self._x509_key is None:
             logging.error(resp.text)
-            logging.error('Trying to login again....')
-            resp = self._send_login()
-            self.resubscribe()
+            self._relogin(token)
             logging.error('Trying post again...')
             logging.debug(post_url)
-            resp = self.session.post(post_url, data=json.dumps(data, sort_keys=True), verify=self.verify_ssl,
-                                     timeout=timeout, proxies=self._proxies)
+            if self._stats is not None:
+                self._stats.record_retry('post', url)
+            resp = self._send('post', url, data=json.dumps(data, sort_keys=True), timeout=timeout)
+        if self._cache is not None:
+            self._cache.clear()
+        if self._single_flight is not None:
+            self._single_flight.forget()
         logging.debug('Response: %s %s', resp, resp.text)
         return resp
 
@@ -644,19 +3653,332 @@ class Session(object):
         get_url = self.api + url
         logging.debug(get_url)
 
-        resp = self.session.get(get_url, timeout=timeout, verify=self.verify_ssl, proxies=self._proxies)
-        if resp.status_code == 403:
+        if self._cache is not None:
+            resp = self._cache.get(url)
+            if resp is not None:
+                logging.debug('Response for %s found in cache', get_url)
+                return resp
+
+        if self._single_flight is not None and ResponseCache.is_cacheable(url):
+            return self._single_flight.do(get_url, self._send_get, url, timeout)
+        return self._send_get(url, timeout)
+
+    def _send_get(self, url, timeout=None):
+        """
+        Send a GET request to the APIC, logging in again if the token
+        has expired
+        """
+        get_url = self.api + url
+        token = self.token
+        resp = self._send('get', url, timeout=timeout)
+        if resp.status_code == 403 and self._x509_key is None:
             logging.error(resp.text)
-            logging.error('Trying to login again....')
-            resp = self._send_login()
-            self.resubscribe()
+            self._relogin(token)
             logging.error('Trying get again...')
             logging.debug(get_url)
-            resp = self.session.get(get_url, timeout=timeout, verify=self.verify_ssl, proxies=self._proxies)
+            if self._stats is not None:
+                self._stats.record_retry('get', url)
+            resp = self._send('get', url, timeout=timeout)
         logging.debug(resp)
         logging.debug(resp.text)
+        if self._cache is not None and resp.ok:
+            self._cache.put(url, resp)
         return resp
 
+    def submit(self, fn, *args, **kwargs):
+        """
+        Run a function that communicates with the APIC in the background.
+        This is typically one of the toolkit getters such as Tenant.get_deep.
+
+        :param fn: function to be called with the remaining arguments
+        :returns: RequestFuture instance holding the result of the call
+        """
+        executor = self._executor
+        if executor is None:
+            executor = get_default_executor()
+        return executor.submit(fn, *args, **kwargs)
+
+    def get_async(self, url, timeout=None):
+        """
+        Perform a REST GET call to the APIC in the background.
+
+        :param url: String containing the URL that will be used to\
+        send the object data to the APIC.
+        :param timeout: Integer containing the number of seconds for\
+                        connection timeout.
+        :returns: RequestFuture instance whose result is the Response\
+                  class instance from the requests library.
+        """
+        return self.submit(self.get, url, timeout=timeout)
+
+    def push_to_apic_async(self, url, data, timeout=None):
+        """
+        Push the object data to the APIC in the background.
+
+        :param url: String containing the URL that will be used to\
+                    send the object data to the APIC.
+        :param data: Dictionary containing the JSON objects to be sent\
+                     to the APIC.
+        :param timeout: Integer containing the number of seconds for\
+                        connection timeout.
+        :returns: RequestFuture instance whose result is the Response\
+                  class instance from the requests library.
+        """
+        return self.submit(self.push_to_apic, url, data, timeout=timeout)
+
+    def _map_parallel(self, fn, urls, max_workers):
+        """
+        Call a function for each URL using a bounded number of worker threads.
+
+        :param fn: function called with each URL
+        :param urls: List of strings containing the URLs
+        :param max_workers: Integer containing the maximum number of threads
+        :returns: List of the results in the same order as the urls.  The\
+                  first exception raised by any of the calls is raised in\
+                  the calling thread once all of the calls have completed.
+        """
+        urls = list(urls)
+        results = [None] * len(urls)
+        errors = []
+        work_q = Queue()
+        for index, url in enumerate(urls):
+            work_q.put((index, url))
+
+        def worker():
+            while True:
+                try:
+                    index, url = work_q.get_nowait()
+                except Empty:
+                    return
+                try:
+                    results[index] = fn(url)
+                except Exception as e:
+                    logging.error('Could not get %s due to %s', url, e)
+                    errors.append((index, e))
+
+        num_workers = min(max_workers, len(urls))
+        if num_workers <= 1:
+            worker()
+        else:
+            workers = []
+            for i in range(num_workers):
+                worker_thread = threading.Thread(target=worker)
+                worker_thread.daemon = True
+                worker_thread.start()
+                workers.append(worker_thread)
+            for worker_thread in workers:
+                worker_thread.join()
+        if errors:
+            # Raise the error of the first failed URL whatever the order
+            # in which the workers completed
+            raise min(errors, key=lambda error: error[0])[1]
+        return results
+
+    def get_many(self, urls, max_workers=8, timeout=None):
+        """
+        Perform several REST GET calls to the APIC in parallel.  The calls
+        are spread across a bounded number of worker threads sharing the
+        session connection pool.
+
+        :param urls: List of strings containing the URLs to get.
+        :param max_workers: Integer containing the maximum number of\
+                            requests that are in flight at the same time.
+        :param timeout: Integer containing the number of seconds for\
+                        connection timeout of each request.
+        :returns: List of Response class instances from the requests\
+                  library in the same order as the urls.  As with get,\
+                  an exception raised by any of the calls is raised once\
+                  all of the calls have completed.
+        """
+        return self._map_parallel(lambda url: self.get(url, timeout=timeout), urls, max_workers)
+
+    def get_stream(self, url, strip_newlines=False, timeout=None):
+        """
+        Perform a REST GET call to the APIC and decode the response while
+        it is being received.  The objects of the imdata list are yielded
+        one at a time so the raw response body is never held in memory as
+        a whole.  Escaped single quotes sent by the APIC are fixed on the
+        fly.  The response is not cached.
+
+        :param url: String containing the query URL.
+        :param strip_newlines: Boolean indicating whether to remove the\
+                               newlines that the APIC includes in some\
+                               attribute values.
+        :param timeout: Integer containing the number of seconds for\
+                        connection timeout.
+        :returns: generator yielding the dictionaries of the imdata list.\
+                  requests.exceptions.HTTPError is raised with the response\
+                  when the APIC refuses the request.
+        """
+        get_url = self.api + url
+        logging.debug(get_url)
+
+        token = self.token
+        # The request keeps its RateLimiter slot while the body is read
+        resp = self._send('get', url, timeout=timeout, stream=True, keep_slot=True)
+        if resp.status_code == 403 and self._x509_key is None:
+            logging.error(resp.text)
+            self._close_stream(resp)
+            self._relogin(token)
+            logging.error('Trying get again...')
+            if self._stats is not None:
+                self._stats.record_retry('get', url)
+            resp = self._send('get', url, timeout=timeout, stream=True, keep_slot=True)
+        if not resp.ok:
+            logging.error('Could not get %s. Received response: %s', get_url, resp.text)
+            self._close_stream(resp)
+            raise requests.exceptions.HTTPError('Could not get %s. Received status %s' % (get_url, resp.status_code),
+                                                response=resp)
+        size = 0
+        decode_time = 0.0
+        try:
+            decoder = ImdataDecoder(strip_newlines=strip_newlines)
+            for chunk in resp.iter_content(chunk_size=decoder.chunk_size):
+                size += len(chunk)
+                start = time.time()
+                items = decoder.feed(chunk)
+                decode_time += time.time() - start
+                for item in items:
+                    yield item
+        finally:
+            self._close_stream(resp)
+            if self._stats is not None:
+                self._stats.record_stream('get', url, size, decode_time)
+
+    def _close_stream(self, resp):
+        """
+        Close a streamed response sent with keep_slot and give its
+        RateLimiter slot back.
+
+        :param resp: Response class instance from the requests library
+        """
+        resp.close()
+        if self._rate_limiter is not None:
+            self._rate_limiter.release_slot()
+
+    def get_many_stream(self, urls, max_workers=8, strip_newlines=False, timeout=None):
+        """
+        Perform several REST GET calls to the APIC in parallel and decode
+        the responses while they are being received.
+
+        :param urls: List of strings containing the URLs to get.
+        :param max_workers: Integer containing the maximum number of\
+                            requests that are in flight at the same time.
+        :param strip_newlines: Boolean indicating whether to remove the\
+                               newlines from the responses.
+        :param timeout: Integer containing the number of seconds for\
+                        connection timeout of each request.
+        :returns: List containing the imdata list of each URL in the same\
+                  order as the urls.  As with get_stream,\
+                  requests.exceptions.HTTPError is raised if the APIC\
+                  refuses any of the requests.
+        """
+        return self._map_parallel(lambda url: list(self.get_stream(url, strip_newlines=strip_newlines,
+                                                                   timeout=timeout)),
+                                  urls, max_workers)
+
+    @staticmethod
+    def _get_order_by_class(url):
+        """
+        Determine the APIC class that a query URL returns so that the
+        results can be ordered for stable paging.
+
+        :param url: String containing the query URL
+        :returns: String containing the APIC class name or None if the\
+                  URL does not identify a single class.
+        """
+        path, _, query = url.partition('?')
+        if '/class/' in path:
+            # Node class queries have the path of the node before the class
+            return path.split('/class/')[1].split('/')[-1].split('.')[0]
+        for param in query.split('&'):
+            if param.startswith('target-subtree-class='):
+                classes = param[len('target-subtree-class='):].split(',')
+                if len(classes) == 1:
+                    return classes[0]
+        return None
+
+    def get_paged(self, url, page_size=None, order_by=None, timeout=None):
+        """
+        Perform a REST GET call to the APIC one page at a time.  The APIC
+        page and page-size options are added to the URL and the pages are
+        requested until the result set is exhausted.  Only a single page of
+        results is held in memory at any time.  The page-size and order-by\
+        options already in the URL are kept.
+
+        :param url: String containing the query URL.
+        :param page_size: Integer containing the number of objects requested\
+                          per page.  Defaults to the session page_size.
+        :param order_by: String containing the property used to order the\
+                         results such as ``fvCEp.dn``.  Ordering keeps the\
+                         pages stable while they are being collected.  If\
+                         not given, the dn of the queried class is used when\
+                         it can be determined from the URL.
+        :param timeout: Integer containing the number of seconds for\
+                        connection timeout of each page request.
+        :returns: generator yielding the dictionaries of the imdata list.\
+                  requests.exceptions.HTTPError is raised with the response\
+                  when the APIC refuses the request of any page, so that a\
+                  failure is not mistaken for the end of the results.
+        """
+        path, _, query = url.partition('?')
+        params = [param for param in query.split('&') if param]
+        options = dict(param.partition('=')[::2] for param in params)
+        if 'page-size' in options:
+            page_size = int(options['page-size'])
+        else:
+            if page_size is None:
+                page_size = self.page_size
+            params.append('page-size=%s' % page_size)
+        if 'order-by' not in options:
+            if order_by is None:
+                order_class = self._get_order_by_class(url)
+                if order_class is not None:
+                    order_by = '%s.dn' % order_class
+            if order_by is not None:
+                params.append('order-by=%s' % order_by)
+        base_url = path + '?' + '&'.join(params)
+        page = 0
+        while True:
+            page_url = '%s&page=%s' % (base_url, page)
+            ret = self.get(page_url, timeout=timeout)
+            if not ret.ok:
+                logging.error('Could not get %s. Received response: %s', page_url, ret.text)
+                raise requests.exceptions.HTTPError('Could not get %s. Received status %s' %
+                                                    (page_url, ret.status_code), response=ret)
+            ret_data = ret.json()
+            data = ret_data['imdata']
+            for item in data:
+                yield item
+            page += 1
+            if len(data) < page_size:
+                return
+            total_count = ret_data.get('totalCount')
+            if total_count is not None and page * page_size >= int(total_count):
+                return
+
+    def iter_class(self, class_name, params=None, page_size=None, timeout=None):
+        """
+        Iterate through all of the instances of an APIC class.  The class
+        query is collected in pages so that very large classes such as\
+        fvCEp can be walked without loading the whole result at once.
+
+        :param class_name: String containing the APIC class name
+        :param params: Optional dictionary of additional query options such\
+                       as ``{'rsp-subtree': 'full'}``
+        :param page_size: Integer containing the number of objects requested\
+                          per page.  Defaults to the session page_size.
+        :param timeout: Integer containing the number of seconds for\
+                        connection timeout of each page request.
+        :returns: generator yielding the dictionaries of the imdata list.
+        """
+        query = {'query-target': 'self'}
+        if params is not None:
+            query.update(params)
+        url = '/api/node/class/%s.json?%s' % (class_name,
+                                              '&'.join('%s=%s' % (key, query[key]) for key in sorted(query)))
+        return self.get_paged(url, page_size=page_size, order_by='%s.dn' % class_name, timeout=timeout)
+
     def register_login_callback(self, callback_fn):
         """
         Register a callback function that will be called when the session performs a
@@ -684,3 +4006,281 @@ class Session(object):
         """
         for callback_fn in self._relogin_callbacks:
             callback_fn(self)
+
+
+class ClusterSession(Session):
+    """
+    Session with all of the controllers of an APIC cluster.
+
+    The session logs in to every controller.  GET requests are sent to the
+    controller with the fewest outstanding requests.  Configuration pushes,
+    logins and subscriptions are pinned to a single controller, the
+    primary.  A controller that fails a request with a connection error is
+    skipped for retry_interval seconds and the request is sent to another
+    controller.  When the primary fails, the next controller becomes the
+    primary and the subscriptions are issued again on it.
+    """
+    def __init__(self, urls, uid, pwd, verify_ssl=False, subscription_enabled=True,
+                 proxies=None, retry_interval=30, **kwargs):
+        """
+        :param urls: List of strings containing the URLs of the controllers\
+                     such as ``https://1.2.3.4``.  The first one is the\
+                     primary as long as it responds.
+        :param uid: String containing the username that will be used as\
+                    part of the APIC login credentials.
+        :param pwd: String containing the password that will be used as\
+                    part of the APIC login credentials.
+        :param retry_interval: Number of seconds a controller that failed\
+                               a request is not used.
+        The other arguments are the same as for Session.
+        """
+        if not urls:
+            raise CredentialsError("At least one APIC URL must be given")
+        Session.__init__(self, urls[0], uid, pwd, verify_ssl=verify_ssl,
+                         subscription_enabled=subscription_enabled, proxies=proxies, **kwargs)
+        self._urls = list(urls)
+        self.retry_interval = retry_interval
+        # The tokens are per controller
+        self._token_cache = None
+        self._members = [Session(url, uid, pwd, verify_ssl=verify_ssl,
+                                 subscription_enabled=False, proxies=proxies,
+                                 cert_name=kwargs.get('cert_name'), key=kwargs.get('key'))
+                         for url in self._urls]
+        for member in self._members:
+            # The requests of all of the controllers are recorded together
+            member._stats = self._stats
+        self._primary = self._members[0]
+        self._cluster_lock = threading.Lock()
+        self._outstanding = dict((member, 0) for member in self._members)
+        self._requests = dict((member, 0) for member in self._members)
+        self._failures = dict((member, 0) for member in self._members)
+        self._down_until = {}
+
+    def __reduce__(self):
+        """
+        This will enable this class to be pickled by only saving the urls,
+        uid and pwd when pickling.
+        """
+        return self.__class__, (self._urls, self.uid, self.pwd)
+
+    def _set_primary(self, member):
+        """
+        Make a controller the one that receives the pinned requests.  Must
+        be called with the cluster lock held.
+
+        :param member: Session instance of the controller
+        """
+        self._primary = member
+        self.api = member.api
+        self.ipaddr = member.ipaddr
+        self.token = member.token
+        self.session = member.session
+
+    def _is_up(self, member, now):
+        return self._down_until.get(member, 0) <= now
+
+    @staticmethod
+    def _is_pinned(method, url):
+        """
+        Check if a request must be sent to the primary controller.
+
+        :param method: String containing the requests.Session method name
+        :param url: String containing the URL relative to the APIC address
+        """
+        if method != 'get':
+            return True
+        return (url.startswith('/api/aaa') or url.startswith('/api/subscriptionRefresh') or
+                'subscription=yes' in url or 'subscription=no' in url)
+
+    def _get_members(self, method, url):
+        """
+        Get the controllers to try for a request, in order.
+
+        :param method: String containing the requests.Session method name
+        :param url: String containing the URL relative to the APIC address
+        :returns: List of Session instances.  The controllers that recently\
+                  failed are last.
+        """
+        now = time.time()
+        with self._cluster_lock:
+            if self._is_pinned(method, url):
+                first = [self._primary]
+            else:
+                first = sorted([member for member in self._members if self._is_up(member, now)],
+                               key=lambda member: (self._outstanding[member], self._requests[member]))[:1]
+            rest = [member for member in self._members if member not in first]
+            rest.sort(key=lambda member: not self._is_up(member, now))
+        return first + rest
+
+    def _send_once(self, method, url, **kwargs):
+        """
+        Send a single HTTP request to a controller of the cluster, trying
+        the other controllers if it cannot be reached.
+
+        :param method: String containing the requests.Session method name\
+                       such as 'get' or 'post'
+        :param url: String containing the URL relative to the APIC address
+        :returns: Response class instance from the requests library.
+        """
+        error = None
+        for member in self._get_members(method, url):
+            if not member._logged_in:
+                continue
+            with self._cluster_lock:
+                self._outstanding[member] += 1
+                self._requests[member] += 1
+            try:
+                return member._send_once(method, url, **kwargs)
+            except (ConnectionError, requests.exceptions.Timeout) as e:
+                logging.warning('APIC %s failed request %s: %s', member.api, url, e)
+                error = e
+                self._fail(member)
+            finally:
+                with self._cluster_lock:
+                    self._outstanding[member] -= 1
+        if error is None:
+            error = ConnectionError('Not logged in to any APIC of the cluster')
+        raise error
+
+    def _fail(self, member):
+        """
+        Stop using a controller that failed a request for retry_interval
+        seconds.  If it is the primary, the next controller that is up
+        becomes the primary.
+
+        :param member: Session instance of the controller
+        """
+        now = time.time()
+        with self._cluster_lock:
+            self._failures[member] += 1
+            self._down_until[member] = now + self.retry_interval
+            if member is not self._primary:
+                return
+            candidates = [candidate for candidate in self._members
+                          if candidate._logged_in and self._is_up(candidate, now)]
+            if not candidates:
+                return
+            logging.warning('APIC %s failed, using %s as primary', member.api, candidates[0].api)
+            self._set_primary(candidates[0])
+        if self._subscription_enabled:
+            # Not in the thread of the failed request, which may be the
+            # subscriber itself
+            thread = threading.Thread(target=self._move_subscriptions)
+            thread.daemon = True
+            thread.start()
+
+    def _move_subscriptions(self):
+        """
+        Issue the subscriptions again on a new primary controller.
+        """
+        self.subscription_thread._open_web_socket('https://' in self.api)
+        self.resubscribe()
+
+    def _send_cert_login(self):
+        """
+        Prepare the sessions with all of the controllers for certificate
+        authentication.
+
+        :returns: Response class instance with a 200 status code
+        """
+        for member in self._members:
+            member._send_cert_login()
+        with self._cluster_lock:
+            self._set_primary(self._primary)
+        return Session._send_cert_login(self)
+
+    def _send_login(self, timeout=None):
+        """
+        Log in to all of the controllers of the cluster and open the web
+        socket interface with the primary.
+        """
+        resp = None
+        for member in self._members:
+            try:
+                member_resp = member._send_login(timeout)
+            except ConnectionError as e:
+                logging.error('Could not login to APIC %s due to ConnectionError: %s', member.api, e)
+                self._fail(member)
+                continue
+            if member_resp.ok:
+                with self._cluster_lock:
+                    self._down_until.pop(member, None)
+            if resp is None or (member_resp.ok and not resp.ok):
+                resp = member_resp
+        if resp is None:
+            raise ConnectionError('Could not login to any APIC of the cluster')
+        if not resp.ok:
+            logging.error('Could not relogin to APIC. Aborting login thread.')
+            self.login_thread.exit()
+            if self._subscription_enabled:
+                self.subscription_thread.exit()
+            return resp
+        self._logged_in = True
+        now = time.time()
+        with self._cluster_lock:
+            primary = self._primary
+            if not primary.logged_in() or not self._is_up(primary, now):
+                primary = [member for member in self._members
+                           if member.logged_in() and self._is_up(member, now)][0]
+            self._set_primary(primary)
+        if self._subscription_enabled:
+            self.subscription_thread._open_web_socket('https://' in self.api)
+        self.login_thread._login_timeout = primary.login_thread._login_timeout
+        return resp
+
+    def refresh_login(self, timeout=None):
+        """
+        Refresh the login to all of the controllers.  The controllers that
+        were not logged in are logged in again.
+
+        :param timeout: Integer containing the number of seconds for connection timeout
+        :return: Instance of requests.Response of the primary controller
+        """
+        primary = self._primary
+        resp = None
+        for member in self._members:
+            try:
+                if member._logged_in:
+                    member_resp = member.refresh_login(timeout=timeout)
+                else:
+                    member_resp = member._send_login(timeout)
+            except (ConnectionError, requests.exceptions.Timeout) as e:
+                logging.warning('Could not refresh login to APIC %s: %s', member.api, e)
+                self._fail(member)
+                continue
+            if member is primary:
+                resp = member_resp
+            elif not member_resp.ok:
+                logging.warning('Could not refresh login to APIC %s', member.api)
+        if resp is None:
+            raise ConnectionError('Could not refresh login to the primary APIC %s' % primary.api)
+        return resp
+
+    def close(self):
+        """
+        Close the session with all of the controllers
+        """
+        self.close_subscriber_thread()
+        if self._journal is not None:
+            self._journal.flush()
+        for member in self._members:
+            if member.session is not None:
+                member.session.close()
+
+    def get_member_stats(self):
+        """
+        Get the state of the controllers of the cluster.
+
+        :returns: List of dictionaries containing the URL of a controller,\
+                  whether it is up and the primary, and its number of\
+                  outstanding requests, requests and failures.
+        """
+        now = time.time()
+        with self._cluster_lock:
+            return [{'url': member.api,
+                     'up': self._is_up(member, now),
+                     'primary': member is self._primary,
+                     'outstanding': self._outstanding[member],
+                     'requests': self._requests[member],
+                     'failures': self._failures[member]}
+                    for member in self._members]
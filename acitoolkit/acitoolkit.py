@@ -36,6 +36,7 @@ from operator import attrgetter, itemgetter
 import re
 import sys
 import copy
+import warnings
 
 from requests.compat import urlencode
 
@@ -195,19 +196,9 @@ class Tenant(BaseACIObject):
         full_data = []
         if parent is None:
             parent = Fabric()
-        for name in names:
-            query_url = '/api/mo/uni/tn-{}.json?{}'.format(name, query)
-            ret = session.get(query_url)
-
-            # the following works around a bug encountered in the json returned from the APIC
-            # Python3 throws an error 'TypeError: 'str' does not support the buffer interface'
-            # This error gets catched and the replace is done with byte code in a Python3 compatible way
-            try:
-                ret._content = ret._content.replace("\\\'", "'")
-            except TypeError:
-                ret._content = ret._content.replace(b"\\\'", b"'")
-
-            data = ret.json()['imdata']
+        query_urls = ['/api/mo/uni/tn-{}.json?{}'.format(name, query) for name in names]
+        # the escaped quotes in the json returned from the APIC are fixed while the responses are decoded
+        for name, data in zip(names, session.get_many_stream(query_urls)):
             if len(data):
                 full_data.append(data[0])
                 obj = super(Tenant, cls).get_deep(full_data=data,
@@ -221,11 +212,41 @@ class Tenant(BaseACIObject):
                     resp.append(obj)
                 else:
                     print name, 'resulted in a null object'
-        obj_dict = build_object_dictionary(objs)
+        index = RelationIndex(full_data, objs)
         for obj in objs:
-            obj._extract_relationships(full_data, obj_dict)
+            obj._extract_relationships(index)
         return resp
 
+    @classmethod
+    def get_deep_async(cls, session, names=(), limit_to=(), subtree='full', config_only=False, parent=None):
+        """
+        Get the Tenant objects and all of the children objects in the background.
+        The parameters are the same as get_deep.
+
+        :returns: RequestFuture instance whose result is the list of Tenant objects
+        """
+        return session.submit(cls.get_deep, session, names=names, limit_to=limit_to, subtree=subtree,
+                              config_only=config_only, parent=parent)
+
+    def _fetch_children(self, session, include_concrete):
+        """
+        Fetch the whole tree of the tenant in a single query since the
+        relations between its objects are resolved from the full data.
+
+        :param session: the instance of Session used for APIC communication
+        :param include_concrete: True or False
+        :returns: Empty list as the children are already fully populated
+        """
+        for tenant in Tenant.get_deep(session, names=[self.name]):
+            for child in tenant.get_children():
+                # The fetched child replaces a local child that is equal to it
+                duplicate = self._get_equal_child(child)
+                if duplicate is not None:
+                    self._discard_child(duplicate)
+                child.set_parent(self)
+                self.add_child(child)
+        return []
+
     @classmethod
     def get(cls, session, parent=None):
         """
@@ -1031,40 +1052,13 @@ class EPG(CommonEPG):
         """
         self._dom_resolution_immediacy = immediacy
 
-    def _extract_relationships(self, data, obj_dict):
-        app_profile = self.get_parent()
-        tenant = app_profile.get_parent()
-        for tenant_data in data:
-            if 'fvTenant' in tenant_data and tenant_data['fvTenant']['attributes']['name'] == tenant.name:
-                tenant_children = tenant_data['fvTenant']['children']
-        epg_children = None
-        for app in tenant_children:
-            if 'fvAp' in app:
-                if app['fvAp']['attributes']['name'] == app_profile.name:
-                    for epg in app['fvAp']['children']:
-                        if 'fvAEPg' in epg:
-                            epg_name = epg['fvAEPg']['attributes']['name']
-                            if epg_name == self.name:
-                                epg_children = epg['fvAEPg']['children']
-        for child in epg_children:
+    def _extract_relationships(self, index):
+        tenant = self.get_parent().get_parent()
+        for child in index.get_raw_children(self):
             if 'fvRsBd' in child:
                 bd_name = child['fvRsBd']['attributes']['tnFvBDName']
-                # bd_search = Search()
-                # bd_search.name = bd_name
-                #objs = tenant.find(bd_search)
-                if BridgeDomain in obj_dict:
-                    objs = obj_dict[BridgeDomain]
-                    found = False
-                    for bd in objs:
-                        #if isinstance(bd, BridgeDomain):
-                        if bd.name == bd_name and bd.get_parent() == tenant:
-                            self.add_bd(bd)
-                            found = True
-                    if not found:
-                        for bd in objs:
-                            if bd.name == bd_name and bd.get_parent().name == 'common':
-                                self.add_bd(bd)
-
+                for bd in index.find(BridgeDomain, tenant, bd_name):
+                    self.add_bd(bd)
             elif 'fvRsPathAtt' in child:
                 int_attributes = child['fvRsPathAtt']['attributes']
                 int_dn = int_attributes['tDn']
@@ -1084,97 +1078,22 @@ class EPG(CommonEPG):
                 self.attach(l2int)
             elif 'fvRsProv' in child:
                 contract_name = child['fvRsProv']['attributes']['tnVzBrCPName']
-                # contract_search = Search()
-                # contract_search.name = contract_name
-                # objs = tenant.find(contract_search)
-                # if len(objs):
-                #     for contract in objs:
-                #         if isinstance(contract, Contract):
-                # else:
-                #     # Need to check tenant common (if available)
-                #     fabric = tenant.get_parent()
-                #     if fabric is not None:
-                #         tenant_search = Search()
-                #         tenant_search.name = 'common'
-                #         tenant_common = fabric.find(tenant_search)
-                #         if len(tenant_common):
-                #             objs = tenant_common[0].find(contract_search)
-                #             if len(objs):
-                #                 for contract in objs:
-                #                     if isinstance(contract, Contract):
-                #                         self.provide(contract)
-
-                if Contract in obj_dict:
-                    objs = obj_dict[Contract]
-                else:
-                    objs = []
-                if len(objs):
-                    found = False
-                    for contract in objs:
-                        if contract.name == contract_name and contract.get_parent() == tenant:
-                            self.provide(contract)
-                            found = True
-                    if not found:
-                        for contract in objs:
-                            if contract.name == contract_name and contract.get_parent().name == 'common':
-                                self.provide(contract)
+                for contract in index.find(Contract, tenant, contract_name):
+                    self.provide(contract)
             elif 'fvRsCons' in child:
                 contract_name = child['fvRsCons']['attributes']['tnVzBrCPName']
-                # contract_search = Search()
-                # contract_search.name = contract_name
-                # objs = tenant.find(contract_search)
-                # if len(objs):
-                #     for contract in objs:
-                #         if isinstance(contract, Contract):
-                #             self.consume(contract)
-                # else:
-                # Need to check tenant common (if available)
-                # fabric = tenant.get_parent()
-                # if fabric is not None:
-                #     tenant_search = Search()
-                #     tenant_search.name = 'common'
-                #     tenant_common = fabric.find(tenant_search)
-                #     if len(tenant_common):
-                #         objs = tenant_common[0].find(contract_search)
-                #         if len(objs):
-                #             for contract in objs:
-                #                 if isinstance(contract, Contract):
-                #                     self.consume(contract)
-                if Contract in obj_dict:
-                    objs = obj_dict[Contract]
-
-                    if len(objs):
-                        found = False
-                        for contract in objs:
-                            if contract.name == contract_name and contract.get_parent() == tenant:
-                                self.consume(contract)
-                                found = True
-                        if not found:
-                            for contract in objs:
-                                if contract.name == contract_name and contract.get_parent().name == 'common':
-                                    self.consume(contract)
-
+                for contract in index.find(Contract, tenant, contract_name):
+                    self.consume(contract)
             elif 'fvRsDomAtt' in child:
                 dom_attributes = child['fvRsDomAtt']['attributes']
                 self._dom_deployment_immediacy = dom_attributes['instrImedcy']
                 self._dom_resolution_immediacy = dom_attributes['resImedcy']
             elif 'fvRsConsIf' in child:
                 contract_if_name = child['fvRsConsIf']['attributes']['tnVzCPIfName']
-                if ContractInterface in obj_dict:
-                    objs = obj_dict[ContractInterface]
+                for contract_if in index.find(ContractInterface, tenant, contract_if_name):
+                    self.consume_cif(contract_if)
 
-                    if len(objs):
-                        found = False
-                        for contract_if in objs:
-                            if contract_if.name == contract_if_name and contract_if.get_parent() == tenant:
-                                self.consume_cif(contract_if)
-                                found = True
-                        if not found:
-                            for contract_if in objs:
-                                if contract_if.name == contract_if_name and contract_if.get_parent().name == 'common':
-                                    self.consume_cif(contract_if)
-
-        super(EPG, self)._extract_relationships(data, obj_dict)
+        super(EPG, self)._extract_relationships(index)
 
     def add_static_leaf_binding(self, leaf_id, encap_type, encap_id, encap_mode="regular", immediacy="lazy", pod=1):
         """
@@ -1386,70 +1305,23 @@ class OutsideEPG(CommonEPG):
         """
         return {'l3extSubnet': OutsideNetwork, }
 
-    def _extract_relationships(self, data, obj_dict, epg_type='l3'):
-        l3out = self.get_parent()
-        tenant = l3out.get_parent()
-        for tenant_data in data:
-            if 'fvTenant' in tenant_data and tenant_data['fvTenant']['attributes']['name'] == tenant.name:
-                tenant_children = tenant_data['fvTenant']['children']
-        epg_children = []
-        l3ext_out = epg_type + 'extOut'
-        l3ext_instp = epg_type + 'extInstP'
-        for l3out_child in tenant_children:
-            if l3ext_out in l3out_child:
-                if l3out_child[l3ext_out]['attributes']['name'] == l3out.name:
-                    for l3epg in l3out_child[l3ext_out]['children']:
-                        if l3ext_instp in l3epg:
-                            if l3epg[l3ext_instp]['attributes']['name'] == self.name:
-                                epg_children = l3epg[l3ext_instp]['children']
-        for child in epg_children:
+    def _extract_relationships(self, index):
+        tenant = self.get_parent().get_parent()
+        for child in index.get_raw_children(self):
             if 'fvRsProv' in child:
                 contract_name = child['fvRsProv']['attributes']['tnVzBrCPName']
-                if Contract in obj_dict:
-                    objs = obj_dict[Contract]
-
-                    if len(objs):
-                        found = False
-                        for contract in objs:
-                            if contract.name == contract_name and contract.get_parent() == tenant:
-                                self.provide(contract)
-                                found = True
-                        if not found:
-                            for contract in objs:
-                                if contract.name == contract_name and contract.get_parent().name == 'common':
-                                    self.provide(contract)
-
+                for contract in index.find(Contract, tenant, contract_name):
+                    self.provide(contract)
             elif 'fvRsCons' in child:
                 contract_name = child['fvRsCons']['attributes']['tnVzBrCPName']
-                if Contract in obj_dict:
-                    objs = obj_dict[Contract]
-                    if len(objs):
-                        found = False
-                        for contract in objs:
-                            if contract.name == contract_name and contract.get_parent() == tenant:
-                                self.consume(contract)
-                                found = True
-                        if not found:
-                            for contract in objs:
-                                if contract.name == contract_name and contract.get_parent().name == 'common':
-                                    self.consume(contract)
+                for contract in index.find(Contract, tenant, contract_name):
+                    self.consume(contract)
             elif 'fvRsConsIf' in child:
                 contract_if_name = child['fvRsConsIf']['attributes']['tnVzCPIfName']
-                if ContractInterface in obj_dict:
-                    objs = obj_dict[ContractInterface]
-
-                    if len(objs):
-                        found = False
-                        for contract_if in objs:
-                            if contract_if.name == contract_if_name and contract_if.get_parent() == tenant:
-                                self.consume_cif(contract_if)
-                                found = True
-                        if not found:
-                            for contract_if in objs:
-                                if contract_if.name == contract_if_name and contract_if.get_parent().name == 'common':
-                                    self.consume_cif(contract_if)
+                for contract_if in index.find(ContractInterface, tenant, contract_if_name):
+                    self.consume_cif(contract_if)
 
-        super(OutsideEPG, self)._extract_relationships(data, obj_dict)
+        super(OutsideEPG, self)._extract_relationships(index)
 
 
 class AnyEPG(CommonEPG):
@@ -1477,72 +1349,23 @@ class AnyEPG(CommonEPG):
                                                 attributes=attr,
                                                 children=children)
 
-    def _extract_relationships(self, data, obj_dict):
-        context = self.get_parent()
-        tenant = context.get_parent()
-        for tenant_data in data:
-            if 'fvTenant' in tenant_data and tenant_data['fvTenant']['attributes']['name'] == tenant.name:
-                tenant_children = tenant_data['fvTenant']['children']
-        epg_children = []
-        for ctx in tenant_children:
-            if 'fvCtx' in ctx:
-                if ctx['fvCtx']['attributes']['name'] == context.name:
-                    for ctx_child in ctx['fvCtx']['children']:
-                        if 'vzAny' in ctx_child:
-                            if 'children' in ctx_child['vzAny']:
-                                epg_children = ctx_child['vzAny']['children']
-                    break
-        for child in epg_children:
+    def _extract_relationships(self, index):
+        tenant = self.get_parent().get_parent()
+        for child in index.get_raw_children(self):
             if 'vzRsAnyToProv' in child:
                 contract_name = child['vzRsAnyToProv']['attributes']['tnVzBrCPName']
-
-                if Contract in obj_dict:
-                    objs = obj_dict[Contract]
-                else:
-                    objs = []
-                if len(objs):
-                    found = False
-                    for contract in objs:
-                        if contract.name == contract_name and contract.get_parent() == tenant:
-                            self.provide(contract)
-                            found = True
-                    if not found:
-                        for contract in objs:
-                            if contract.name == contract_name and contract.get_parent().name == 'common':
-                                self.provide(contract)
+                for contract in index.find(Contract, tenant, contract_name):
+                    self.provide(contract)
             elif 'vzRsAnyToCons' in child:
                 contract_name = child['vzRsAnyToCons']['attributes']['tnVzBrCPName']
-                if Contract in obj_dict:
-                    objs = obj_dict[Contract]
-
-                    if len(objs):
-                        found = False
-                        for contract in objs:
-                            if contract.name == contract_name and contract.get_parent() == tenant:
-                                self.consume(contract)
-                                found = True
-                        if not found:
-                            for contract in objs:
-                                if contract.name == contract_name and contract.get_parent().name == 'common':
-                                    self.consume(contract)
-
+                for contract in index.find(Contract, tenant, contract_name):
+                    self.consume(contract)
             elif 'vzRsAnyToConsIf' in child:
                 contract_if_name = child['vzRsAnyToConsIf']['attributes']['tnVzCPIfName']
-                if ContractInterface in obj_dict:
-                    objs = obj_dict[ContractInterface]
+                for contract_if in index.find(ContractInterface, tenant, contract_if_name):
+                    self.consume_cif(contract_if)
 
-                    if len(objs):
-                        found = False
-                        for contract_if in objs:
-                            if contract_if.name == contract_if_name and contract_if.get_parent() == tenant:
-                                self.consume_cif(contract_if)
-                                found = True
-                        if not found:
-                            for contract_if in objs:
-                                if contract_if.name == contract_if_name and contract_if.get_parent().name == 'common':
-                                    self.consume_cif(contract_if)
-
-        super(AnyEPG, self)._extract_relationships(data, obj_dict)
+        super(AnyEPG, self)._extract_relationships(index)
 
     def _get_common_json(self):
         """Internal routine to generate JSON common to EPGs and Outside EPGs"""
@@ -1610,9 +1433,6 @@ class OutsideL2EPG(CommonEPG):
     def _get_name_from_dn(dn):
         return dn.split('/instP-')[1].split('/')[0]
 
-    def _extract_relationships(self, data, obj_dict):
-        super(OutsideL2EPG, self)._extract_relationships(data, obj_dict, epg_type='l2')
-
 
 class OutsideL3(BaseACIObject):
     """Represents the L3Out for external connectivity
@@ -1686,35 +1506,14 @@ class OutsideL3(BaseACIObject):
         """
         return ['l3extOut']
 
-    def _extract_relationships(self, data, obj_dict):
+    def _extract_relationships(self, index):
         tenant = self.get_parent()
-        for tenant_data in data:
-            if 'fvTenant' in tenant_data and tenant_data['fvTenant']['attributes']['name'] == tenant.name:
-                tenant_children = tenant_data['fvTenant']['children']
-        for child in tenant_children:
-            if 'l3extOut' in child:
-                outside_l3_name = child['l3extOut']['attributes']['name']
-                if outside_l3_name == self.name:
-                    outside_children = child['l3extOut']['children']
-                    for outside_child in outside_children:
-                        if 'l3extRsEctx' in outside_child:
-                            context_name = outside_child['l3extRsEctx']['attributes']['tnFvCtxName']
-                            # tenant = self.get_parent()
-                            # context_search = Search()
-                            # context_search.name = context_name
-                            # objs = tenant.find(context_search)
-                            # for context in objs:
-                            #     if isinstance(context, Context):
-                            #         self.add_context(context)
-
-                            if Context in obj_dict:
-                                all_contexts = obj_dict[Context]
-                                if len(all_contexts):
-                                    for context in all_contexts:
-                                        if context.name == context_name and context.get_parent() == tenant:
-                                            self.add_context(context)
-                    break
-        super(OutsideL3, self)._extract_relationships(data, obj_dict)
+        for child in index.get_raw_children(self):
+            if 'l3extRsEctx' in child:
+                context_name = child['l3extRsEctx']['attributes']['tnFvCtxName']
+                for context in index.find(Context, tenant, context_name, in_common=False):
+                    self.add_context(context)
+        super(OutsideL3, self)._extract_relationships(index)
 
     # L3 External Domain
     def add_l3extdom(self, extdom):
@@ -1851,37 +1650,14 @@ class OutsideL2(BaseACIObject):
         """
         self._remove_all_relation(BridgeDomain)
 
-    def _extract_relationships(self, data, obj_dict):
-        tenant_children = None
+    def _extract_relationships(self, index):
         tenant = self.get_parent()
-        for tenant_data in data:
-            if 'fvTenant' in tenant_data and tenant_data['fvTenant']['attributes']['name'] == tenant.name:
-                tenant_children = tenant_data['fvTenant']['children']
-        if tenant_children is not None:
-            for child in tenant_children:
-                if 'l2extOut' in child:
-                    outside_l2_name = child['l2extOut']['attributes']['name']
-                    if outside_l2_name == self.name:
-                        outside_children = child['l2extOut']['children']
-                        for outside_child in outside_children:
-                            if 'l2extRsEBd' in outside_child:
-                                bd_name = outside_child['l2extRsEBd']['attributes']['tnFvBDName']
-                                tenant = self.get_parent()
-                                # bd_search = Search()
-                                # bd_search.name = bd_name
-                                # objs = tenant.find(bd_search)
-                                # for bd in objs:
-                                #     if isinstance(bd, BridgeDomain):
-                                #         self.add_bd(bd)
-
-                                if BridgeDomain in obj_dict:
-                                    all_bds = obj_dict[BridgeDomain]
-                                    if len(all_bds):
-                                        for bd in all_bds:
-                                            if bd.name == bd_name and bd.get_parent() == tenant:
-                                                self.add_bd(bd)
-                        break
-        super(OutsideL2, self)._extract_relationships(data, obj_dict)
+        for child in index.get_raw_children(self):
+            if 'l2extRsEBd' in child:
+                bd_name = child['l2extRsEBd']['attributes']['tnFvBDName']
+                for bd in index.find(BridgeDomain, tenant, bd_name, in_common=False):
+                    self.add_bd(bd)
+        super(OutsideL2, self)._extract_relationships(index)
 
     # L2 External Domain
     def add_l2extdom(self, extdom):
@@ -2528,52 +2304,18 @@ class BridgeDomain(BaseACIObject):
                                                   attributes=attr,
                                                   children=children)
 
-    def _extract_relationships(self, data, obj_dict):
+    def _extract_relationships(self, index):
         tenant = self.get_parent()
-        for tenant_data in data:
-            if 'fvTenant' in tenant_data and tenant_data['fvTenant']['attributes']['name'] == tenant.name:
-                tenant_children = tenant_data['fvTenant']['children']
-        for child in tenant_children:
-            if 'fvBD' in child:
-                bd_name = child['fvBD']['attributes']['name']
-                if bd_name == self.name:
-                    bd_children = child['fvBD']['children']
-                    for bd_child in bd_children:
-                        if 'fvRsCtx' in bd_child:
-                            context_name = bd_child['fvRsCtx']['attributes']['tnFvCtxName']
-                            # tenant = self.get_parent()
-                            # context_search = Search()
-                            # context_search.name = context_name
-                            # objs = tenant.find(context_search)
-                            # for context in objs:
-                            #     if isinstance(context, Context):
-                            #         self.add_context(context)
-
-                            if Context in obj_dict:
-                                all_contexts = obj_dict[Context]
-                                if len(all_contexts):
-                                    for context in all_contexts:
-                                        if context.name == context_name and context.get_parent() == tenant:
-                                            self.add_context(context)
-
-                        elif 'fvRsBDToOut' in bd_child:
-                            l3_out_name = bd_child['fvRsBDToOut']['attributes']['tnL3extOutName']
-                            # tenant = self.get_parent()
-                            # l3_out_search = Search()
-                            # l3_out_search.name = l3_out_name
-                            # objs = tenant.find(l3_out_search)
-                            # for l3_out in objs:
-                            #     if isinstance(l3_out, OutsideL3):
-                            #         self.add_l3out(l3_out)
-
-                            if OutsideL3 in obj_dict:
-                                all_l3out = obj_dict[OutsideL3]
-                                if len(all_l3out):
-                                    for l3_out in all_l3out:
-                                        if l3_out.name == l3_out_name and l3_out.get_parent() == tenant:
-                                            self.add_l3out(l3_out)
-                    break
-        super(BridgeDomain, self)._extract_relationships(data, obj_dict)
+        for child in index.get_raw_children(self):
+            if 'fvRsCtx' in child:
+                context_name = child['fvRsCtx']['attributes']['tnFvCtxName']
+                for context in index.find(Context, tenant, context_name, in_common=False):
+                    self.add_context(context)
+            elif 'fvRsBDToOut' in child:
+                l3_out_name = child['fvRsBDToOut']['attributes']['tnL3extOutName']
+                for l3_out in index.find(OutsideL3, tenant, l3_out_name, in_common=False):
+                    self.add_l3out(l3_out)
+        super(BridgeDomain, self)._extract_relationships(index)
 
     # Context references
     def add_context(self, context):
@@ -2876,6 +2618,14 @@ class BaseSubnet(BaseACIObject):
 
         return super(BaseSubnet, self).__eq__(other) and self._addr == other._addr
 
+    __hash__ = BaseACIObject.__hash__
+
+    def _get_identity(self):
+        """
+        Get the key identifying the subnets, matching their equality
+        """
+        return super(BaseSubnet, self)._get_identity() + (self._addr,)
+
 
 class Subnet(BaseSubnet):
     """ Subnet :  roughly equivalent to fvSubnet """
@@ -3217,52 +2967,22 @@ class ContractInterface(BaseACIObject):
         """
         return Tenant
 
-    def _extract_relationships(self, data, obj_dict):
-        consumer_tenant = self.get_parent()
-
-        # Find the ContractInterface
-        imported_contract_dn = None
-        consumer_tenant_data = None
-        contract_if_children_data = None
-        for item in data:
-            if 'fvTenant' in item:
-                if item['fvTenant']['attributes']['name'] == consumer_tenant.name:
-                    consumer_tenant_data = item
-        if consumer_tenant_data is None:
-            return
-        children = consumer_tenant_data['fvTenant']['children']
-        for child in children:
-            if 'vzCPIf' in child and child['vzCPIf']['attributes']['name'] == self.name:
-                if 'children' in child['vzCPIf']:
-                    contract_if_children_data = child['vzCPIf']['children']
-                break
-        if contract_if_children_data is None:
-            return
-
+    def _extract_relationships(self, index):
         # Find the import contract relation
-        for child in contract_if_children_data:
+        imported_contract_dn = None
+        for child in index.get_raw_children(self):
             if 'vzRsIf' in child:
                 imported_contract_dn = child['vzRsIf']['attributes']['tDn']
         if imported_contract_dn is None:
             return
 
-        # Look if there is already a Tenant
+        # Find the contract in the tenant it is imported from
         imported_tenant_name = imported_contract_dn.partition('/tn-')[-1].partition('/')[0]
         imported_contract_name = imported_contract_dn.partition('/brc-')[-1].partition('/')[0]
-        provider_tenant = None
-        if consumer_tenant.has_parent():
-            for child in consumer_tenant.get_parent().get_children():
-                if isinstance(child, Tenant) and child.name == imported_tenant_name:
-                    provider_tenant = child
-                    break
-
-        # Find the contract
-        if provider_tenant is not None:
-            for contract in provider_tenant.get_children(only_class=Contract):
-                if contract.name == imported_contract_name:
-                    self.import_contract(contract)
+        for contract in index.find_in_tenant(Contract, imported_tenant_name, imported_contract_name):
+            self.import_contract(contract)
 
-        super(ContractInterface, self)._extract_relationships(data, obj_dict)
+        super(ContractInterface, self)._extract_relationships(index)
 
     @staticmethod
     def _get_parent_dn(dn):
@@ -3602,43 +3322,19 @@ class ContractSubject(BaseACIObject):
         return {'vzInTerm': InputTerminal,
                 'vzOutTerm': OutputTerminal}
 
-    def _extract_relationships(self, data, obj_dict):
+    def _extract_relationships(self, index):
         """
         Extracts and rebuild the relationships between the ContractSubject
         and Filter objects.
         """
-        contract = self.get_parent()
-        tenant = contract.get_parent()
-        for tenant_data in data:
-            if 'fvTenant' in tenant_data and tenant_data['fvTenant']['attributes']['name'] == tenant.name:
-                contract_data = tenant_data['fvTenant']['children']
-        if len(contract_data):
-            for child in contract_data:
-                if 'vzBrCP' in child and 'children' in child['vzBrCP']:
-                    for subj in child['vzBrCP']['children']:
-                        try:
-                            if subj['vzSubj']['attributes']['name'] == self.name:
-                                for filt in subj['vzSubj']['children']:
-                                    if 'vzRsSubjFiltAtt' in filt:
-                                        filt_name = filt['vzRsSubjFiltAtt']['attributes']['tnVzFilterName']
-                                        if Filter in obj_dict:
-                                            all_filters = obj_dict[Filter]
-                                            if len(all_filters):
-                                                found = False
-                                                for specific_filter in all_filters:
-                                                    if specific_filter.name == filt_name and \
-                                                                    specific_filter.get_parent() == tenant:
-                                                        self.add_filter(specific_filter)
-                                                        found = True
-                                                if not found:
-                                                    for specific_filter in all_filters:
-                                                        if specific_filter.name == filt_name and \
-                                                                        specific_filter.get_parent().name == 'common':
-                                                            self.add_filter(specific_filter)
-                        except KeyError:
-                            pass
-
-        super(ContractSubject, self)._extract_relationships(data, obj_dict)
+        tenant = self.get_parent().get_parent()
+        for child in index.get_raw_children(self):
+            if 'vzRsSubjFiltAtt' in child:
+                filt_name = child['vzRsSubjFiltAtt']['attributes']['tnVzFilterName']
+                for specific_filter in index.find(Filter, tenant, filt_name):
+                    self.add_filter(specific_filter)
+
+        super(ContractSubject, self)._extract_relationships(index)
 
     @staticmethod
     def _get_parent_class():
@@ -3827,6 +3523,7 @@ class Taboo(BaseContract):
 
 class FilterEntry(BaseACIObject):
     """ FilterEntry :  roughly equivalent to vzEntry """
+    _child_key = None
 
     def __init__(self, name, parent, applyToFrag='0', arpOpc='0',
                  dFromPort='0', dToPort='0', etherT='0', prot='0',
@@ -4044,6 +3741,15 @@ class FilterEntry(BaseACIObject):
             return key_attrs(self) == key_attrs(other)
         return NotImplemented
 
+    __hash__ = BaseACIObject.__hash__
+
+    def _get_identity(self):
+        """
+        Get the key identifying the filter entries, matching their equality
+        """
+        return (self.applyToFrag, self.arpOpc, self.dFromPort, self.dToPort, self.etherT,
+                self.prot, self.sFromPort, self.sToPort, self.tcpRules, self.stateful)
+
 
 class BaseTerminal(BaseACIObject):
     """
@@ -4088,48 +3794,19 @@ class BaseTerminal(BaseACIObject):
         resp_json[apic_object_type]['children'] = filters
         return resp_json
 
-    def _extract_relationships(self, data, obj_dict):
+    def _extract_relationships(self, index):
         """
         Extracts and rebuild the relationships between the ContractSubject
         and Filter objects.
         """
-        contract_subject = self.get_parent()
-        contract = contract_subject.get_parent()
-        tenant = contract.get_parent()
-        for tenant_data in data:
-            if 'fvTenant' in tenant_data and tenant_data['fvTenant']['attributes']['name'] == tenant.name:
-                contract_data = tenant_data['fvTenant']['children']
-        if len(contract_data):
-            for child in contract_data:
-                if 'vzBrCP' in child and 'children' in child['vzBrCP'] and \
-                                child['vzBrCP']['attributes']['name']== contract.name:
-                    for subj in child['vzBrCP']['children']:
-                        if 'vzSubj' in subj and 'children' in subj['vzSubj']:
-                            for subj_child in subj['vzSubj']['children']:
-                                try:
-                                    if 'vzInTerm' in subj_child or 'vzOutTerm' in subj_child:
-                                        for filt in subj_child[self._get_terminal_code()]['children']:
-                                            if 'vzRsFiltAtt' in filt:
-
-                                                filt_name = filt['vzRsFiltAtt']['attributes']['tnVzFilterName']
-                                                if Filter in obj_dict:
-                                                    all_filters = obj_dict[Filter]
-                                                    if len(all_filters):
-                                                        found = False
-                                                        for specific_filter in all_filters:
-                                                            if specific_filter.name == filt_name and \
-                                                                            specific_filter.get_parent() == tenant:
-                                                                self.add_filter(specific_filter)
-                                                                found = True
-                                                        if not found:
-                                                            for specific_filter in all_filters:
-                                                                if specific_filter.name == filt_name and \
-                                                                        specific_filter.get_parent().name == 'common':
-                                                                    self.add_filter(specific_filter)
-                                except KeyError:
-                                    pass
-
-        super(BaseTerminal, self)._extract_relationships(data, obj_dict)
+        tenant = self.get_parent().get_parent().get_parent()
+        for child in index.get_raw_children(self):
+            if 'vzRsFiltAtt' in child:
+                filt_name = child['vzRsFiltAtt']['attributes']['tnVzFilterName']
+                for specific_filter in index.find(Filter, tenant, filt_name):
+                    self.add_filter(specific_filter)
+
+        super(BaseTerminal, self)._extract_relationships(index)
 
     def add_filter(self, filter_obj):
         """
@@ -4491,14 +4168,16 @@ class Endpoint(BaseACIObject):
             self.mac = str(attributes.get('mac'))
         if 'ip' in attributes:
             self.ip = str(attributes.get('ip'))
+        # The encapsulation, life cycle and type are shared by many
+        # endpoints, so their strings are interned
         if 'encap' in attributes:
-            self.encap = str(attributes.get('encap'))
+            self.encap = intern(str(attributes.get('encap')))
         if 'lcC' in attributes:
-            life_cycle = str(attributes.get('lcC'))
+            life_cycle = intern(str(attributes.get('lcC')))
         if life_cycle is not '':
             self.life_cycle = life_cycle
         if 'type' in attributes:
-            self.type = str(attributes.get('type'))
+            self.type = intern(str(attributes.get('type')))
 
     def _populate_interface_info(self, working_data):
         for item in working_data[0]:
@@ -4571,7 +4250,7 @@ class Endpoint(BaseACIObject):
                                 class_map = cls._get_toolkit_to_apic_classmap()
                                 if apic_class not in class_map:
                                     if apic_class == 'tagInst':
-                                        obj._tags.append(Tag(str(child[apic_class]['attributes']['name'])))
+                                        obj.get_tags().append(Tag(str(child[apic_class]['attributes']['name'])))
                                     continue
                                 else:
                                     class_map[apic_class].get_deep(full_data=full_data,
@@ -4583,8 +4262,8 @@ class Endpoint(BaseACIObject):
         return obj
 
     @classmethod
-    def get_event(cls, session, with_relations=True):
-        urls = cls._get_subscription_urls()
+    def get_event(cls, session, with_relations=True, query_filter=None, dn_scope=None):
+        urls = cls._get_subscription_urls(query_filter, dn_scope)
         for url in urls:
             if not session.has_events(url):
                 continue
@@ -4647,9 +4326,7 @@ class Endpoint(BaseACIObject):
                                   '&rsp-subtree=full' % (apic_endpoint_class,
                                                          apic_endpoint_class,
                                                          endpoint_name))
-        ret = session.get(endpoint_query_url)
-        ep_data = ret.json()['imdata']
-        for ep in ep_data:
+        for ep in session.get_paged(endpoint_query_url):
             if ep[apic_endpoint_class]['attributes']['lcC'] == 'static':
                 continue
             if 'children' in ep[apic_endpoint_class]:
@@ -4669,7 +4346,7 @@ class Endpoint(BaseACIObject):
             endpoint = Endpoint(str(ep['name']), parent=epg)
             endpoint.mac = str(ep['mac'])
             endpoint.ip = str(ep['ip'])
-            endpoint.encap = str(ep['encap'])
+            endpoint.encap = intern(str(ep['encap']))
             endpoint.timestamp = str(ep['modTs'])
             for child in children:
                 if endpoint_path in child:
@@ -4701,10 +4378,7 @@ class Endpoint(BaseACIObject):
             raise TypeError('An instance of Session class is required')
 
         # Get all of the interfaces
-        interface_query_url = ('/api/node/class/fabricPathEp.json?'
-                               'query-target=self')
-        ret = session.get(interface_query_url)
-        interfaces = ret.json()['imdata']
+        interfaces = list(session.iter_class('fabricPathEp'))
 
         endpoints = []
         endpoints = Endpoint._get(session, endpoint_name, interfaces,
@@ -4714,6 +4388,17 @@ class Endpoint(BaseACIObject):
 
         return endpoints
 
+    @staticmethod
+    def get_async(session, endpoint_name=None):
+        """Gets all of the endpoints connected to the fabric from the APIC in the background
+        :param endpoint_name:
+        :param session: Session instance used to communicate with the APIC. Assumed to be logged in
+        :returns: RequestFuture instance whose result is the list of Endpoints
+        """
+        if not isinstance(session, Session):
+            raise TypeError('An instance of Session class is required')
+        return session.submit(Endpoint.get, session, endpoint_name)
+
     @classmethod
     def get_all_by_epg(cls, session, tenant_name, app_name, epg_name, with_interface_attachments=True):
         """
@@ -4871,8 +4556,8 @@ class IPEndpoint(BaseACIObject):
             self.ip = str(attributes.get('addr'))
 
     @classmethod
-    def get_event(cls, session):
-        urls = cls._get_subscription_urls()
+    def get_event(cls, session, query_filter=None, dn_scope=None):
+        urls = cls._get_subscription_urls(query_filter, dn_scope)
         for url in urls:
             if not session.has_events(url):
                 continue
@@ -4904,10 +4589,7 @@ class IPEndpoint(BaseACIObject):
         :return: list of Endpoints
         """
         # Get all of the Endpoints
-        endpoint_query_url = ('/api/node/class/%s.json?query-target=self'
-                              '&rsp-subtree=full' % apic_endpoint_class)
-        ret = session.get(endpoint_query_url)
-        ep_data = ret.json()['imdata']
+        ep_data = session.iter_class(apic_endpoint_class, {'rsp-subtree': 'full'})
         for ep in ep_data:
             ep = ep[apic_endpoint_class]['attributes']
             ep_dn = str(ep['dn'])
@@ -6625,6 +6307,7 @@ class LogicalModel(BaseACIObject):
         :param include_concrete: True or False. Default is False
         :param deep: True or False.  Default is False.
         """
+        self._lazy_population = None
         for child_class in self._get_children_classes():
             if deep:
                 child_class.get_deep(self._session, parent=self)
@@ -6647,9 +6330,14 @@ class LogicalModel(BaseACIObject):
 def build_object_dictionary(objs):
     """
     Will build a dictionary indexed by object class that contains all the objects of that class
+
+    Deprecated: the relations of Tenant.get_deep are resolved with a RelationIndex.
+
     :param objs:
     :return:
     """
+    warnings.warn('build_object_dictionary is deprecated, use RelationIndex instead',
+                  DeprecationWarning, stacklevel=2)
     result = {}
     for obj in objs:
         obj_class = obj.__class__
@@ -6664,3 +6352,90 @@ def build_object_dictionary(objs):
                 result[child_class] = set()
             result[child_class] = result[child_class] | children_result[child_class]
     return result
+
+
+class RelationIndex(object):
+    """
+    Index of the data collected by Tenant.get_deep and of the objects built
+    from it, used to resolve the relations between the objects.  The raw
+    children of every object are indexed by object, which is the same as
+    indexing them by dn, and the objects by class, tenant name and name so
+    that every relation is resolved with dictionary lookups.
+    """
+    def __init__(self, data, objs):
+        """
+        :param data: List of the JSON dictionaries of the tenants
+        :param objs: List of the Tenant objects built from the data
+        """
+        self._raw_children = {}
+        self._objects = {}
+        tenant_data = {}
+        for item in data:
+            if 'fvTenant' in item:
+                tenant_data[item['fvTenant']['attributes']['name']] = item['fvTenant']
+        for tenant in objs:
+            self._index_objects(tenant, tenant.name)
+            if tenant.name in tenant_data:
+                self._index_raw_children(tenant, tenant_data[tenant.name])
+
+    def _index_objects(self, obj, tenant_name):
+        """
+        Index an object and its descendants by class, tenant name and name
+        """
+        self._objects.setdefault((obj.__class__, tenant_name, obj.name), []).append(obj)
+        for child in obj.get_children():
+            self._index_objects(child, tenant_name)
+
+    def _index_raw_children(self, obj, obj_data):
+        """
+        Index the raw children of an object and of its descendants
+        """
+        raw_children = obj_data.get('children', [])
+        self._raw_children[id(obj)] = raw_children
+        class_map = obj._get_toolkit_to_apic_classmap()
+        for child_data in raw_children:
+            for apic_class in child_data:
+                if apic_class not in class_map:
+                    continue
+                name = str(child_data[apic_class]['attributes'].get('name', ''))
+                child = obj.get_child(class_map[apic_class], name)
+                if child is not None and id(child) not in self._raw_children:
+                    self._index_raw_children(child, child_data[apic_class])
+
+    def get_raw_children(self, obj):
+        """
+        Get the JSON of the children of an object.
+
+        :param obj: Object built from the indexed data
+        :returns: List of the JSON dictionaries of the children
+        """
+        return self._raw_children.get(id(obj), [])
+
+    def find_in_tenant(self, toolkit_class, tenant_name, name):
+        """
+        Find the objects of a class with a name in a tenant.
+
+        :param toolkit_class: acitoolkit class of the objects
+        :param tenant_name: String containing the name of the tenant
+        :param name: String containing the name of the objects
+        :returns: List of the objects found
+        """
+        return self._objects.get((toolkit_class, tenant_name, name), [])
+
+    def find(self, toolkit_class, tenant, name, in_common=True):
+        """
+        Find the objects that a relation of an object of a tenant refers to.
+        Relations that are not resolved in the tenant are resolved in the
+        tenant common.
+
+        :param toolkit_class: acitoolkit class of the objects
+        :param tenant: Tenant instance of the object with the relation
+        :param name: String containing the name of the objects
+        :param in_common: True to look in the tenant common when the\
+                          objects are not found in the tenant
+        :returns: List of the objects found
+        """
+        objs = self.find_in_tenant(toolkit_class, tenant.name, name)
+        if not objs and in_common:
+            objs = self.find_in_tenant(toolkit_class, 'common', name)
+        return objs
@@ -53,6 +53,10 @@ class Credentials(object):
     interactive prompt.  Another example is using the command line argument to
     override the URL specified in credentials.py to temporarily connect to a
     different APIC.
+
+    Setting the APIC_TOKEN_CACHE environment variable to a file path lets
+    the sessions reuse the login token of a previous run (see
+    LoginTokenCache).
     """
     def __init__(self, qualifier='apic', description=''):
         def set_default(key):
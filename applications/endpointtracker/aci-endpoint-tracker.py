@@ -111,7 +111,14 @@ def tracker(args):
     :return: None
     """
     # Login to APIC
-    session = aci.Session(args.url, args.login, args.password)
+    coalescer = None
+    if args.coalesce:
+        coalescer = aci.EventCoalescer(window=args.coalesce)
+    queue_limit = None
+    if args.max_events:
+        queue_limit = aci.EventQueueLimit(max_events=args.max_events, policy='collapse')
+    session = aci.Session(args.url, args.login, args.password, coalescer=coalescer,
+                          queue_limit=queue_limit)
     resp = session.login()
     if not resp.ok:
         print '%% Could not login to APIC'
@@ -161,7 +168,7 @@ def tracker(args):
     sys.stdout.write("Starting subscribe to apic events")
     aci.Endpoint.subscribe(session)
     while True:
-        if aci.Endpoint.has_events(session):
+        if aci.Endpoint.wait_for_events(session, timeout=1):
             ep = aci.Endpoint.get_event(session)
             try:
                 epg = ep.get_parent()
@@ -255,6 +262,13 @@ def main():
                    ' all of the Endpoints in a MySQL database.')
     creds = aci.Credentials(qualifier=('apic', 'mysql', 'daemon'),
                             description=description)
+    creds.add_argument('--coalesce', type=float, default=0,
+                       help='Seconds over which the events of an endpoint are merged '
+                            'before updating the database (default is 0, no merging)')
+    creds.add_argument('--max-events', type=int, default=0,
+                       help='Maximum number of endpoint events kept while the database '
+                            'is unavailable, merging the events of the same endpoint '
+                            '(default is 0, no limit)')
     args = creds.get()
 
     if args.daemon or args.kill or args.restart:
@@ -152,9 +152,11 @@ class EventMonitor(threading.Thread):
             cls.subscribe(session)
             evnt_logger.info('Subscribed to %s', cls.__name__)
 
+        urls = [url for cls in selected_classes for url in cls._get_subscription_urls()]
         TableRow = namedtuple('TableRow', ('cls', 'name', 'timestamp', 'json', 'url'))
         while True:
             try:
+                session.wait_for_events(urls, timeout=1)
                 for cls in selected_classes:
                     if cls.has_events(session):
                         event_object = cls.get_event(session)
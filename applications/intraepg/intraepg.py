@@ -651,7 +651,7 @@ class EndpointMonitor(threading.Thread):
         IPEndpoint.subscribe(self.session)
 
         while not self._exit:
-            if IPEndpoint.has_events(self.session):
+            if IPEndpoint.wait_for_events(self.session, timeout=1):
                 try:
                     self.handle_endpoint_event()
                 except ConnectionError:
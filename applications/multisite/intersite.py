@@ -529,7 +529,7 @@ class MultisiteMonitor(threading.Thread):
         IPEndpoint.subscribe(self._session)
 
         while not self._exit:
-            if IPEndpoint.has_events(self._session):
+            if IPEndpoint.wait_for_events(self._session, timeout=1):
                 try:
                     self.handle_endpoint_event()
                 except ConnectionError:
@@ -31,6 +31,7 @@
      It runs as a standalone tool in addition, it can be imported as a library
      such as when used by the GUI frontend.
 """
+from collections import deque
 import os
 import git
 import time
@@ -41,6 +42,7 @@ import sys
 
 import acitoolkit as ACI
 from requests import Timeout, ConnectionError
+from requests.exceptions import HTTPError
 try:
     from paramiko import SSHClient, AutoAddPolicy
 except ImportError:
@@ -239,11 +241,21 @@ class ConfigDB(object):
 
         :returns: JSON dictionary of returned data
         """
-        ret = self.session.get(url)
-        ret._content = ret.content.replace('\n', '')
-        ret._content = ret.content.replace("\\\'", "'")
-        data = ret.json()
-        return data
+        try:
+            imdata = list(self.session.get_stream(url, strip_newlines=True))
+        except HTTPError as e:
+            # Save the error returned by the APIC
+            return e.response.json()
+        return self._get_data_from_imdata(imdata)
+
+    @staticmethod
+    def _get_data_from_imdata(imdata):
+        """
+        Internal function to build the JSON data of a snapshot file
+
+        :returns: JSON dictionary of returned data
+        """
+        return {'totalCount': str(len(imdata)), 'imdata': imdata}
 
     def _snapshot(self, query_url, filename):
         """
@@ -254,8 +266,46 @@ class ConfigDB(object):
         :param filename: string containing the filename where the
                          configuration should be written
         """
-        filename = os.path.join(self.repo_dir, filename)
         data = self._get_from_apic(query_url)
+        self._write_snapshot(filename, data)
+
+    def _snapshot_many(self, snapshots, max_workers=8):
+        """
+        Internal function to perform several snapshot files.  The
+        configuration is collected from the APIC in parallel, at most
+        max_workers snapshots at a time, and each snapshot is written as
+        soon as the snapshots before it are written.
+
+        :param snapshots: list of (query_url, filename) tuples
+        :param max_workers: integer containing the maximum number of
+                            snapshots that are collected at the same time
+        """
+        pending = deque()
+        for query_url, filename in snapshots:
+            if len(pending) >= max_workers:
+                self._write_pending_snapshot(pending)
+            pending.append((filename, self.session.submit(self._get_from_apic, query_url)))
+        while pending:
+            self._write_pending_snapshot(pending)
+
+    def _write_pending_snapshot(self, pending):
+        """
+        Internal function to write the oldest snapshot being collected
+
+        :param pending: deque of (filename, RequestFuture) tuples
+        """
+        filename, future = pending.popleft()
+        self._write_snapshot(filename, future.result())
+
+    def _write_snapshot(self, filename, data):
+        """
+        Internal function to write a single snapshot file
+
+        :param filename: string containing the filename where the
+                         configuration should be written
+        :param data: JSON dictionary containing the configuration
+        """
+        filename = os.path.join(self.repo_dir, filename)
 
         # sort the JSON format if the filename is a domain
         if filename.endswith('domain.json'):
@@ -324,12 +374,13 @@ class ConfigDB(object):
         """
         tag_name = time.strftime("%Y-%m-%d_%H.%M.%S", time.localtime())
 
+        snapshots = []
         # Save each tenants config
         tenants = ACI.Tenant.get(self.session)
         for tenant in tenants:
             filename = 'tenant-%s.json' % tenant.name
             url = self._get_url_for_file(filename)
-            self._snapshot(url, filename)
+            snapshots.append((url, filename))
 
         # Save each nodes config
         nodes = ACI.Node.get(self.session)
@@ -337,7 +388,7 @@ class ConfigDB(object):
             filename = 'node-%s.json' % node.name
             url_prefix, url_suff = self._get_url_for_file(filename)
             url = '%s%s%s' % (url_prefix, node.dn, url_suff)
-            self._snapshot(url, filename)
+            snapshots.append((url, filename))
 
         # Save the rest of the config
         filenames = ['infra.json', 'fabric.json', 'phys-domain.json',
@@ -345,7 +396,8 @@ class ConfigDB(object):
                      'topology.json', 'comp.json']
         for filename in filenames:
             url = self._get_url_for_file(filename)
-            self._snapshot(url, filename)
+            snapshots.append((url, filename))
+        self._snapshot_many(snapshots)
 
         # Commit the files and tag with the timestamp
         self.repo.index.commit(tag_name)
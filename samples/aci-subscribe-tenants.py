@@ -66,7 +66,7 @@ def main():
     aci.Tenant.subscribe(session)
 
     while True:
-        if aci.Tenant.has_events(session):
+        if aci.Tenant.wait_for_events(session, timeout=1):
             tenant = aci.Tenant.get_event(session)
             if tenant.is_deleted():
                 print('Tenant', tenant.name, 'has been deleted.')
@@ -0,0 +1,1657 @@
+################################################################################
+#                                  _    ____ ___                               #
+#                                 / \  / ___|_ _|                              #
+#                                / _ \| |    | |                               #
+#                               / ___ \ |___ | |                               #
+#                         _____/_/   \_\____|___|_ _                           #
+#                        |_   _|__   ___ | | | _(_) |_                         #
+#                          | |/ _ \ / _ \| | |/ / | __|                        #
+#                          | | (_) | (_) | |   <| | |_                         #
+#                          |_|\___/ \___/|_|_|\_\_|\__|                        #
+#                                                                              #
+################################################################################
+#                                                                              #
+# Copyright (c) 2015 Cisco Systems                                             #
+# All Rights Reserved.                                                         #
+#                                                                              #
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may   #
+#    not use this file except in compliance with the License. You may obtain   #
+#    a copy of the License at                                                  #
+#                                                                              #
+#         http://www.apache.org/licenses/LICENSE-2.0                           #
+#                                                                              #
+#    Unless required by applicable law or agreed to in writing, software       #
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT #
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the  #
+#    License for the specific language governing permissions and limitations   #
+#    under the License.                                                        #
+#                                                                              #
+################################################################################
+"""acisession.py Test module
+"""
+from acitoolkit import acisession
+from acitoolkit.acisession import (CircuitOpenError, ClusterSession, EventCoalescer, EventJournal, EventQueueLimit,
+                                   ImdataDecoder, LoginTokenCache, RateLimiter, RequestExecutor, RequestStats,
+                                   ResponseCache, Session, SingleFlight, Subscriber)
+import base64
+import heapq
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import requests
+from requests.exceptions import ConnectionError
+from six.moves.queue import Queue
+try:
+    from OpenSSL import crypto
+except ImportError:
+    crypto = None
+
+
+def make_response(data, status_code=200):
+    """
+    Build a requests Response instance containing the supplied JSON data
+    """
+    resp = requests.Response()
+    resp.status_code = status_code
+    resp._content = json.dumps(data).encode()
+    resp._content_consumed = True
+    return resp
+
+
+class FakeRequestsSession(object):
+    """
+    Stand-in for requests.Session that serves canned responses from a
+    handler function and records the URLs that were requested.
+    """
+    def __init__(self, handler):
+        self.handler = handler
+        self.urls = []
+        self.cookies = []
+
+    def get(self, url, **kwargs):
+        self.urls.append(url)
+        self.cookies.append(kwargs.get('cookies'))
+        return self.handler(url)
+
+    def post(self, url, data=None, **kwargs):
+        self.urls.append(url)
+        self.cookies.append(kwargs.get('cookies'))
+        return self.handler(url)
+
+    def close(self):
+        pass
+
+
+def get_offline_session(handler, **kwargs):
+    """
+    Create a Session that does not communicate with an APIC
+    """
+    session = Session('http://1.2.3.4', 'admin', 'password', subscription_enabled=False, **kwargs)
+    session.session = FakeRequestsSession(handler)
+    return session
+
+
+class TestPagedGet(unittest.TestCase):
+    """
+    Test the paged query support of the Session class
+    """
+    @staticmethod
+    def _paged_handler(total):
+        """
+        Return a handler that emulates the APIC paging of a class holding
+        ``total`` fvCEp objects
+        """
+        def handler(url):
+            query = dict(param.split('=', 1) for param in url.split('?')[1].split('&'))
+            page = int(query['page'])
+            page_size = int(query['page-size'])
+            start = page * page_size
+            end = min(start + page_size, total)
+            imdata = [{'fvCEp': {'attributes': {'dn': 'cep-%s' % i}}} for i in range(start, end)]
+            return make_response({'totalCount': str(total), 'imdata': imdata})
+        return handler
+
+    def test_get_paged_all_pages(self):
+        """
+        Test that every page is collected and nothing is repeated
+        """
+        session = get_offline_session(self._paged_handler(25))
+        items = list(session.get_paged('/api/node/class/fvCEp.json', page_size=10))
+        self.assertEqual(len(items), 25)
+        self.assertEqual(len(session.session.urls), 3)
+        dns = [item['fvCEp']['attributes']['dn'] for item in items]
+        self.assertEqual(len(set(dns)), 25)
+
+    def test_get_paged_exact_multiple(self):
+        """
+        Test that an extra empty page is not requested when totalCount is
+        a multiple of the page size
+        """
+        session = get_offline_session(self._paged_handler(20))
+        items = list(session.get_paged('/api/node/class/fvCEp.json', page_size=10))
+        self.assertEqual(len(items), 20)
+        self.assertEqual(len(session.session.urls), 2)
+
+    def test_get_paged_order_by(self):
+        """
+        Test that the class dn is used for ordering
+        """
+        session = get_offline_session(self._paged_handler(1))
+        list(session.get_paged('/api/mo/uni/tn-t1.json?query-target=subtree&target-subtree-class=fvCEp'))
+        self.assertIn('order-by=fvCEp.dn', session.session.urls[0])
+        self.assertIn('page=0', session.session.urls[0])
+
+    def test_get_paged_node_class(self):
+        """
+        Test that the class of a node class query is used for ordering
+        """
+        session = get_offline_session(self._paged_handler(1))
+        list(session.get_paged('/api/node/class/topology/pod-1/node-101/l1PhysIf.json'))
+        self.assertIn('order-by=l1PhysIf.dn&', session.session.urls[0])
+
+    def test_get_paged_url_options(self):
+        """
+        Test that the page-size and order-by options of the URL are kept
+        """
+        session = get_offline_session(self._paged_handler(25))
+        items = list(session.get_paged('/api/node/class/fvCEp.json?page-size=10&order-by=fvCEp.mac'))
+        self.assertEqual(len(items), 25)
+        self.assertEqual(len(session.session.urls), 3)
+        for url in session.session.urls:
+            self.assertEqual(url.count('page-size='), 1)
+            self.assertEqual(url.count('order-by='), 1)
+            self.assertIn('order-by=fvCEp.mac', url)
+
+    def test_get_paged_error(self):
+        """
+        Test that an error response of any page raises an HTTPError
+        """
+        session = get_offline_session(lambda url: make_response({'imdata': []}, status_code=400))
+        self.assertRaises(requests.exceptions.HTTPError, list, session.get_paged('/api/node/class/fvCEp.json'))
+        paged_handler = self._paged_handler(25)
+
+        def handler(url):
+            if 'page=1' in url:
+                return make_response({'imdata': []}, status_code=500)
+            return paged_handler(url)
+        session = get_offline_session(handler)
+        items = []
+        with self.assertRaises(requests.exceptions.HTTPError) as context:
+            for item in session.get_paged('/api/node/class/fvCEp.json', page_size=10):
+                items.append(item)
+        self.assertEqual(len(items), 10)
+        self.assertEqual(context.exception.response.status_code, 500)
+
+    def test_iter_class(self):
+        """
+        Test the class query URL built by iter_class
+        """
+        session = get_offline_session(self._paged_handler(3))
+        items = list(session.iter_class('fvCEp', {'rsp-subtree': 'full'}))
+        self.assertEqual(len(items), 3)
+        url = session.session.urls[0]
+        self.assertTrue(url.startswith('http://1.2.3.4/api/node/class/fvCEp.json?'))
+        self.assertIn('rsp-subtree=full', url)
+        self.assertIn('query-target=self', url)
+
+
+class TestGetMany(unittest.TestCase):
+    """
+    Test the parallel get support of the Session class
+    """
+    def test_get_many_order(self):
+        """
+        Test that the responses are returned in the order of the urls
+        """
+        session = get_offline_session(lambda url: make_response({'imdata': [{'url': url}]}))
+        urls = ['/api/mo/uni/tn-%s.json' % i for i in range(20)]
+        responses = session.get_many(urls, max_workers=4)
+        self.assertEqual(len(responses), 20)
+        for url, resp in zip(urls, responses):
+            self.assertTrue(resp.ok)
+            self.assertEqual(resp.json()['imdata'][0]['url'], session.api + url)
+
+    def test_get_many_empty(self):
+        """
+        Test get_many with no urls
+        """
+        session = get_offline_session(lambda url: make_response({'imdata': []}))
+        self.assertEqual(session.get_many([]), [])
+
+    def test_get_many_error(self):
+        """
+        Test that any exception raised by a call is raised in the calling
+        thread once all of the calls have completed
+        """
+        requested = []
+
+        def handler(url):
+            requested.append(url)
+            if url.endswith('tn-3.json') or url.endswith('tn-7.json'):
+                raise requests.exceptions.ChunkedEncodingError(url)
+            return make_response({'imdata': []})
+        session = get_offline_session(handler)
+        urls = ['/api/mo/uni/tn-%s.json' % i for i in range(10)]
+        with self.assertRaises(requests.exceptions.ChunkedEncodingError) as context:
+            session.get_many(urls, max_workers=4)
+        self.assertEqual(str(context.exception), session.api + urls[3])
+        self.assertEqual(len(requested), 10)
+
+    def test_get_many_single_relogin(self):
+        """
+        Test that concurrent requests refused with a 403 share a single relogin
+        """
+        session = get_offline_session(None)
+        session.token = 'expired'
+        logins = []
+
+        def handler(url):
+            if session.token == 'expired':
+                return make_response({'imdata': []}, status_code=403)
+            return make_response({'imdata': []})
+
+        def send_login(timeout=None):
+            logins.append(timeout)
+            session.token = 'refreshed'
+
+        session.session.handler = handler
+        session._send_login = send_login
+        responses = session.get_many(['/api/mo/uni/tn-%s.json' % i for i in range(16)], max_workers=8)
+        self.assertTrue(all(resp.ok for resp in responses))
+        self.assertEqual(len(logins), 1)
+
+
+class TestRequestExecutor(unittest.TestCase):
+    """
+    Test the background requests of the Session class
+    """
+    def test_get_async(self):
+        """
+        Test that get_async returns the response through the future
+        """
+        session = get_offline_session(lambda url: make_response({'imdata': [{'url': url}]}))
+        session._executor = RequestExecutor(max_workers=2)
+        futures = [session.get_async('/api/mo/uni/tn-%s.json' % i) for i in range(5)]
+        for i, future in enumerate(futures):
+            resp = future.result(timeout=5)
+            self.assertTrue(future.done())
+            self.assertEqual(resp.json()['imdata'][0]['url'], session.api + '/api/mo/uni/tn-%s.json' % i)
+        session._executor.shutdown()
+
+    def test_exception(self):
+        """
+        Test that an exception raised in the background is raised by result
+        """
+        executor = RequestExecutor(max_workers=1)
+
+        def fail():
+            raise ValueError('failed')
+
+        future = executor.submit(fail)
+        self.assertRaises(ValueError, future.result, 5)
+        self.assertTrue(isinstance(future.exception(), ValueError))
+        executor.shutdown()
+
+    def test_done_callback(self):
+        """
+        Test that the done callbacks are invoked with the future
+        """
+        executor = RequestExecutor(max_workers=1)
+        results = []
+        future = executor.submit(lambda x: x * 2, 21)
+        future.result(timeout=5)
+        future.add_done_callback(lambda f: results.append(f.result()))
+        self.assertEqual(results, [42])
+        executor.shutdown()
+
+
+class TestResponseCache(unittest.TestCase):
+    """
+    Test the response cache of the Session class
+    """
+    @staticmethod
+    def _tenant_handler(url):
+        data = {'imdata': [{'fvTenant': {'attributes': {'dn': 'uni/tn-t1', 'name': 't1'}}}]}
+        return make_response(data)
+
+    def _get_session(self, cache):
+        session = get_offline_session(self._tenant_handler)
+        session._cache = cache
+        return session
+
+    def test_cache_hit(self):
+        """
+        Test that equivalent queries are served from the cache
+        """
+        session = self._get_session(ResponseCache())
+        session.get('/api/class/fvTenant.json?query-target=self&rsp-subtree=no')
+        resp = session.get('/api/class/fvTenant.json?rsp-subtree=no&query-target=self')
+        self.assertEqual(resp.json()['imdata'][0]['fvTenant']['attributes']['name'], 't1')
+        self.assertEqual(len(session.session.urls), 1)
+        self.assertEqual(session._cache.hits, 1)
+
+    def test_cache_copy(self):
+        """
+        Test that a caller changing its response does not change the cached one
+        """
+        session = self._get_session(ResponseCache())
+        resp = session.get('/api/class/fvTenant.json')
+        resp._content = resp._content.replace(b't1', b't2')
+        cached = session.get('/api/class/fvTenant.json')
+        cached._content = cached._content.replace(b't1', b't3')
+        resp = session.get('/api/class/fvTenant.json')
+        self.assertEqual(resp.json()['imdata'][0]['fvTenant']['attributes']['name'], 't1')
+        self.assertEqual(session._cache.hits, 2)
+
+    def test_cache_ttl(self):
+        """
+        Test that expired entries are requested again
+        """
+        session = self._get_session(ResponseCache(ttl=-1))
+        session.get('/api/class/fvTenant.json')
+        session.get('/api/class/fvTenant.json')
+        self.assertEqual(len(session.session.urls), 2)
+
+    def test_cache_not_cacheable(self):
+        """
+        Test that subscriptions are not cached
+        """
+        session = self._get_session(ResponseCache())
+        session.get('/api/class/fvTenant.json?subscription=yes')
+        session.get('/api/class/fvTenant.json?subscription=yes')
+        self.assertEqual(len(session.session.urls), 2)
+
+    def test_cache_bounds(self):
+        """
+        Test that the least recently used entries are evicted
+        """
+        cache = ResponseCache(max_entries=2)
+        session = self._get_session(cache)
+        session.get('/api/mo/uni/tn-1.json')
+        session.get('/api/mo/uni/tn-2.json')
+        session.get('/api/mo/uni/tn-1.json')
+        session.get('/api/mo/uni/tn-3.json')
+        self.assertIsNotNone(cache.get('/api/mo/uni/tn-1.json'))
+        self.assertIsNone(cache.get('/api/mo/uni/tn-2.json'))
+        self.assertEqual(cache.evictions, 1)
+
+        resp = self._tenant_handler('')
+        small_cache = ResponseCache(max_bytes=len(resp.content) - 1)
+        small_cache.put('/api/mo/uni/tn-1.json', resp)
+        self.assertIsNone(small_cache.get('/api/mo/uni/tn-1.json'))
+
+    def test_cache_invalidate(self):
+        """
+        Test invalidation by class and by dn
+        """
+        cache = ResponseCache()
+        resp = self._tenant_handler('')
+        cache.put('/api/class/fvTenant.json', resp)
+        cache.put('/api/mo/uni/tn-t1/BD-bd1.json', resp)
+        cache.put('/api/mo/uni/tn-t2.json?rsp-subtree=full', make_response({'imdata': []}))
+        cache.invalidate('fvBD', 'uni/tn-t1/BD-bd1/subnet-[10.0.0.1/24]')
+        self.assertIsNone(cache.get('/api/mo/uni/tn-t1/BD-bd1.json'))
+        self.assertIsNotNone(cache.get('/api/class/fvTenant.json'))
+        self.assertIsNotNone(cache.get('/api/mo/uni/tn-t2.json?rsp-subtree=full'))
+        cache.invalidate('fvTenant', 'uni/tn-t2')
+        self.assertIsNone(cache.get('/api/class/fvTenant.json'))
+        self.assertIsNone(cache.get('/api/mo/uni/tn-t2.json?rsp-subtree=full'))
+
+    def test_cache_event_invalidate(self):
+        """
+        Test that a subscription event invalidates the covered entries
+        """
+        session = self._get_session(ResponseCache())
+        session.get('/api/class/fvTenant.json')
+        subscriber = Subscriber(session)
+        event = {'subscriptionId': ['1'],
+                 'imdata': [{'fvTenant': {'attributes': {'dn': 'uni/tn-t1', 'status': 'modified'}}}]}
+        subscriber._invalidate_cache(json.dumps(event))
+        session.get('/api/class/fvTenant.json')
+        self.assertEqual(len(session.session.urls), 2)
+
+    def test_cache_cleared_on_push(self):
+        """
+        Test that pushing configuration clears the cache
+        """
+        session = self._get_session(ResponseCache())
+        session.get('/api/class/fvTenant.json')
+        session.push_to_apic('/api/mo/uni.json', {'fvTenant': {'attributes': {'name': 't1'}}})
+        session.get('/api/class/fvTenant.json')
+        self.assertEqual(len(session.session.urls), 3)
+
+
+class TestPushBatcher(unittest.TestCase):
+    """
+    Test the batched configuration push of the Session class
+    """
+    @staticmethod
+    def _get_session(status_code=200):
+        session = get_offline_session(lambda url: make_response({'imdata': []}, status_code=status_code))
+        session.posted = []
+        original_post = session.session.post
+
+        def post(url, data=None, **kwargs):
+            session.posted.append(json.loads(data))
+            return original_post(url, data=data, **kwargs)
+
+        session.session.post = post
+        return session
+
+    @staticmethod
+    def _tenant_json(tenant_name, bd_name, status=None):
+        attributes = {'name': tenant_name}
+        if status is not None:
+            attributes['status'] = status
+        return {'fvTenant': {'attributes': attributes,
+                             'children': [{'fvBD': {'attributes': {'name': bd_name},
+                                                    'children': []}}]}}
+
+    def test_batch_merge(self):
+        """
+        Test that payloads for the same tenant are merged in a single POST
+        """
+        session = self._get_session()
+        with session.batch() as batcher:
+            for i in range(10):
+                resp = session.push_to_apic('/api/mo/uni.json', self._tenant_json('t1', 'bd%s' % i))
+                self.assertEqual(resp.status_code, 202)
+            self.assertEqual(session.posted, [])
+        self.assertEqual(len(session.posted), 1)
+        tenant = session.posted[0]['fvTenant']
+        self.assertEqual(len(tenant['children']), 10)
+        self.assertEqual(batcher.num_pushed, 10)
+        self.assertEqual(batcher.num_posts, 1)
+
+    def test_batch_multiple_roots(self):
+        """
+        Test that several tenants are combined under polUni
+        """
+        session = self._get_session()
+        with session.batch():
+            session.push_to_apic('/api/mo/uni.json', self._tenant_json('t1', 'bd1'))
+            session.push_to_apic('/api/mo/uni.json', self._tenant_json('t2', 'bd1'))
+            session.push_to_apic('/api/mo/uni.json', self._tenant_json('t1', 'bd1'))
+        self.assertEqual(len(session.posted), 1)
+        children = session.posted[0]['polUni']['children']
+        self.assertEqual([child['fvTenant']['attributes']['name'] for child in children], ['t1', 't2'])
+        self.assertEqual(len(children[0]['fvTenant']['children']), 1)
+
+    def test_batch_status(self):
+        """
+        Test that the latest status of an object is kept
+        """
+        session = self._get_session()
+        with session.batch():
+            session.push_to_apic('/api/mo/uni.json', self._tenant_json('t1', 'bd1', status='deleted'))
+            session.push_to_apic('/api/mo/uni.json', self._tenant_json('t1', 'bd1'))
+        self.assertNotIn('status', session.posted[0]['fvTenant']['attributes'])
+
+    def test_batch_max_objects(self):
+        """
+        Test that the batch is sent when the size threshold is reached
+        """
+        session = self._get_session()
+        with session.batch(max_objects=2):
+            for i in range(5):
+                session.push_to_apic('/api/mo/uni.json', self._tenant_json('t%s' % i, 'bd1'))
+            self.assertEqual(len(session.posted), 2)
+        self.assertEqual(len(session.posted), 3)
+
+    def test_batch_errors(self):
+        """
+        Test that a refused merged POST is retried per object and reported
+        """
+        session = self._get_session(status_code=400)
+        with session.batch() as batcher:
+            session.push_to_apic('/api/mo/uni.json', self._tenant_json('t1', 'bd1'))
+            session.push_to_apic('/api/mo/uni.json', self._tenant_json('t2', 'bd1'))
+        self.assertEqual(len(session.posted), 3)
+        self.assertEqual(len(batcher.errors), 2)
+        self.assertEqual(batcher.errors[0][1], self._tenant_json('t1', 'bd1'))
+
+    def test_batch_connection_error(self):
+        """
+        Test that the payloads of a POST that failed in the timer thread are reported
+        """
+        def handler(url):
+            raise requests.exceptions.ConnectionError('refused')
+        session = get_offline_session(handler)
+        with session.batch(max_delay=0.01) as batcher:
+            session.push_to_apic('/api/mo/uni.json', self._tenant_json('t1', 'bd1'))
+            session.push_to_apic('/api/mo/uni.json', self._tenant_json('t2', 'bd1'))
+            for i in range(50):
+                if batcher.num_pushed:
+                    break
+                time.sleep(0.1)
+        self.assertEqual(batcher.num_pushed, 2)
+        self.assertEqual(batcher.num_posts, 1)
+        self.assertEqual([data for url, data, resp in batcher.errors],
+                         [self._tenant_json('t1', 'bd1'), self._tenant_json('t2', 'bd1')])
+        self.assertTrue(all(isinstance(resp, requests.exceptions.ConnectionError)
+                            for url, data, resp in batcher.errors))
+
+    def test_batch_add_while_sending(self):
+        """
+        Test that payloads can be queued while a batch is being sent
+        """
+        added = []
+
+        def handler(url):
+            if added:
+                return make_response({'imdata': []})
+            thread = threading.Thread(target=lambda: added.append(
+                session.push_to_apic('/api/mo/uni.json', self._tenant_json('t3', 'bd1'))))
+            thread.start()
+            thread.join(5)
+            return make_response({'imdata': []})
+        session = get_offline_session(handler)
+        with session.batch(max_objects=2) as batcher:
+            session.push_to_apic('/api/mo/uni.json', self._tenant_json('t1', 'bd1'))
+            session.push_to_apic('/api/mo/uni.json', self._tenant_json('t2', 'bd1'))
+            self.assertEqual(len(added), 1)
+            self.assertEqual(len(batcher._payloads), 1)
+
+
+class TestImdataDecoder(unittest.TestCase):
+    """
+    Test the incremental decoding of APIC responses
+    """
+    text = ('{"totalCount":"3","imdata":['
+            '{"fvTenant":{"attributes":{"name":"t1","descr":"it\\\'s [a] {test}"}}},'
+            '{"fvTenant":{"attributes":{"name":"t2","descr":"quote \\" and \\\\"},"children":[]}},'
+            '{"fvTenant":{"attributes":{"name":"t3\n","descr":""}}}]}')
+
+    def _decode(self, chunk_size, strip_newlines=False):
+        decoder = ImdataDecoder(strip_newlines=strip_newlines)
+        items = []
+        for i in range(0, len(self.text), chunk_size):
+            items.extend(decoder.feed(self.text[i:i + chunk_size]))
+        return items
+
+    def test_decode_chunks(self):
+        """
+        Test that the objects are decoded for every chunk boundary
+        """
+        expected = self._decode(len(self.text), strip_newlines=True)
+        self.assertEqual(len(expected), 3)
+        self.assertEqual(expected[0]['fvTenant']['attributes']['descr'], "it's [a] {test}")
+        self.assertEqual(expected[1]['fvTenant']['attributes']['descr'], 'quote " and \\')
+        for chunk_size in range(1, 20):
+            self.assertEqual(self._decode(chunk_size, strip_newlines=True), expected)
+
+    def test_decode_incremental(self):
+        """
+        Test that objects are returned as soon as they are complete
+        """
+        decoder = ImdataDecoder()
+        first_end = self.text.index('}}},') + 3
+        self.assertEqual(len(decoder.feed(self.text[:first_end])), 1)
+        self.assertEqual(len(decoder._buffer), 0)
+
+    def test_decode_strip_newlines(self):
+        """
+        Test the removal of newlines
+        """
+        items = self._decode(7, strip_newlines=True)
+        self.assertEqual(items[2]['fvTenant']['attributes']['name'], 't3')
+
+    def test_get_stream(self):
+        """
+        Test decoding a response through the session
+        """
+        session = get_offline_session(lambda url: make_response({'imdata': [{'fvTenant': {'attributes': {}}}] * 5}))
+        self.assertEqual(len(list(session.get_stream('/api/class/fvTenant.json'))), 5)
+        imdata_lists = session.get_many_stream(['/api/class/fvTenant.json'] * 3)
+        self.assertEqual([len(imdata) for imdata in imdata_lists], [5, 5, 5])
+
+    def test_get_stream_error(self):
+        """
+        Test that a refused request is not mistaken for an empty response
+        """
+        error = {'imdata': [{'error': {'attributes': {'code': '400', 'text': 'bad query'}}}]}
+
+        def handler(url):
+            if 'fvBD' in url:
+                return make_response(error, 400)
+            return make_response({'imdata': []})
+        session = get_offline_session(handler)
+        with self.assertRaises(requests.exceptions.HTTPError) as context:
+            list(session.get_stream('/api/class/fvBD.json'))
+        self.assertEqual(context.exception.response.json(), error)
+        self.assertRaises(requests.exceptions.HTTPError, session.get_many_stream,
+                          ['/api/class/fvTenant.json', '/api/class/fvBD.json'])
+
+
+class TestRequestStats(unittest.TestCase):
+    """
+    Test the collection of request metrics
+    """
+    def test_get_pattern(self):
+        """
+        Test the grouping of URLs into query patterns
+        """
+        self.assertEqual(RequestStats.get_pattern('/api/class/fvCEp.json?rsp-subtree=full'), 'class:fvCEp')
+        self.assertEqual(RequestStats.get_pattern('/api/mo/uni/tn-t1.json?query-target=subtree&'
+                                                  'target-subtree-class=fvBD'), 'subtree:fvBD')
+        self.assertEqual(RequestStats.get_pattern('/api/mo/uni/tn-t1/ap-a1/epg-e1.json'), 'mo:uni/tn/ap/epg')
+        self.assertEqual(RequestStats.get_pattern('/api/mo/topology/pod-1/node-101/sys/phys-[eth1/1].json'),
+                         'mo:topology/pod/node/sys/phys')
+        self.assertEqual(RequestStats.get_pattern('/api/aaaLogin.json'), 'aaaLogin')
+
+    def test_disabled(self):
+        """
+        Test that no metrics are available unless requested
+        """
+        session = get_offline_session(lambda url: make_response({'imdata': []}))
+        session.get('/api/class/fvTenant.json')
+        self.assertIsNone(session.stats())
+        self.assertIsNone(session.export_stats())
+
+    def test_record(self):
+        """
+        Test the metrics recorded for GET requests and retries
+        """
+        responses = [make_response({'imdata': []}, 403), make_response({'imdata': []})]
+        session = get_offline_session(lambda url: responses.pop(0) if responses else make_response({}),
+                                      collect_stats=True)
+        session._send_login = lambda: make_response({})
+        session.get('/api/mo/uni/tn-t1.json')
+        session.get('/api/mo/uni/tn-t2.json')
+        stats = session.stats()
+        self.assertEqual(stats['relogins'], 1)
+        entry = stats['patterns'][('GET', 'mo:uni/tn')]
+        self.assertEqual(entry['count'], 3)
+        self.assertEqual(entry['retries'], 1)
+        self.assertEqual(entry['errors'], 1)
+        self.assertEqual(entry['bytes'], 2 * len(json.dumps({'imdata': []})) + len('{}'))
+        self.assertEqual(entry['latency_buckets'][-1], (60.0, 3))
+
+    def test_stream(self):
+        """
+        Test the metrics recorded for streamed responses
+        """
+        resp = make_response({'imdata': [{'fvTenant': {'attributes': {}}}]})
+        session = get_offline_session(lambda url: resp, collect_stats=True)
+        self.assertEqual(len(list(session.get_stream('/api/class/fvTenant.json'))), 1)
+        entry = session.stats()['patterns'][('GET', 'class:fvTenant')]
+        self.assertEqual(entry['count'], 1)
+        self.assertEqual(entry['bytes'], len(resp.content))
+
+    def test_export(self):
+        """
+        Test the Prometheus text format
+        """
+        session = get_offline_session(lambda url: make_response({'imdata': []}), collect_stats=True)
+        session.get('/api/class/fvTenant.json')
+        text = session.export_stats()
+        self.assertIn('acitoolkit_request_duration_seconds_count{method="GET",pattern="class:fvTenant"} 1', text)
+        self.assertIn('acitoolkit_request_retries_total{method="GET",pattern="class:fvTenant"} 0', text)
+        self.assertIn('acitoolkit_request_relogins_total 0', text)
+
+
+class TestRateLimiter(unittest.TestCase):
+    """
+    Test the flow control of the requests
+    """
+    def test_retry_throttled(self):
+        """
+        Test that throttled responses are retried and shrink the concurrency
+        """
+        responses = [make_response({}, 503), make_response({}, 429), make_response({'imdata': []})]
+        limiter = RateLimiter(rate=1000, max_concurrency=8, backoff_base=0.001)
+        session = get_offline_session(lambda url: responses.pop(0), rate_limiter=limiter)
+        resp = session.get('/api/class/fvTenant.json')
+        self.assertTrue(resp.ok)
+        self.assertEqual(limiter.throttled, 2)
+        self.assertEqual(limiter.failures, 0)
+        self.assertTrue(2 < limiter.concurrency < 3)
+
+    def test_retry_connection_error(self):
+        """
+        Test that connection errors are retried up to max_retries
+        """
+        def handler(url):
+            raise ConnectionError('Connection reset')
+        limiter = RateLimiter(rate=1000, max_retries=2, backoff_base=0.001)
+        session = get_offline_session(handler, rate_limiter=limiter)
+        self.assertRaises(ConnectionError, session.get, '/api/class/fvTenant.json')
+        self.assertEqual(len(session.session.urls), 3)
+
+    def test_other_error(self):
+        """
+        Test that any other exception is not retried, gives back the slot
+        of the request and does not count as throttling or as a failure
+        """
+        def handler(url):
+            raise requests.exceptions.ChunkedEncodingError('Connection broken')
+        limiter = RateLimiter(rate=1000, max_concurrency=4, failure_threshold=2)
+        session = get_offline_session(handler, rate_limiter=limiter)
+        for i in range(3):
+            self.assertRaises(requests.exceptions.ChunkedEncodingError, session.get, '/api/class/fvTenant.json')
+        self.assertEqual(len(session.session.urls), 3)
+        self.assertEqual(limiter._in_flight, 0)
+        self.assertEqual(limiter.concurrency, 4)
+        self.assertEqual(limiter.throttled, 0)
+        self.assertEqual(limiter.failures, 0)
+        self.assertFalse(limiter.is_open)
+
+    def test_stream_slot(self):
+        """
+        Test that a streamed GET keeps its slot until the body is read
+        """
+        status = [200]
+        data = {'imdata': [{'fvTenant': {'attributes': {'name': 't%s' % i}}} for i in range(3)]}
+        limiter = RateLimiter(rate=1000)
+        session = get_offline_session(lambda url: make_response(data, status[0]), rate_limiter=limiter)
+        items = session.get_stream('/api/class/fvTenant.json')
+        next(items)
+        self.assertEqual(limiter._in_flight, 1)
+        self.assertEqual(len(list(items)), 2)
+        self.assertEqual(limiter._in_flight, 0)
+        status[0] = 400
+        self.assertRaises(requests.exceptions.HTTPError, list, session.get_stream('/api/class/fvTenant.json'))
+        self.assertEqual(limiter._in_flight, 0)
+
+    def test_circuit_breaker(self):
+        """
+        Test that the circuit opens after consecutive failures and recovers
+        """
+        status = [500]
+        limiter = RateLimiter(rate=1000, failure_threshold=3, reset_timeout=0.05)
+        session = get_offline_session(lambda url: make_response({'imdata': []}, status[0]), rate_limiter=limiter)
+        for i in range(3):
+            self.assertEqual(session.get('/api/class/fvTenant.json').status_code, 500)
+        self.assertTrue(limiter.is_open)
+        self.assertRaises(CircuitOpenError, session.get, '/api/class/fvTenant.json')
+        self.assertEqual(len(session.session.urls), 3)
+        time.sleep(0.06)
+        status[0] = 200
+        self.assertTrue(session.get('/api/class/fvTenant.json').ok)
+        self.assertFalse(limiter.is_open)
+
+    def test_token_bucket(self):
+        """
+        Test that the request rate is limited once the burst is used
+        """
+        limiter = RateLimiter(rate=100, burst=5)
+        start = time.time()
+        for i in range(10):
+            limiter.acquire()
+            limiter.release(200)
+        self.assertTrue(time.time() - start >= 0.04)
+
+    def test_backoff(self):
+        """
+        Test the bounds of the backoff delay
+        """
+        limiter = RateLimiter(backoff_base=1, backoff_max=8)
+        for attempt in range(10):
+            self.assertTrue(0 <= limiter.get_backoff(attempt) <= 8)
+        self.assertEqual(limiter.get_backoff(0, retry_after=5), 5)
+
+
+class TestSubscriberEvents(unittest.TestCase):
+    """
+    Test the demultiplexing of subscription events
+    """
+    def setUp(self):
+        self.next_id = [100]
+
+        def handler(url):
+            self.next_id[0] += 1
+            return make_response({'subscriptionId': str(self.next_id[0]), 'imdata': []})
+        self.subscriber = Subscriber(get_offline_session(handler))
+        self.tenant_url = '/api/class/fvTenant.json?subscription=yes'
+        self.bd_url = '/api/class/fvBD.json?subscription=yes'
+        self.subscriber.subscribe(self.tenant_url)
+        self.subscriber.subscribe(self.bd_url)
+
+    def _put_event(self, subscription_ids):
+        event = {'subscriptionId': subscription_ids,
+                 'imdata': [{'fvTenant': {'attributes': {'dn': 'uni/tn-t1', 'status': 'modified'}}}]}
+        decode_events(self.subscriber, [event])
+
+    def test_demultiplex(self):
+        """
+        Test that an event is delivered to each of its subscriptions
+        """
+        self._put_event(['101', '102'])
+        self.assertTrue(self.subscriber.has_events(self.tenant_url))
+        self.assertTrue(self.subscriber.has_events(self.bd_url))
+        event = self.subscriber.get_event(self.tenant_url)
+        self.assertIs(self.subscriber.get_event(self.bd_url), event)
+
+    def test_resubscribe(self):
+        """
+        Test that the index follows the new subscription ids
+        """
+        self.subscriber._resubscribe()
+        self._put_event(['101'])
+        self.assertFalse(self.subscriber.has_events(self.tenant_url))
+        self._put_event(['103', '104'])
+        self.assertTrue(self.subscriber.has_events(self.tenant_url))
+        self.assertTrue(self.subscriber.has_events(self.bd_url))
+
+    def test_unsubscribe(self):
+        """
+        Test that events of removed subscriptions are not delivered
+        """
+        self.subscriber.unsubscribe(self.bd_url)
+        self.assertEqual(self.subscriber._subscription_urls, {'101': self.tenant_url})
+
+    def _put_event_later(self, subscription_ids, delay=0.05):
+        event = {'subscriptionId': subscription_ids,
+                 'imdata': [{'fvTenant': {'attributes': {'dn': 'uni/tn-t1', 'status': 'modified'}}}]}
+
+        def put_event():
+            time.sleep(delay)
+            decode_events(self.subscriber, [event])
+        thread = threading.Thread(target=put_event)
+        thread.start()
+        return thread
+
+    def test_wait_for_events(self):
+        """
+        Test that a waiting thread wakes up when an event arrives
+        """
+        self.assertEqual(self.subscriber.wait_for_events([self.tenant_url], timeout=0.01), [])
+        thread = self._put_event_later(['102'])
+        self.assertEqual(self.subscriber.wait_for_events([self.tenant_url, self.bd_url], timeout=5), [self.bd_url])
+        thread.join()
+
+    def test_callback(self):
+        """
+        Test that the registered callbacks are called with the URL
+        """
+        received = Queue()
+
+        def callback(url):
+            while self.subscriber.has_events(url):
+                received.put((url, self.subscriber.get_event(url)))
+        self.subscriber.add_callback(self.tenant_url, callback)
+        self._put_event_later(['101']).join()
+        url, event = received.get(timeout=5)
+        self.assertEqual(url, self.tenant_url)
+        self.subscriber.remove_callback(self.tenant_url, callback)
+        self.subscriber.exit()
+        self.subscriber._callback_thread.join(5)
+        self.assertFalse(self.subscriber._callback_thread.is_alive())
+
+
+class TestSubscriberRefresh(unittest.TestCase):
+    """
+    Test the scheduling of the subscription refreshes
+    """
+    def setUp(self):
+        self.next_id = [100]
+        self.refresh_ok = True
+
+        def handler(url):
+            if '/api/subscriptionRefresh.json' in url:
+                return make_response({'imdata': []}, 200 if self.refresh_ok else 400)
+            self.next_id[0] += 1
+            return make_response({'subscriptionId': str(self.next_id[0]), 'imdata': []})
+        self.session = get_offline_session(handler)
+        self.subscriber = Subscriber(self.session)
+        self.urls = ['/api/class/fvTenant.json?subscription=yes',
+                     '/api/class/fvBD.json?subscription=yes']
+        for url in self.urls:
+            self.subscriber.subscribe(url)
+
+    def _get_refresh_urls(self):
+        return [url.split('/api/')[1] for url in self.session.session.urls
+                if '/api/subscriptionRefresh.json' in url]
+
+    def test_schedule(self):
+        """
+        Test that the refreshes are scheduled with jitter
+        """
+        now = time.time()
+        self.assertEqual(sorted(self.subscriber._refresh_due), sorted(self.urls))
+        for due_time in self.subscriber._refresh_due.values():
+            self.assertTrue(now + 30 * 0.8 - 1 <= due_time <= now + 30)
+        self.subscriber.unsubscribe(self.urls[1])
+        self.assertEqual(list(self.subscriber._refresh_due), [self.urls[0]])
+
+    def test_due_refreshes(self):
+        """
+        Test that the due subscriptions are refreshed by the workers
+        """
+        self.subscriber._refresh_due[self.urls[0]] = 0
+        heapq.heappush(self.subscriber._refresh_heap, (0, self.urls[0]))
+        due = self.subscriber._get_due_refreshes()
+        self.assertEqual(due, [(self.urls[0], 0)])
+        for future in self.subscriber._start_refreshes(due):
+            self.assertIsNone(future.exception(5))
+        self.assertEqual(self._get_refresh_urls(), ['subscriptionRefresh.json?id=101'])
+        self.assertTrue(self.subscriber._refresh_due[self.urls[0]] > time.time())
+        stats = self.subscriber.get_refresh_stats()
+        self.assertEqual(stats['refreshed'], 1)
+        self.assertEqual(stats['scheduled'], 2)
+        self.assertTrue(stats['max_lag'] > 0)
+
+    def test_refresh_failure(self):
+        """
+        Test that only the subscription that failed to refresh is sent again
+        """
+        self.refresh_ok = False
+        self.subscriber.refresh_subscriptions()
+        self.assertEqual(len(self._get_refresh_urls()), 2)
+        self.assertEqual(sorted(self.subscriber._subscription_urls), ['103', '104'])
+        stats = self.subscriber.get_refresh_stats()
+        self.assertEqual(stats['failed'], 2)
+        self.assertEqual(stats['resubscribed'], 2)
+        self.assertEqual(stats['scheduled'], 2)
+
+    def test_close(self):
+        """
+        Test that closing the session stops the thread and its refresh workers
+        """
+        self.session._subscription_enabled = True
+        self.session.subscription_thread = self.subscriber
+        self.subscriber.daemon = True
+        self.subscriber._refresh_due[self.urls[0]] = 0
+        heapq.heappush(self.subscriber._refresh_heap, (0, self.urls[0]))
+        self.subscriber.start()
+        for i in range(50):
+            if self._get_refresh_urls():
+                break
+            time.sleep(0.1)
+        self.assertEqual(self._get_refresh_urls(), ['subscriptionRefresh.json?id=101'])
+        workers = list(self.subscriber._refresh_executor._workers)
+        self.session.close()
+        self.assertFalse(self.subscriber.is_alive())
+        for worker in workers:
+            self.assertFalse(worker.is_alive())
+
+    def test_stop_subscribers(self):
+        """
+        Test that the running threads are stopped at interpreter exit
+        """
+        self.subscriber.daemon = True
+        self.subscriber.start()
+        self.assertIn(self.subscriber, acisession._subscribers)
+        acisession._stop_subscribers()
+        self.assertFalse(self.subscriber.is_alive())
+
+
+class TestWebSocketShards(unittest.TestCase):
+    """
+    Test the sharding of the subscriptions over several websockets
+    """
+    urls = ['/api/class/fvTenant.json?subscription=yes',
+            '/api/class/fvBD.json?subscription=yes',
+            '/api/class/fvAEPg.json?subscription=yes']
+
+    def test_assignment(self):
+        """
+        Test that the subscriptions are spread over the shards
+        """
+        session = get_offline_session(lambda url: make_response({'imdata': []}), websocket_shards=2)
+        subscriber = Subscriber(session)
+        shards = [subscriber._get_shard(url) for url in self.urls]
+        self.assertIs(shards[0].apic, session)
+        self.assertIsNot(shards[1].apic, session)
+        self.assertFalse(shards[1].apic._subscription_enabled)
+        self.assertIs(shards[2], shards[0])
+        self.assertIs(subscriber._get_shard(self.urls[1]), shards[1])
+        self.assertEqual([stats['subscriptions'] for stats in subscriber.get_shard_stats()], [2, 1])
+        subscriber._remove_shard_url(self.urls[1])
+        self.assertEqual(shards[1].urls, set())
+        self.assertIs(subscriber._get_shard(self.urls[1]), shards[1])
+
+    def test_decode(self):
+        """
+        Test that the decode thread of a shard delivers the events
+        """
+        session = get_offline_session(lambda url: make_response({'subscriptionId': '101', 'imdata': []}))
+        subscriber = Subscriber(session)
+        subscriber.subscribe(self.urls[0])
+        shard = subscriber._get_shard(self.urls[0])
+        thread = threading.Thread(target=shard._decode)
+        thread.start()
+        shard._raw_q.put('not json')
+        shard._raw_q.put(json.dumps(make_event('uni/tn-t1', 'modified')))
+        shard._raw_q.put(json.dumps({'subscriptionId': ['101'],
+                                     'imdata': [{'fvTenant': {'attributes': {'dn': 'uni/tn-t1',
+                                                                             'status': 'deleted'}}}]}))
+        self.assertEqual(subscriber.wait_for_events([self.urls[0]], timeout=5), [self.urls[0]])
+        shard._raw_q.put(None)
+        thread.join(5)
+        self.assertEqual(shard.received, 3)
+        event = subscriber.get_event(self.urls[0])
+        self.assertEqual(event['imdata'][0]['fvTenant']['attributes']['status'], 'deleted')
+        self.assertFalse(subscriber.has_events(self.urls[0]))
+
+
+def make_event(dn, status, **attributes):
+    """
+    Build a subscription event for a tenant
+    """
+    attributes.update({'dn': dn, 'status': status})
+    return {'subscriptionId': ['1'], 'imdata': [{'fvTenant': {'attributes': attributes}}]}
+
+
+def decode_events(subscriber, events):
+    """
+    Hand events to a subscriber the way they are received on the websocket
+    of its first shard
+    """
+    shard = subscriber._shards[0]
+    for event in events:
+        # The raw queue is bounded by the EventQueueLimit, decode the
+        # events one at a time
+        shard._raw_q.put(json.dumps(event))
+        shard._raw_q.put(None)
+        shard._decode()
+
+
+class TestEventJournal(unittest.TestCase):
+    """
+    Test the on-disk event journal
+    """
+    url = '/api/class/fvTenant.json?subscription=yes'
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_append_read(self):
+        """
+        Test reading back the events across segments and restarts
+        """
+        journal = EventJournal(self.directory, segment_size=200)
+        for i in range(10):
+            self.assertEqual(journal.append(self.url, make_event('uni/tn-t%s' % i, 'created')), i)
+        journal.append('/api/class/fvBD.json?subscription=yes', make_event('uni/tn-t1', 'modified'))
+        self.assertTrue(len(journal._segments) > 1)
+        offsets = [offset for offset, url, event in journal.read(4, self.url)]
+        self.assertEqual(offsets, list(range(4, 10)))
+        journal.close()
+        journal = EventJournal(self.directory, segment_size=200)
+        self.assertEqual(journal.append(self.url, make_event('uni/tn-t1', 'deleted')), 11)
+        self.assertEqual(len(list(journal.read(0))), 12)
+        journal.close()
+
+    def test_recover_partial_record(self):
+        """
+        Test that a partially written record is dropped on restart
+        """
+        journal = EventJournal(self.directory)
+        journal.append(self.url, make_event('uni/tn-t1', 'created'))
+        journal._file.write(b'\x00\x00\x00')
+        journal.close()
+        journal = EventJournal(self.directory)
+        self.assertEqual(journal.append(self.url, make_event('uni/tn-t2', 'created')), 1)
+        self.assertEqual(len(list(journal.read(0))), 2)
+        journal.close()
+
+    def test_offsets(self):
+        """
+        Test that committed offsets persist once flushed
+        """
+        journal = EventJournal(self.directory)
+        self.assertEqual(journal.get_offset(self.url), 0)
+        journal.commit(self.url, 5)
+        journal.commit(self.url, 3)
+        journal.close()
+        self.assertEqual(EventJournal(self.directory).get_offset(self.url), 5)
+
+    def test_changes(self):
+        """
+        Test the events needed to catch up with the current state
+        """
+        journal = EventJournal(self.directory)
+        journal.append(self.url, make_event('uni/tn-t1', 'created', descr='a'))
+        journal.append(self.url, make_event('uni/tn-t2', 'created', descr='a'))
+        journal.append(self.url, make_event('uni/tn-t3', 'created', descr='a'))
+        journal.append(self.url, make_event('uni/tn-t2', 'modified', descr='b'))
+        imdata = [{'fvTenant': {'attributes': {'dn': 'uni/tn-t1', 'descr': 'a', 'status': ''}}},
+                  {'fvTenant': {'attributes': {'dn': 'uni/tn-t2', 'descr': 'b', 'status': ''}}},
+                  {'fvTenant': {'attributes': {'dn': 'uni/tn-t4', 'descr': 'a', 'status': ''}}}]
+        changes = journal.get_changes(self.url, imdata)
+        self.assertEqual(len(changes), 2)
+        self.assertEqual(changes[0]['fvTenant']['attributes']['dn'], 'uni/tn-t4')
+        self.assertEqual(changes[1]['fvTenant']['attributes'], {'dn': 'uni/tn-t3', 'status': 'deleted'})
+        journal.close()
+
+    def test_compact(self):
+        """
+        Test that compaction keeps the last state and the offsets
+        """
+        journal = EventJournal(self.directory, segment_size=100)
+        journal.append(self.url, make_event('uni/tn-t1', 'created', descr='a', name='t1'))
+        journal.append(self.url, make_event('uni/tn-t2', 'created'))
+        journal.append(self.url, make_event('uni/tn-t1', 'modified', descr='b'))
+        journal.append(self.url, make_event('uni/tn-t2', 'deleted'))
+        journal.append(self.url, make_event('uni/tn-t3', 'created'))
+        journal.append(self.url, make_event('uni/tn-t3', 'deleted'))
+        journal.commit(self.url, 4)
+        state = journal.get_state(self.url)
+        journal.compact()
+        events = list(journal.read(0))
+        self.assertEqual([offset for offset, url, event in events], [2, 5])
+        self.assertEqual(events[0][2]['imdata'][0]['fvTenant']['attributes']['name'], 't1')
+        self.assertEqual(journal.get_state(self.url), state)
+        self.assertEqual(journal.append(self.url, make_event('uni/tn-t4', 'created')), 6)
+        journal.close()
+        journal = EventJournal(self.directory)
+        self.assertEqual([offset for offset, url, event in journal.read(0)], [2, 5, 6])
+        journal.close()
+
+    def test_subscriber_restart(self):
+        """
+        Test that a restarted subscriber only receives what it missed
+        """
+        tenants = [{'fvTenant': {'attributes': {'dn': 'uni/tn-t%s' % i, 'descr': ''}}} for i in range(5)]
+
+        def subscribe():
+            session = get_offline_session(lambda url: make_response({'subscriptionId': '1', 'imdata': tenants}),
+                                          journal=EventJournal(self.directory))
+            subscriber = Subscriber(session)
+            subscriber.subscribe(self.url)
+            return session, subscriber
+
+        session, subscriber = subscribe()
+        for i in range(3):
+            self.assertTrue(subscriber.has_events(self.url))
+            subscriber.get_event(self.url)
+        session._journal.close()
+
+        tenants[0]['fvTenant']['attributes']['descr'] = 'changed'
+        session, subscriber = subscribe()
+        received = []
+        while subscriber.has_events(self.url):
+            received.append(subscriber.get_event(self.url)['imdata'][0]['fvTenant']['attributes']['dn'])
+        self.assertEqual(received, ['uni/tn-t3', 'uni/tn-t4', 'uni/tn-t0'])
+        session._journal.close()
+
+
+class TestEventCoalescer(unittest.TestCase):
+    """
+    Test the merging of bursty subscription events
+    """
+    url = '/api/class/fvTenant.json?subscription=yes'
+
+    def test_merge(self):
+        """
+        Test that the events of an object are merged into the net transition
+        """
+        coalescer = EventCoalescer(window=1)
+        coalescer.add(self.url, make_event('uni/tn-t1', 'created', descr='a', name='t1'), now=0)
+        coalescer.add(self.url, make_event('uni/tn-t1', 'modified', descr='b'), now=0.5)
+        coalescer.add(self.url, make_event('uni/tn-t2', 'modified', descr='a'), now=0.5)
+        coalescer.add(self.url, make_event('uni/tn-t2', 'deleted'), now=0.6)
+        coalescer.add(self.url, make_event('uni/tn-t3', 'created'), now=0.6)
+        coalescer.add(self.url, make_event('uni/tn-t3', 'deleted'), now=0.7)
+        self.assertEqual(coalescer.pop_ready(now=1.2), [])
+        self.assertAlmostEqual(coalescer.get_timeout(now=1.2), 0.3)
+        ready = coalescer.pop_ready(now=1.6)
+        self.assertEqual([event['imdata'][0]['fvTenant']['attributes'] for url, event in ready],
+                         [{'dn': 'uni/tn-t1', 'status': 'created', 'descr': 'b', 'name': 't1'},
+                          {'dn': 'uni/tn-t2', 'status': 'deleted'}])
+        self.assertEqual(coalescer.get_stats(),
+                         {'received': 6, 'delivered': 2, 'collapsed': 4, 'pending': 0})
+        self.assertIsNone(coalescer.get_timeout())
+
+    def test_max_delay(self):
+        """
+        Test that a continuously updated object is still delivered
+        """
+        coalescer = EventCoalescer(window=1, max_delay=3)
+        for i in range(5):
+            coalescer.add(self.url, make_event('uni/tn-t1', 'modified', descr=str(i)), now=i * 0.5)
+        self.assertEqual(len(coalescer.pop_ready(now=3)), 1)
+        self.assertEqual(coalescer.collapsed, 4)
+
+    def test_split(self):
+        """
+        Test that an event holding several objects is merged per object
+        """
+        coalescer = EventCoalescer()
+        event = make_event('uni/tn-t1', 'modified')
+        event['imdata'].append({'fvTenant': {'attributes': {'dn': 'uni/tn-t2', 'status': 'modified'}}})
+        coalescer.add(self.url, event, now=0)
+        self.assertEqual(len(coalescer.pop_ready(now=10)), 2)
+
+    def test_subscriber(self):
+        """
+        Test that the subscriber delivers the merged events
+        """
+        session = get_offline_session(lambda url: make_response({'subscriptionId': '1', 'imdata': []}),
+                                      coalescer=EventCoalescer(window=0.05))
+        subscriber = Subscriber(session)
+        subscriber.subscribe(self.url)
+        decode_events(subscriber, [make_event('uni/tn-t1', status, name='t1')
+                                   for status in ('created', 'modified', 'modified')])
+        self.assertFalse(subscriber.has_events(self.url))
+        self.assertEqual(subscriber.wait_for_events([self.url], timeout=5), [self.url])
+        event = subscriber.get_event(self.url)
+        self.assertEqual(event['imdata'][0]['fvTenant']['attributes']['status'], 'created')
+        self.assertFalse(subscriber.has_events(self.url))
+        self.assertEqual(session._coalescer.collapsed, 2)
+
+
+class TestEventQueueLimit(unittest.TestCase):
+    """
+    Test the bounds of the pending events of the subscriptions
+    """
+    url = '/api/class/fvTenant.json?subscription=yes'
+
+    def _get_subscriber(self, coalescer=None, **kwargs):
+        self.backlogged = []
+        limit = EventQueueLimit(on_high_watermark=self.backlogged.append, **kwargs)
+        session = get_offline_session(lambda url: make_response({'subscriptionId': '1', 'imdata': []}),
+                                      queue_limit=limit, coalescer=coalescer)
+        subscriber = Subscriber(session)
+        subscriber.subscribe(self.url)
+        return subscriber
+
+    def _get_dns(self, subscriber):
+        dns = []
+        while subscriber.has_events(self.url):
+            event = subscriber.get_event(self.url)
+            dns.append(event['imdata'][0]['fvTenant']['attributes']['dn'])
+        return dns
+
+    def test_policy(self):
+        """
+        Test that an unknown policy is refused
+        """
+        self.assertRaises(ValueError, EventQueueLimit, policy='unknown')
+
+    def test_drop_oldest(self):
+        """
+        Test that the oldest events are dropped
+        """
+        subscriber = self._get_subscriber(max_events=2, policy='drop_oldest')
+        limit = subscriber._apic._queue_limit
+        decode_events(subscriber, [make_event('uni/tn-' + name, 'modified') for name in ('t1', 't2', 't3')])
+        self.assertTrue(subscriber.has_events(self.url))
+        self.assertEqual(self.backlogged, [self.url])
+        self.assertTrue(subscriber._apic.is_backlogged(self.url))
+        self.assertEqual(self._get_dns(subscriber), ['uni/tn-t2', 'uni/tn-t3'])
+        self.assertFalse(subscriber._apic.is_backlogged(self.url))
+        self.assertEqual(limit.get_stats()['dropped_by_url'], {self.url: 1})
+
+    def test_collapse(self):
+        """
+        Test that the events of the same dn are merged
+        """
+        subscriber = self._get_subscriber(max_events=2, policy='collapse')
+        subscriber._apic._queue_limit.set_max_events(self.url, 3)
+        events = [make_event('uni/tn-t1', 'created', descr='a'),
+                  make_event('uni/tn-t2', 'created'),
+                  make_event('uni/tn-t3', 'created'),
+                  make_event('uni/tn-t1', 'modified', descr='b'),
+                  make_event('uni/tn-t3', 'deleted'),
+                  make_event('uni/tn-t4', 'created')]
+        decode_events(subscriber, events)
+        event = subscriber._events[self.url][0]
+        self.assertEqual(event['imdata'][0]['fvTenant']['attributes'],
+                         {'dn': 'uni/tn-t1', 'status': 'created', 'descr': 'b'})
+        self.assertEqual(self._get_dns(subscriber), ['uni/tn-t1', 'uni/tn-t2', 'uni/tn-t4'])
+        stats = subscriber._apic._queue_limit.get_stats()
+        self.assertEqual((stats['collapsed'], stats['dropped']), (2, 0))
+
+    def test_block(self):
+        """
+        Test that the decode threads wait for the events to be consumed
+        """
+        subscriber = self._get_subscriber(max_events=1)
+        subscriber._put_event(make_event('uni/tn-t1', 'modified'))
+        thread = threading.Thread(target=subscriber._put_event, args=(make_event('uni/tn-t2', 'modified'),))
+        thread.start()
+        time.sleep(0.05)
+        self.assertTrue(thread.is_alive())
+        self.assertEqual(subscriber._apic._queue_limit.blocked, 1)
+        self.assertEqual(self._get_dns(subscriber), ['uni/tn-t1'])
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(self._get_dns(subscriber), ['uni/tn-t2'])
+
+    def test_block_coalesced(self):
+        """
+        Test that the merged events are held while their URL is full
+        """
+        subscriber = self._get_subscriber(max_events=2, coalescer=EventCoalescer(window=0.01))
+        for name in ('t1', 't2', 't3', 't4'):
+            subscriber._put_event(make_event('uni/tn-' + name, 'modified'))
+        time.sleep(0.02)
+        subscriber._pop_coalesced_events()
+        self.assertEqual(len(subscriber._events[self.url]), 2)
+        self.assertEqual(subscriber._apic._coalescer.get_stats()['pending'], 2)
+        self.assertEqual(self._get_dns(subscriber), ['uni/tn-t1', 'uni/tn-t2', 'uni/tn-t3', 'uni/tn-t4'])
+
+    def test_unknown_subscription(self):
+        """
+        Test that the events of an unknown subscription are dropped and counted
+        """
+        subscriber = self._get_subscriber(max_events=1)
+        event = make_event('uni/tn-t1', 'modified')
+        event['subscriptionId'] = ['999']
+        for i in range(3):
+            subscriber._put_event(event)
+        self.assertEqual(subscriber._events, {})
+        self.assertEqual(subscriber.unknown_events, 3)
+
+
+class TestClusterSession(unittest.TestCase):
+    """
+    Test the spreading of the requests over the controllers of a cluster
+    """
+    def _get_cluster(self, *handlers):
+        cluster = ClusterSession(['http://1.2.3.%s' % index for index in range(len(handlers))],
+                                 'admin', 'password', subscription_enabled=False, collect_stats=True)
+        for member, handler in zip(cluster._members, handlers):
+            member.session = FakeRequestsSession(handler)
+            member._logged_in = True
+        return cluster
+
+    def test_reads(self):
+        """
+        Test that the reads are spread and the writes pinned to the primary
+        """
+        handler = lambda url: make_response({'imdata': []})
+        cluster = self._get_cluster(handler, handler)
+        for i in range(4):
+            self.assertTrue(cluster.get('/api/class/fvTenant.json').ok)
+        self.assertTrue(cluster.push_to_apic('/api/mo/uni.json', {'fvTenant': {'attributes': {'name': 't1'}}}).ok)
+        cluster.get('/api/class/fvTenant.json?subscription=yes')
+        urls = [member.session.urls for member in cluster._members]
+        self.assertEqual(len(urls[0]), 4)
+        self.assertEqual(len(urls[1]), 2)
+        self.assertTrue(urls[0][-1].endswith('subscription=yes'))
+        self.assertEqual(sum(entry['count'] for entry in cluster.stats()['patterns'].values()), 6)
+
+    def test_failover(self):
+        """
+        Test that the requests move to the other controller when one fails
+        """
+        def failed_handler(url):
+            raise ConnectionError('Connection refused')
+        cluster = self._get_cluster(failed_handler, lambda url: make_response({'imdata': []}))
+        self.assertTrue(cluster.get('/api/class/fvTenant.json').ok)
+        self.assertTrue(cluster.push_to_apic('/api/mo/uni.json', {}).ok)
+        self.assertEqual(cluster.api, 'http://1.2.3.1')
+        stats = cluster.get_member_stats()
+        self.assertEqual([member['up'] for member in stats], [False, True])
+        self.assertEqual([member['primary'] for member in stats], [False, True])
+        self.assertEqual(stats[0]['failures'], 1)
+        self.assertEqual(len(cluster._members[0].session.urls), 1)
+
+
+class TestLoginTokenCache(unittest.TestCase):
+    """
+    Test the reuse of the login tokens of previous sessions
+    """
+    url = 'http://1.2.3.4'
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = LoginTokenCache(os.path.join(self.directory, 'cache', 'tokens.json'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_put(self):
+        """
+        Test that the tokens are stored per user in a private file
+        """
+        self.cache.put(self.url, 'admin', 'token1', 600)
+        self.cache.put(self.url, 'other', 'token2', 600, max_lifetime=0)
+        self.assertEqual(os.stat(self.cache.path).st_mode & 0o777, 0o600)
+        self.assertEqual(LoginTokenCache(self.cache.path).get(self.url, 'admin')['token'], 'token1')
+        self.assertIsNone(self.cache.get(self.url, 'other'))
+        self.assertIsNone(self.cache.get('http://1.2.3.5', 'admin'))
+        self.cache.remove(self.url, 'admin')
+        self.assertIsNone(self.cache.get(self.url, 'admin'))
+
+    def test_permissions(self):
+        """
+        Test that a file readable by other users is ignored
+        """
+        self.cache.put(self.url, 'admin', 'token1', 600)
+        os.chmod(self.cache.path, 0o644)
+        self.assertIsNone(self.cache.get(self.url, 'admin'))
+
+    def test_parse_login(self):
+        """
+        Test the parsing of the login responses
+        """
+        resp = make_response({'imdata': [{'aaaLogin': {'attributes': {'token': 'abc',
+                                                                       'refreshTimeoutSeconds': '600',
+                                                                       'maximumLifetimeSeconds': '86400'}}}]})
+        self.assertEqual(LoginTokenCache.parse_login(resp), ('abc', 600, 86400))
+        self.assertIsNone(LoginTokenCache.parse_login(make_response({'imdata': []})))
+
+    def test_cached_login(self):
+        """
+        Test that the session logs in with a cached token without any request
+        """
+        self.cache.put(self.url, 'admin', 'token1', 600)
+        session = Session(self.url, 'admin', 'password', subscription_enabled=False, token_cache=self.cache)
+        session.login_thread = threading.Thread()
+        self.assertTrue(session.login().ok)
+        self.assertEqual(session.token, 'token1')
+        self.assertEqual(session.session.cookies.get('APIC-cookie'), 'token1')
+        self.assertTrue(session.logged_in())
+
+    def test_cached_login_refresh(self):
+        """
+        Test that a token close to its expiry is refreshed and that a
+        refused token falls back to a full login
+        """
+        self.cache.put(self.url, 'admin', 'token1', 600)
+        entry = self.cache.get(self.url, 'admin')
+        entry['expires'] = time.time() + 60
+        self.cache.get = lambda url, uid: entry
+        session = Session(self.url, 'admin', 'password', subscription_enabled=False, token_cache=self.cache)
+        session.login_thread = threading.Thread()
+        refreshed = []
+
+        def refresh_login(timeout=None):
+            refreshed.append(session.session.cookies.get('APIC-cookie'))
+            return make_response({'imdata': []}, 403)
+        session.refresh_login = refresh_login
+        session._send_login = lambda timeout=None: make_response({'imdata': []})
+        self.assertTrue(session.login().ok)
+        self.assertEqual(refreshed, ['token1'])
+
+    def test_environment(self):
+        """
+        Test that the cache named by APIC_TOKEN_CACHE is used unless the
+        session opts out, as the sessions of the websocket shards do
+        """
+        os.environ['APIC_TOKEN_CACHE'] = self.cache.path
+        try:
+            session = Session(self.url, 'admin', 'password', subscription_enabled=False, websocket_shards=2)
+            self.assertEqual(session._token_cache.path, self.cache.path)
+            self.assertIsNone(Session(self.url, 'admin', 'password', subscription_enabled=False,
+                                      token_cache=False)._token_cache)
+            subscriber = Subscriber(session)
+            subscriber._get_shard('/api/class/fvTenant.json?subscription=yes')
+            shard = subscriber._get_shard('/api/class/fvBD.json?subscription=yes')
+            self.assertIsNot(shard.apic, session)
+            self.assertIsNone(shard.apic._token_cache)
+        finally:
+            del os.environ['APIC_TOKEN_CACHE']
+
+
+@unittest.skipIf(crypto is None, 'pyOpenSSL is not installed')
+class TestCertificateAuth(unittest.TestCase):
+    """
+    Test the signing of the requests with the certificate of the user
+    """
+    def setUp(self):
+        self.key = crypto.PKey()
+        self.key.generate_key(crypto.TYPE_RSA, 2048)
+        self.cert = crypto.X509()
+        self.cert.get_subject().CN = 'admin'
+        self.cert.set_serial_number(1)
+        self.cert.gmtime_adj_notBefore(0)
+        self.cert.gmtime_adj_notAfter(3600)
+        self.cert.set_issuer(self.cert.get_subject())
+        self.cert.set_pubkey(self.key)
+        self.cert.sign(self.key, 'sha256')
+
+    def _get_session(self, status_code=200):
+        session = Session('http://1.2.3.4', 'admin', None, cert_name='admin-cert',
+                          key=crypto.dump_privatekey(crypto.FILETYPE_PEM, self.key).decode())
+        self.assertFalse(session._subscription_enabled)
+        self.assertTrue(session.login().ok)
+        session.session = FakeRequestsSession(lambda url: make_response({'imdata': []}, status_code))
+        return session
+
+    def test_signature(self):
+        """
+        Test that each request carries the signature of its method, URL and payload
+        """
+        session = self._get_session()
+        self.assertFalse(session.login_thread.is_alive())
+        session.get('/api/class/fvTenant.json')
+        session.push_to_apic('/api/mo/uni.json', {'fvTenant': {'attributes': {'name': 't1'}}})
+        get_cookies, post_cookies = session.session.cookies
+        self.assertEqual(get_cookies['APIC-Certificate-DN'], 'uni/userext/user-admin/usercert-admin-cert')
+        crypto.verify(self.cert, base64.b64decode(get_cookies['APIC-Request-Signature']),
+                      'GET/api/class/fvTenant.json', 'sha256')
+        crypto.verify(self.cert, base64.b64decode(post_cookies['APIC-Request-Signature']),
+                      'POST/api/mo/uni.json' + json.dumps({'fvTenant': {'attributes': {'name': 't1'}}},
+                                                          sort_keys=True), 'sha256')
+
+    def test_no_relogin(self):
+        """
+        Test that a refused request is not retried after a login
+        """
+        session = self._get_session(403)
+        self.assertEqual(session.get('/api/class/fvTenant.json').status_code, 403)
+        self.assertEqual(len(session.session.urls), 1)
+
+    def test_websocket_shards(self):
+        """
+        Test that the sessions of the websocket shards sign their requests
+        with the certificate and still log in for their websocket
+        """
+        session = Session('http://1.2.3.4', 'admin', 'password', subscription_enabled=False,
+                          cert_name='admin-cert', key=crypto.dump_privatekey(crypto.FILETYPE_PEM, self.key).decode(),
+                          websocket_shards=2)
+        subscriber = Subscriber(session)
+        subscriber._get_shard('/api/class/fvTenant.json?subscription=yes')
+        shard = subscriber._get_shard('/api/class/fvBD.json?subscription=yes')
+        self.assertIsNot(shard.apic, session)
+        self.assertEqual(shard.apic.cert_name, 'admin-cert')
+        self.assertIs(shard.apic._x509_key, session._x509_key)
+        self.assertTrue(shard.apic._websocket_login)
+        logins = []
+
+        def send_login(timeout=None):
+            logins.append(shard.apic.pwd)
+            return make_response({'imdata': []})
+        shard.apic._send_login = send_login
+        self.assertTrue(shard.apic.login().ok)
+        shard.apic.login_thread.exit()
+        self.assertEqual(logins, ['password'])
+
+
+class TestSingleFlight(unittest.TestCase):
+    """
+    Test the coalescing of identical GET requests made at the same time
+    """
+    def _get_session(self):
+        self.release = threading.Event()
+        self.started = threading.Event()
+
+        def handler(url):
+            self.started.set()
+            self.release.wait(5)
+            if 'fail' in url:
+                raise requests.exceptions.ConnectionError('refused')
+            return make_response({'imdata': []})
+        return get_offline_session(handler, single_flight=SingleFlight())
+
+    def _get_in_threads(self, session, url, count):
+        results = []
+
+        def get():
+            try:
+                results.append(session.get(url))
+            except Exception as e:
+                results.append(e)
+        threads = [threading.Thread(target=get) for i in range(count)]
+        threads[0].start()
+        self.started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        while session.single_flight_stats()['deduplicated'] < count - 1:
+            time.sleep(0.01)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_coalesce(self):
+        """
+        Test that concurrent identical requests are sent once
+        """
+        session = self._get_session()
+        results = self._get_in_threads(session, '/api/class/fvTenant.json', 4)
+        self.assertEqual(len(session.session.urls), 1)
+        self.assertEqual(len(set(id(resp) for resp in results)), 4)
+        results[0]._content = b'changed'
+        self.assertTrue(all(resp.json() == {'imdata': []} for resp in results[1:]))
+        self.assertEqual(session.single_flight_stats(), {'sent': 1, 'deduplicated': 3, 'in_flight': 0})
+        session.get('/api/class/fvTenant.json')
+        self.assertEqual(len(session.session.urls), 2)
+
+    def test_exception(self):
+        """
+        Test that the exception of the request is raised to every caller
+        """
+        session = self._get_session()
+        results = self._get_in_threads(session, '/api/class/fail.json', 3)
+        self.assertEqual(len(session.session.urls), 1)
+        self.assertTrue(all(isinstance(e, requests.exceptions.ConnectionError) for e in results))
+
+    def test_not_coalesced(self):
+        """
+        Test that subscriptions are not coalesced and that the option is off by default
+        """
+        session = self._get_session()
+        self.release.set()
+        session._single_flight._in_flight[session.api + '/api/class/fvBD.json?subscription=yes'] = None
+        session.get('/api/class/fvBD.json?subscription=yes')
+        self.assertEqual(len(session.session.urls), 1)
+        self.assertIsNone(get_offline_session(lambda url: make_response({'imdata': []})).single_flight_stats())
+
+
+if __name__ == '__main__':
+
+    offline = unittest.TestSuite()
+    offline.addTest(unittest.makeSuite(TestPagedGet))
+    offline.addTest(unittest.makeSuite(TestGetMany))
+    offline.addTest(unittest.makeSuite(TestRequestExecutor))
+    offline.addTest(unittest.makeSuite(TestResponseCache))
+    offline.addTest(unittest.makeSuite(TestPushBatcher))
+    offline.addTest(unittest.makeSuite(TestImdataDecoder))
+    offline.addTest(unittest.makeSuite(TestRequestStats))
+    offline.addTest(unittest.makeSuite(TestRateLimiter))
+    offline.addTest(unittest.makeSuite(TestSubscriberEvents))
+    offline.addTest(unittest.makeSuite(TestSubscriberRefresh))
+    offline.addTest(unittest.makeSuite(TestWebSocketShards))
+    offline.addTest(unittest.makeSuite(TestEventJournal))
+    offline.addTest(unittest.makeSuite(TestEventCoalescer))
+    offline.addTest(unittest.makeSuite(TestEventQueueLimit))
+    offline.addTest(unittest.makeSuite(TestClusterSession))
+    offline.addTest(unittest.makeSuite(TestLoginTokenCache))
+    offline.addTest(unittest.makeSuite(TestCertificateAuth))
+    offline.addTest(unittest.makeSuite(TestSingleFlight))
+
+    unittest.main()
@@ -41,7 +41,7 @@ from acitoolkit.acitoolkit import (
     PortChannel, Subnet, Taboo, Tenant, VmmDomain, LogicalModel, OutsideNetwork,
     AttributeCriterion, OutsideL2, TunnelInterface, FexInterface, VMM,
     OutsideL2EPG,
-    AnyEPG, InputTerminal, OutputTerminal)
+    AnyEPG, InputTerminal, OutputTerminal, Search, build_object_dictionary)
 # TODO: resolve circular dependencies and order-dependent import
 from acitoolkit.aciphysobject import Interface, Linecard, Node, Fabric
 import unittest
@@ -50,6 +50,9 @@ import random
 import time
 import json
 import sys
+import warnings
+
+import requests
 
 try:
     from credentials import URL, LOGIN, PASSWORD
@@ -176,6 +179,33 @@ class MockACIObject(BaseACIObject):
         pass
 
 
+class MockLazyACIObject(MockACIObject):
+    """
+    Test object whose children are fetched from a fake APIC
+    """
+    _session = None
+    fetched = []
+    sessions = []
+
+    @classmethod
+    def get(cls, session, parent):
+        """
+        Fake the fetch of the children of an object.  The tree is 3 levels deep.
+        """
+        cls.fetched.append(parent.name)
+        cls.sessions.append(session)
+        if parent.name.count('-') == 2:
+            return []
+        return [cls(parent.name + '-1', parent), cls(parent.name + '-2', parent)]
+
+    @staticmethod
+    def _get_children_classes():
+        """
+        Get the children classes
+        """
+        return [MockLazyACIObject]
+
+
 class TestBaseACIObject(unittest.TestCase):
     """
     Test the BaseACIObject class
@@ -252,6 +282,218 @@ class TestBaseACIObject(unittest.TestCase):
         obj1.detach(obj2)
         self.assertFalse(obj1.is_attached(obj2))
 
+    def test_child_index(self):
+        """
+        Test finding, replacing and removing the children of an object
+        """
+        tenant = Tenant('tenant')
+        apps = [AppProfile('app%s' % i, tenant) for i in range(100)]
+        bd = BridgeDomain('app5', tenant)
+        self.assertIs(tenant.get_child(AppProfile, 'app5'), apps[5])
+        self.assertIs(tenant.get_child(BridgeDomain, 'app5'), bd)
+        self.assertIsNone(tenant.get_child(AppProfile, 'app100'))
+        self.assertTrue(tenant.has_child(AppProfile('app7', Tenant('tenant'))))
+        duplicate = AppProfile('app7', tenant)
+        self.assertEqual(len(tenant.get_children(AppProfile)), 100)
+        self.assertIs(tenant.get_child(AppProfile, 'app7'), duplicate)
+        tenant.remove_child(apps[3])
+        self.assertFalse(tenant.has_child(apps[3]))
+        self.assertEqual(tenant.get_children()[:3], apps[:3])
+        self.assertRaises(ValueError, tenant.remove_child, apps[3])
+
+    def test_child_index_rename(self):
+        """
+        Test finding a child after it was renamed
+        """
+        tenant = Tenant('tenant')
+        app = AppProfile('app', tenant)
+        app.name = 'renamed'
+        self.assertIsNone(tenant.get_child(AppProfile, 'app'))
+        self.assertIs(tenant.get_child(AppProfile, 'renamed'), app)
+        self.assertTrue(tenant.has_child(AppProfile('renamed', Tenant('tenant'))))
+
+    def test_child_index_unkeyed(self):
+        """
+        Test the children whose equality is not based on their name
+        """
+        filt = Filter('filter')
+        entry = FilterEntry('entry1', filt, dToPort='80')
+        self.assertTrue(filt.has_child(FilterEntry('entry2', None, dToPort='80')))
+        self.assertFalse(filt.has_child(FilterEntry('entry1', None, dToPort='443')))
+        filt.remove_child(entry)
+        self.assertEqual(filt.get_children(), [])
+
+    def test_identity(self):
+        """
+        Test the equality and the hashing of objects with the same parent and name
+        """
+        tenant1 = Tenant('tenant')
+        tenant2 = Tenant('tenant')
+        app1 = AppProfile('app', tenant1)
+        app2 = AppProfile('app', tenant2)
+        self.assertEqual(app1, app2)
+        self.assertEqual(hash(app1), hash(app2))
+        self.assertEqual(len(set([app1, app2, tenant1, tenant2])), 2)
+        self.assertEqual({app1: 'app'}[app2], 'app')
+        self.assertNotEqual(app1, BridgeDomain('app', tenant1))
+
+    def test_identity_rename(self):
+        """
+        Test that the identity follows a rename of the object or of its parent
+        """
+        tenant1 = Tenant('tenant1')
+        app1 = AppProfile('app', tenant1)
+        app2 = AppProfile('app', Tenant('tenant2'))
+        self.assertNotEqual(app1, app2)
+        tenant1.name = 'tenant2'
+        self.assertEqual(app1, app2)
+        self.assertEqual(hash(app1), hash(app2))
+        app1.name = 'other'
+        self.assertNotEqual(app1, app2)
+        app1.set_parent(Tenant('tenant3'))
+        self.assertEqual(app1, AppProfile('other', Tenant('tenant3')))
+
+    def test_identity_parent_class(self):
+        """
+        Test that objects whose parents have the same name but different
+        classes are not equal
+        """
+        tenant = Tenant('tenant')
+        contract = Contract('x', tenant)
+        taboo = Taboo('x', tenant)
+        self.assertNotEqual(ContractSubject('s', contract), ContractSubject('s', taboo))
+        self.assertNotEqual(Filter('f', contract), Filter('f', taboo))
+        self.assertEqual(ContractSubject('s', contract), ContractSubject('s', Contract('x', Tenant('tenant'))))
+
+    def test_shared_empty_containers(self):
+        """
+        Test that objects only get their own containers once they are used
+        """
+        tenant = Tenant('tenant')
+        app1 = AppProfile('app1', tenant)
+        app2 = AppProfile('app2', tenant)
+        self.assertFalse('_tags' in app1.__dict__)
+        self.assertFalse('_relations' in app1.__dict__)
+        app1.add_tag('tag')
+        self.assertTrue(app1.has_tag('tag'))
+        self.assertFalse(app2.has_tag('tag'))
+        self.assertEqual(app2.get_tags(), [])
+        epg = EPG('epg', app1)
+        epg.add_tag('tag')
+        self.assertFalse(app2.has_tag('tag'))
+        self.assertTrue(epg.has_tag('tag'))
+
+    def test_get_error(self):
+        """
+        Test that the error of a page of the class query is raised and
+        that no object is created
+        """
+        class FakeSession(object):
+            def get_paged(self, url):
+                yield {'fvTenant': {'attributes': {'name': 't1', 'dn': 'uni/tn-t1'}}}
+                raise requests.exceptions.HTTPError('page 1 failed')
+        parent = LogicalModel()
+        self.assertRaises(requests.exceptions.HTTPError,
+                          BaseACIObject.get, FakeSession(), Tenant, 'fvTenant', parent=parent)
+        self.assertEqual(parent.get_children(), [])
+
+    def test_lazy_population(self):
+        """
+        Test that the children of a lazy object are fetched one level at a
+        time when they are asked for
+        """
+        MockLazyACIObject.fetched = []
+        root = MockLazyACIObject('root')
+        root.set_lazy_population(None)
+        self.assertEqual(MockLazyACIObject.fetched, [])
+        children = root.get_children()
+        self.assertEqual([child.name for child in children], ['root-1', 'root-2'])
+        self.assertEqual(MockLazyACIObject.fetched, ['root'])
+        root.get_children()
+        self.assertEqual(MockLazyACIObject.fetched, ['root'])
+        grandchildren = children[1].get_children()
+        self.assertEqual([child.name for child in grandchildren], ['root-2-1', 'root-2-2'])
+        self.assertEqual(MockLazyACIObject.fetched, ['root', 'root-2'])
+
+    def test_lazy_population_populated(self):
+        """
+        Test that a lazy object that was populated explicitly is not fetched again
+        """
+        MockLazyACIObject.fetched = []
+        root = MockLazyACIObject('root')
+        root.set_lazy_population(None)
+        root.populate_children()
+        self.assertEqual(len(root.get_children()), 2)
+        self.assertEqual(MockLazyACIObject.fetched, ['root'])
+
+    def test_lazy_population_local_child(self):
+        """
+        Test that creating a child under a lazy object does not cancel the fetch
+        """
+        MockLazyACIObject.fetched = []
+        root = MockLazyACIObject('root')
+        root.set_lazy_population(None)
+        MockLazyACIObject('local', root)
+        self.assertEqual(MockLazyACIObject.fetched, [])
+        self.assertEqual([child.name for child in root.get_children()], ['local', 'root-1', 'root-2'])
+        self.assertEqual(MockLazyACIObject.fetched, ['root'])
+
+    def test_lazy_population_get_child(self):
+        """
+        Test that get_child fetches the children of a lazy object with its session
+        """
+        MockLazyACIObject.fetched = []
+        MockLazyACIObject.sessions = []
+        session = object()
+        root = MockLazyACIObject('root')
+        root.set_lazy_population(session)
+        child = root.get_child(MockLazyACIObject, 'root-2')
+        self.assertEqual(child.name, 'root-2')
+        self.assertEqual(MockLazyACIObject.fetched, ['root'])
+        self.assertIs(MockLazyACIObject.sessions[0], session)
+        self.assertIsNotNone(child.get_child(MockLazyACIObject, 'root-2-1'))
+        self.assertIs(MockLazyACIObject.sessions[1], session)
+
+    def test_lazy_population_has_child(self):
+        """
+        Test that has_child fetches the children of a lazy object
+        """
+        MockLazyACIObject.fetched = []
+        root = MockLazyACIObject('root')
+        root.set_lazy_population(None)
+        # An equal child of another root object
+        child = MockLazyACIObject('root-1', MockLazyACIObject('root'))
+        self.assertTrue(root.has_child(child))
+        self.assertEqual(MockLazyACIObject.fetched, ['root'])
+
+    def test_lazy_population_find(self):
+        """
+        Test that find searches the children of a lazy object
+        """
+        MockLazyACIObject.fetched = []
+        root = MockLazyACIObject('root')
+        root.set_lazy_population(None)
+        search = Search()
+        search.name = 'root-1-2'
+        results = root.find(search)
+        self.assertEqual([result.name for result in results], ['root-1-2'])
+        self.assertIn('root-1', MockLazyACIObject.fetched)
+
+
+def item(apic_class, name, children=(), **attributes):
+    """
+    Build the JSON of an APIC object
+    """
+    attributes['name'] = name
+    return {apic_class: {'attributes': attributes, 'children': list(children)}}
+
+
+def relation(apic_class, **attributes):
+    """
+    Build the JSON of an APIC relation
+    """
+    return {apic_class: {'attributes': attributes}}
+
 
 class TestTenant(unittest.TestCase):
     """
@@ -291,6 +533,180 @@ class TestTenant(unittest.TestCase):
         tenants = [Tenant('tenant1'), Tenant('tenant2'), Tenant('tenant3')]
         self.assertTrue(isinstance(Tenant.get_table(tenants)[0], Table))
 
+    @staticmethod
+    def _get_session(*tenants_data):
+        """
+        Get a fake session returning the JSON of the tenants
+        """
+        class FakeSession(object):
+            def get_many_stream(self, urls):
+                data = dict(('/api/mo/uni/tn-%s.json' % tenant_data['fvTenant']['attributes']['name'], [tenant_data])
+                            for tenant_data in tenants_data)
+                return [data[url.split('?')[0]] for url in urls]
+        return FakeSession()
+
+    def _get_deep(self, *tenants_data):
+        """
+        Get the tenants from their JSON with Tenant.get_deep
+        """
+        names = [tenant_data['fvTenant']['attributes']['name'] for tenant_data in tenants_data]
+        return Tenant.get_deep(self._get_session(*tenants_data), names=names)
+
+    def test_lazy_population_local_child(self):
+        """
+        Test that a child created under a lazy tenant is kept with the fetched children
+        """
+        session = self._get_session(item('fvTenant', 'tenant', [item('fvBD', 'bd'), item('fvCtx', 'ctx')]))
+        tenant = Tenant('tenant')
+        tenant.set_lazy_population(session)
+        BridgeDomain('local', tenant)
+        self.assertEqual(sorted(child.name for child in tenant.get_children()), ['bd', 'ctx', 'local'])
+        self.assertIs(tenant.get_child(BridgeDomain, 'bd').get_parent(), tenant)
+
+    def test_get_deep_relations(self):
+        """
+        Test that Tenant.get_deep resolves the relations in the tenant and
+        in the tenant common
+        """
+        common = item('fvTenant', 'common', [
+            item('vzFilter', 'http'),
+            item('vzBrCP', 'web', [item('vzSubj', 'http', [relation('vzRsSubjFiltAtt', tnVzFilterName='http')])]),
+            item('fvBD', 'shared')])
+        tenant = item('fvTenant', 'tenant', [
+            item('fvCtx', 'ctx'),
+            item('fvBD', 'bd', [relation('fvRsCtx', tnFvCtxName='ctx')]),
+            item('vzBrCP', 'local'),
+            item('fvAp', 'app', [
+                item('fvAEPg', 'epg1', [relation('fvRsBd', tnFvBDName='bd'),
+                                        relation('fvRsProv', tnVzBrCPName='web'),
+                                        relation('fvRsCons', tnVzBrCPName='local')]),
+                item('fvAEPg', 'epg2', [relation('fvRsBd', tnFvBDName='shared')])])])
+
+        tenants = self._get_deep(common, tenant)
+        self.assertEqual([t.name for t in tenants], ['common', 'tenant'])
+        common_tenant, tenant = tenants
+        contract = common_tenant.get_child(Contract, 'web')
+        subject = contract.get_child(ContractSubject, 'http')
+        self.assertEqual(subject.get_filters(), [common_tenant.get_child(Filter, 'http')])
+        bd = tenant.get_child(BridgeDomain, 'bd')
+        self.assertTrue(bd.get_context() is tenant.get_child(Context, 'ctx'))
+        app = tenant.get_child(AppProfile, 'app')
+        epg1 = app.get_child(EPG, 'epg1')
+        self.assertTrue(epg1.get_bd() is bd)
+        self.assertTrue(epg1.does_provide(contract))
+        self.assertTrue(epg1.does_consume(tenant.get_child(Contract, 'local')))
+        epg2 = app.get_child(EPG, 'epg2')
+        self.assertTrue(epg2.get_bd() is common_tenant.get_child(BridgeDomain, 'shared'))
+
+    def test_get_deep_contract_relations(self):
+        """
+        Test that Tenant.get_deep resolves the relations of the terminals,
+        of the outside and any EPGs and of the contract interfaces, and that
+        the subjects and the terminals only get their own filters
+        """
+        provider = item('fvTenant', 'provider', [
+            item('vzBrCP', 'exported')])
+        tenant = item('fvTenant', 'tenant', [
+            item('vzFilter', 'http'),
+            item('vzFilter', 'https'),
+            item('vzFilter', 'ssh'),
+            item('vzBrCP', 'web', [
+                item('vzSubj', 'subj', [
+                    relation('vzRsSubjFiltAtt', tnVzFilterName='http'),
+                    item('vzInTerm', '', [relation('vzRsFiltAtt', tnVzFilterName='https')]),
+                    item('vzOutTerm', '', [relation('vzRsFiltAtt', tnVzFilterName='ssh')])])]),
+            item('vzBrCP', 'admin', [
+                item('vzSubj', 'subj', [relation('vzRsSubjFiltAtt', tnVzFilterName='ssh')])]),
+            item('vzCPIf', 'imported', [relation('vzRsIf', tDn='uni/tn-provider/brc-exported')]),
+            item('fvCtx', 'ctx', [
+                item('vzAny', '', [relation('vzRsAnyToProv', tnVzBrCPName='web'),
+                                   relation('vzRsAnyToCons', tnVzBrCPName='admin'),
+                                   relation('vzRsAnyToConsIf', tnVzCPIfName='imported')])]),
+            item('l3extOut', 'out', [
+                item('l3extInstP', 'outside', [relation('fvRsProv', tnVzBrCPName='admin'),
+                                               relation('fvRsCons', tnVzBrCPName='web'),
+                                               relation('fvRsConsIf', tnVzCPIfName='imported')])])])
+
+        provider, tenant = self._get_deep(provider, tenant)
+        http, https, ssh = [tenant.get_child(Filter, name) for name in ('http', 'https', 'ssh')]
+        web = tenant.get_child(Contract, 'web')
+        admin = tenant.get_child(Contract, 'admin')
+        subject = web.get_child(ContractSubject, 'subj')
+        self.assertEqual(subject.get_filters(), [http])
+        self.assertEqual(admin.get_child(ContractSubject, 'subj').get_filters(), [ssh])
+        self.assertEqual(subject.get_children(only_class=InputTerminal)[0].get_filters(), [https])
+        self.assertEqual(subject.get_children(only_class=OutputTerminal)[0].get_filters(), [ssh])
+
+        contract_if = tenant.get_child(ContractInterface, 'imported')
+        self.assertTrue(contract_if.does_import_contract(provider.get_child(Contract, 'exported')))
+
+        any_epg = tenant.get_child(Context, 'ctx').get_children(only_class=AnyEPG)[0]
+        self.assertTrue(any_epg.does_provide(web))
+        self.assertTrue(any_epg.does_consume(admin))
+        self.assertTrue(any_epg.does_consume_cif(contract_if))
+
+        outside_epg = tenant.get_child(OutsideL3, 'out').get_child(OutsideEPG, 'outside')
+        self.assertTrue(outside_epg.does_provide(admin))
+        self.assertTrue(outside_epg.does_consume(web))
+        self.assertTrue(outside_epg.does_consume_cif(contract_if))
+
+    def test_build_object_dictionary(self):
+        """
+        Test that build_object_dictionary still works and is deprecated
+        """
+        tenant = Tenant('tenant')
+        bd = BridgeDomain('bd', tenant)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            result = build_object_dictionary([tenant])
+        self.assertEqual(result, {Tenant: set([tenant]), BridgeDomain: set([bd])})
+        self.assertTrue(issubclass(caught[0].category, DeprecationWarning))
+
+    def test_filtered_subscription_urls(self):
+        """
+        Test the subscription URLs with a filter and a dn scope
+        """
+        self.assertEqual(Tenant._get_subscription_urls(),
+                         ['/api/class/fvTenant.json?subscription=yes'])
+        self.assertEqual(Tenant._get_subscription_urls(query_filter='eq(fvTenant.name,"t1")'),
+                         ['/api/class/fvTenant.json?query-target-filter=eq(fvTenant.name,"t1")&subscription=yes'])
+        self.assertEqual(Tenant._get_subscription_urls(dn_scope=['uni/tn-t1', 'uni/tn-t2']),
+                         ['/api/mo/uni/tn-t1.json?query-target=subtree&target-subtree-class=fvTenant&subscription=yes',
+                          '/api/mo/uni/tn-t2.json?query-target=subtree&target-subtree-class=fvTenant&subscription=yes'])
+
+    def test_filtered_subscription_events(self):
+        """
+        Test that the events are looked up with the filtered URL
+        """
+        url = '/api/mo/uni/tn-t1.json?query-target=subtree&target-subtree-class=fvTenant&subscription=yes'
+
+        class EventSession(object):
+            def __init__(self):
+                self.events = {}
+
+            def subscribe(self, url, only_new=False):
+                self.events[url] = [{'imdata': [{'fvTenant': {'attributes': {'dn': 'uni/tn-t1',
+                                                                             'name': 't1',
+                                                                             'status': 'created'}}}]}]
+
+            def has_events(self, url):
+                return len(self.events.get(url, [])) > 0
+
+            def get_event(self, url):
+                return self.events[url].pop(0)
+
+            def unsubscribe(self, url):
+                del self.events[url]
+
+        session = EventSession()
+        Tenant.subscribe(session, dn_scope='uni/tn-t1')
+        self.assertEqual(list(session.events), [url])
+        self.assertFalse(Tenant.has_events(session))
+        self.assertTrue(Tenant.has_events(session, dn_scope='uni/tn-t1'))
+        self.assertEqual(Tenant.get_event(session, dn_scope='uni/tn-t1').name, 't1')
+        Tenant.unsubscribe(session, dn_scope='uni/tn-t1')
+        self.assertEqual(session.events, {})
+
 
 class TestAppProfile(unittest.TestCase):
     """
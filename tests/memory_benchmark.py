@@ -0,0 +1,151 @@
+################################################################################
+#                                  _    ____ ___                               #
+#                                 / \  / ___|_ _|                              #
+#                                / _ \| |    | |                               #
+#                               / ___ \ |___ | |                               #
+#                         _____/_/   \_\____|___|_ _                           #
+#                        |_   _|__   ___ | | | _(_) |_                         #
+#                          | |/ _ \ / _ \| | |/ / | __|                        #
+#                          | | (_) | (_) | |   <| | |_                         #
+#                          |_|\___/ \___/|_|_|\_\_|\__|                        #
+#                                                                              #
+################################################################################
+#                                                                              #
+# Copyright (c) 2015 Cisco Systems                                             #
+# All Rights Reserved.                                                         #
+#                                                                              #
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may   #
+#    not use this file except in compliance with the License. You may obtain   #
+#    a copy of the License at                                                  #
+#                                                                              #
+#         http://www.apache.org/licenses/LICENSE-2.0                           #
+#                                                                              #
+#    Unless required by applicable law or agreed to in writing, software       #
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT #
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the  #
+#    License for the specific language governing permissions and limitations   #
+#    under the License.                                                        #
+#                                                                              #
+################################################################################
+"""
+Memory benchmark of the toolkit objects found in large numbers in a fabric.
+
+Builds a number of objects of each class and prints the average number of
+bytes used by one object, counting the objects shared by several of them,
+such as interned strings, only once.
+
+    python memory_benchmark.py [count]
+"""
+import sys
+
+from acitoolkit.acitoolkit import AppProfile, EPG, Endpoint, IPEndpoint, Tenant
+from acitoolkit.aciphysobject import Interface, Linecard, Node
+from acitoolkit.aciConcreteLib import ConcreteAccCtrlRule, ConcreteEp
+
+
+def get_footprint(objs):
+    """
+    Get the average number of bytes used by the objects, their instance
+    dictionaries and the containers and strings they hold.
+
+    :param objs: List of objects
+    :returns: Integer containing the number of bytes per object
+    """
+    roots = set(id(obj) for obj in objs)
+    seen = set()
+    total = 0
+    pending = list(objs)
+    while pending:
+        item = pending.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            pending.extend(item.values())
+        elif isinstance(item, (list, tuple)):
+            pending.extend(item)
+        elif id(item) in roots:
+            seen.add(id(item.__dict__))
+            total += sys.getsizeof(item.__dict__)
+            pending.extend(value for key, value in item.__dict__.items() if key != '_parent')
+    return total // len(objs)
+
+
+def build_endpoints(count):
+    epg = EPG('epg', AppProfile('app', Tenant('tenant')))
+    endpoints = []
+    for i in range(count):
+        endpoint = Endpoint('00:00:00:%02X:%02X:%02X' % (i >> 16 & 255, i >> 8 & 255, i & 255), epg)
+        endpoint._populate_from_attributes({'mac': endpoint.name, 'ip': '10.%d.%d.%d' % (i >> 16 & 255, i >> 8 & 255, i & 255),
+                                            'encap': 'vlan-%d' % (i % 10), 'lcC': 'learned', 'type': 'learned',
+                                            'dn': 'uni/tn-tenant/ap-app/epg-epg/cep-%s' % endpoint.name})
+        endpoints.append(endpoint)
+    return endpoints
+
+
+def build_ip_endpoints(count):
+    epg = EPG('epg', AppProfile('app', Tenant('tenant')))
+    return [IPEndpoint('10.%d.%d.%d' % (i >> 16 & 255, i >> 8 & 255, i & 255), epg) for i in range(count)]
+
+
+def build_interfaces(count):
+    linecard = Linecard('1', '101', '1', Node('1', '101', 'leaf-101', 'leaf'))
+    return [Interface('eth', '1', '101', '1', str(i), parent=linecard) for i in range(count)]
+
+
+def build_concrete_endpoints(count):
+    node = Node('1', '101', 'leaf-101', 'leaf')
+    endpoints = []
+    for i in range(count):
+        endpoint = ConcreteEp()
+        address = '10.%d.%d.%d' % (i >> 16 & 255, i >> 8 & 255, i & 255)
+        endpoint._populate_from_attributes({'addr': address, 'name': '', 'flags': 'local',
+                                            'ifId': 'eth1/%d' % (i % 48), 'createTs': '2016-01-01T00:00:00',
+                                            'dn': 'topology/pod-1/node-101/sys/ctx-[vxlan-1]/db-ep/ip-[%s]' % address})
+        endpoint.attr.update({'address_family': 'ipv4', 'ip': address, 'ctx_vnid': '2981888',
+                              'bd_vnid': '15794151', 'context': 'ctx', 'bridge_domain': 'bd', 'tenant': 'tenant'})
+        endpoint._intern_attr('address_family', 'bd_vnid', 'bridge_domain', 'context', 'ctx_vnid', 'flags',
+                              'interface_id', 'node', 'pod', 'tenant')
+        endpoint._parent = node
+        node.add_child(endpoint)
+        endpoints.append(endpoint)
+    return endpoints
+
+
+def build_concrete_rules(count):
+    node = Node('1', '101', 'leaf-101', 'leaf')
+    rules = []
+    for i in range(count):
+        rule = ConcreteAccCtrlRule()
+        rule._populate_from_attributes({'action': 'permit', 'dPcTag': str(16386 + i % 20), 'sPcTag': str(32770 + i % 20),
+                                        'descr': '', 'direction': 'uni-dir', 'fltId': str(i % 30), 'markDscp': 'unspecified',
+                                        'name': '', 'operSt': 'enabled', 'prio': 'fully_qual', 'qosGrp': 'unspecified',
+                                        'scopeId': '2981888', 'type': 'tenant', 'status': '', 'modTs': 'never',
+                                        'dn': 'topology/pod-1/node-101/sys/actrl/scope-2981888/rule-%d' % i})
+        rule.attr.update({'tenant': 'tenant', 'context': 'ctx', 's_epg': 'epg%d' % (i % 20), 'd_epg': 'epg%d' % (i % 7)})
+        rule._set_name()
+        rule._intern_attr('action', 'context', 'd_epg', 'dclass', 'descr', 'direction', 'filter_id',
+                          'mark_dscp', 'node', 'oper_st', 'pod', 'priority', 'qos_group',
+                          'relative_priority', 's_epg', 'sclass', 'scope', 'status', 'tenant', 'type')
+        rule._parent = node
+        node.add_child(rule)
+        rules.append(rule)
+    return rules
+
+
+def main():
+    count = 10000
+    if len(sys.argv) > 1:
+        count = int(sys.argv[1])
+    print('%-20s %s' % ('Class', 'Bytes per object'))
+    for name, build in (('Endpoint', build_endpoints),
+                        ('IPEndpoint', build_ip_endpoints),
+                        ('Interface', build_interfaces),
+                        ('ConcreteEp', build_concrete_endpoints),
+                        ('ConcreteAccCtrlRule', build_concrete_rules)):
+        print('%-20s %d' % (name, get_footprint(build(count))))
+
+
+if __name__ == '__main__':
+    main()